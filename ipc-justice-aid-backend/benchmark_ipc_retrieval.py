@@ -0,0 +1,120 @@
+"""
+Benchmark BM25 retrieval over the IPC corpus and its effect on the prompts
+Run this with: python manage.py shell < benchmark_ipc_retrieval.py
+
+Reports index build time, query latency and the top matches for a few sample
+cases, then the prompt sizes with and without the retrieved excerpts. When
+Ollama is reachable each prompt is also sent RUNS times and the output token
+counts and wall-clock are averaged.
+"""
+
+import statistics
+import time
+
+from ipc_analysis.ipc_catalog import ipc_catalog
+from ipc_analysis.ipc_retrieval import IPCRetriever, ipc_retriever
+from ipc_analysis.gemini_service import GeminiService
+from ipc_analysis.services import OllamaService
+from leads.services import ollama_ipc_service
+
+RUNS = 3
+QUERY_ITERATIONS = 200
+
+test_cases = [
+    """A man named Raj was driving his car recklessly on a busy road. Due to his negligent driving,
+    he hit a pedestrian who later died in the hospital. He was driving at excessive speed and using his phone.""",
+    """Someone snatched my gold chain while I was walking home from the market and ran away on a motorcycle.""",
+    """My husband and his parents keep demanding more dowry and beat me when my family cannot pay.""",
+    """A man called me pretending to be from the bank, got my OTP and transferred 50,000 rupees from my account.""",
+]
+
+print("=== IPC Retrieval Benchmark ===")
+print(f"IPC catalog: {len(ipc_catalog)} sections")
+
+# Index build on a fresh instance, so the global index isn't reused
+builds = []
+for _ in range(5):
+    retriever = IPCRetriever()
+    retriever.index
+    builds.append(retriever.build_ms)
+print(f"\n=== Index Build ===")
+print(f"- {statistics.median(builds):.2f}ms median over {len(builds)} builds")
+
+print(f"\n=== Query Latency ({QUERY_ITERATIONS} queries per case) ===")
+for case in test_cases:
+    samples = []
+    for _ in range(QUERY_ITERATIONS):
+        start_time = time.perf_counter()
+        matches = ipc_retriever.search(case)
+        samples.append((time.perf_counter() - start_time) * 1000)
+    samples.sort()
+    p95 = samples[int(len(samples) * 0.95) - 1]
+    top = ', '.join(f"{section['section_number']} ({score})" for section, score in matches[:5])
+    print(f"- p50={statistics.median(samples):.3f}ms p95={p95:.3f}ms top: {top}")
+
+ollama_service = OllamaService()
+gemini_service = GeminiService()
+builders = {
+    'ollama _create_prompt': lambda case: ollama_service._create_prompt(case),
+    'gemini _create_legal_prompt': lambda case: gemini_service._create_legal_prompt(case),
+    'leads _construct_analysis_prompt': lambda case: ollama_ipc_service._construct_analysis_prompt(case, None, None),
+}
+
+
+def build_prompts(case):
+    prompts = {}
+    for enabled in (False, True):
+        ipc_retriever.enabled = enabled
+        prompts['grounded' if enabled else 'plain'] = {name: build(case) for name, build in builders.items()}
+    ipc_retriever.enabled = True
+    return prompts
+
+
+print(f"\n=== Prompt Size (first case) ===")
+prompts = build_prompts(test_cases[0])
+for name in builders:
+    plain, grounded = prompts['plain'][name], prompts['grounded'][name]
+    # ~4 characters per token is close enough for a relative comparison
+    print(f"- {name}: {len(plain)} -> {len(grounded)} chars (~{len(plain) // 4} -> ~{len(grounded) // 4} tokens)")
+
+print(f"\n=== Ollama Runs ({RUNS} per variant, leads prompt) ===")
+results = {}
+for variant in ('plain', 'grounded'):
+    samples = []
+    reachable = True
+    for case in test_cases:
+        if not reachable:
+            break
+        prompt = build_prompts(case)[variant]['leads _construct_analysis_prompt']
+        payload = ollama_ipc_service._build_request_payload(prompt)
+        for run in range(RUNS):
+            start_time = time.time()
+            try:
+                response = ollama_ipc_service.client.post(
+                    f"{ollama_ipc_service.base_url}/api/generate", json=payload, timeout=ollama_ipc_service.timeout
+                )
+                response.raise_for_status()
+            except Exception as e:
+                print(f"- {variant}: Ollama not reachable ({str(e)}), skipping runs")
+                reachable = False
+                break
+            result = response.json()
+            samples.append({
+                'wall_ms': (time.time() - start_time) * 1000,
+                'prompt_tokens': result.get('prompt_eval_count', 0),
+                'output_tokens': result.get('eval_count', 0),
+            })
+
+    if samples:
+        results[variant] = {key: sum(s[key] for s in samples) / len(samples) for key in samples[0]}
+        print(f"- {variant}: {results[variant]['prompt_tokens']:.0f} prompt tokens, "
+              f"{results[variant]['output_tokens']:.0f} output tokens, {results[variant]['wall_ms']:.0f}ms")
+
+if len(results) == 2:
+    plain, grounded = results['plain'], results['grounded']
+    print(f"\n=== Change With Retrieval ===")
+    for key in ('prompt_tokens', 'output_tokens', 'wall_ms'):
+        if plain[key]:
+            print(f"- {key}: {(grounded[key] / plain[key] - 1) * 100:+.1f}%")
+
+print(f"\n=== Benchmark Complete ===")
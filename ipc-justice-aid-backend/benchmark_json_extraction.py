@@ -0,0 +1,75 @@
+"""
+Micro-benchmark: single-pass JSON extraction vs the old regex cascade
+Run this with: python manage.py shell < benchmark_json_extraction.py
+
+The regex cascade is the one OllamaIPCService._parse_ollama_response used
+before ipc_analysis.json_extraction replaced it.
+"""
+
+import json
+import re
+import time
+
+from ipc_analysis.json_extraction import extract_json_object
+
+REPEAT = 20
+
+LEGACY_PATTERNS = [
+    r'\{[^{}]*(?:\{[^{}]*\}[^{}]*)*\}',
+    r'```json\s*(\{.*?\})\s*```',
+    r'(?:json|JSON).*?(\{.*?\})',
+]
+
+
+def legacy_extract(text):
+    for pattern in LEGACY_PATTERNS:
+        for match in re.finditer(pattern, text, re.DOTALL | re.IGNORECASE):
+            try:
+                json_str = match.group(1) if match.groups() else match.group()
+                parsed = json.loads(json_str)
+                if 'applicable_ipc_sections' in parsed:
+                    return parsed
+            except (json.JSONDecodeError, IndexError):
+                continue
+    try:
+        return json.loads(text)
+    except json.JSONDecodeError:
+        return None
+
+
+def is_analysis(parsed):
+    return isinstance(parsed.get('applicable_ipc_sections'), list)
+
+
+def time_call(function, text, repeat):
+    start_time = time.perf_counter()
+    for _ in range(repeat):
+        result = function(text)
+    return (time.perf_counter() - start_time) / repeat * 1000, result
+
+
+with open('example_response.json', encoding='utf-8') as example_file:
+    real_output = example_file.read()
+
+cases = {
+    'real (bare JSON)': (real_output, REPEAT),
+    'real (prose + ```json fence)': (
+        "Here is the analysis of the case you provided.\n\n```json\n" + real_output + "\n```\n"
+        "Please consult a lawyer before acting on it.", REPEAT
+    ),
+    'real (prose with quotes and braces)': (
+        'The model said "see below" {note: draft}\n' + real_output + '\nThat\'s all.', REPEAT
+    ),
+    'pathological (many invalid objects)': ('{"section": 302, oops} ' * 2000 + real_output, 5),
+    'pathological (unclosed braces after "json")': ('json {"a": ' * 400, 1),
+    'pathological (long prose, no JSON)': ('The accused json was { seen near the road. ' * 300, 1),
+}
+
+print("=== JSON Extraction Benchmark ===")
+print(f"{'case':45} {'chars':>8} {'regex ms':>10} {'single-pass ms':>15} {'same result':>12}")
+for name, (text, repeat) in cases.items():
+    legacy_ms, legacy_result = time_call(legacy_extract, text, repeat)
+    new_ms, new_result = time_call(lambda t: extract_json_object(t, is_analysis), text, repeat)
+    print(f"{name:45} {len(text):>8} {legacy_ms:>10.3f} {new_ms:>15.3f} {str(legacy_result == new_result):>12}")
+
+print(f"\n=== Benchmark Complete ===")
@@ -0,0 +1,265 @@
+"""
+Benchmark OCRService text extraction: two Tesseract passes vs one, the
+throughput of the pytesseract and in-process tesserocr engines, and the
+latency and peak memory of the old full-size RGB decode against the lean
+grayscale one
+Run this with: python manage.py shell < benchmark_ocr.py
+
+Uses the photos in OCR_BENCHMARK_DIR when it is set (FIR copies, notices...),
+otherwise generates phone-photo-like JPEGs of an FIR and a court notice, plus
+a 48MP photo for the decode comparison. The two-pass path is the one
+extract_text_from_image used before: image_to_string followed by
+image_to_data just for the confidences.
+"""
+
+import ctypes
+import ctypes.util
+import glob
+import io
+import os
+import random
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+import pytesseract
+from PIL import Image, ImageDraw, ImageFilter, ImageFont
+
+from ipc_analysis.ocr_engine import TESSEROCR_AVAILABLE, OCREngine
+from ipc_analysis.ocr_service import OCRService
+
+RUNS = 3
+THROUGHPUT_ROUNDS = 3
+M_MMAP_THRESHOLD = -3  # glibc mallopt parameter
+
+FIR_TEXT = """FIRST INFORMATION REPORT (Under Section 154 Cr.P.C.)
+District: Pune  P.S.: Shivajinagar  Year: 2024  FIR No.: 0231
+Date and time of FIR: 12/03/2024 10:45
+Act: Indian Penal Code  Sections: 379, 411
+Occurrence of offence: 11/03/2024 between 22:00 and 06:00
+Complainant: Ramesh Kumar, resident of Model Colony, Pune
+Details of property stolen: Hero Splendor motorcycle MH-12-AB-1234
+The complainant states that his motorcycle parked outside his house
+was stolen during the night. He requests that an FIR be registered
+and the accused be traced and punished according to law."""
+
+NOTICE_TEXT = """IN THE COURT OF THE CIVIL JUDGE (SENIOR DIVISION), LUCKNOW
+NOTICE UNDER ORDER V RULE 20 OF THE CODE OF CIVIL PROCEDURE
+Suit No. 412 of 2023
+Smt. Sunita Devi ... Plaintiff
+Versus
+Shri Mahesh Chandra ... Defendant
+Whereas the plaintiff has instituted the above suit against you,
+you are hereby summoned to appear in this court in person or by a
+pleader on 18/04/2024 at 10:30 AM to answer the claim. Take notice
+that in default of your appearance the suit will be heard ex parte."""
+
+
+def synthetic_photo(text, seed, size=(3024, 4032)):
+    """A page of text photographed slightly rotated, blurred and unevenly lit"""
+    rng = random.Random(seed)
+    page = Image.new('L', (1700, 2200), 245)
+    draw = ImageDraw.Draw(page)
+    font = ImageFont.load_default(size=34)
+    y = 150
+    for line in text.split('\n'):
+        draw.text((120, y), line, fill=20, font=font)
+        y += 60
+
+    page = page.rotate(rng.uniform(-2, 2), expand=True, fillcolor=200)
+    page = page.resize(size).filter(ImageFilter.GaussianBlur(1.2))
+
+    pixels = np.asarray(page, dtype=np.float32)
+    gradient = np.linspace(0.8, 1.05, size[0], dtype=np.float32)[None, :]
+    noise = np.random.default_rng(seed).normal(0, 6, pixels.shape).astype(np.float32)
+    pixels = np.clip(pixels * gradient + noise, 0, 255).astype(np.uint8)
+
+    photo = Image.merge('RGB', [Image.fromarray(pixels)] * 3)
+    buffer = io.BytesIO()
+    photo.save(buffer, format='JPEG', quality=88)
+    return buffer.getvalue()
+
+
+def load_images():
+    directory = os.environ.get('OCR_BENCHMARK_DIR')
+    if directory:
+        images = []
+        for path in sorted(glob.glob(os.path.join(directory, '*'))):
+            if path.lower().endswith(('.jpg', '.jpeg', '.png', '.bmp')):
+                with open(path, 'rb') as image_file:
+                    images.append((os.path.basename(path), image_file.read()))
+        return images
+    return [
+        ('fir_photo_1.jpg', synthetic_photo(FIR_TEXT, 1)),
+        ('fir_photo_2.jpg', synthetic_photo(FIR_TEXT, 2)),
+        ('notice_photo_1.jpg', synthetic_photo(NOTICE_TEXT, 3)),
+        ('notice_photo_2.jpg', synthetic_photo(NOTICE_TEXT, 4)),
+    ]
+
+
+def legacy_preprocess(image_data):
+    """Decode and preprocessing as extract_text_from_image did before the lean path"""
+    pil_image = Image.open(io.BytesIO(image_data))
+    opencv_image = cv2.cvtColor(np.array(pil_image), cv2.COLOR_RGB2BGR)
+    gray = cv2.cvtColor(opencv_image, cv2.COLOR_BGR2GRAY)
+    blurred = cv2.GaussianBlur(gray, (5, 5), 0)
+    thresh = cv2.adaptiveThreshold(blurred, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY, 11, 2)
+    kernel = np.ones((1, 1), np.uint8)
+    processed = cv2.morphologyEx(thresh, cv2.MORPH_CLOSE, kernel)
+    return cv2.morphologyEx(processed, cv2.MORPH_OPEN, kernel)
+
+
+def lean_preprocess(service, image_data):
+    return service._preprocess_image(service._load_grayscale(Image.open(io.BytesIO(image_data))))
+
+
+def _status_kb(field):
+    with open('/proc/self/status') as status:
+        for line in status:
+            if line.startswith(f'{field}:'):
+                return int(line.split()[1])
+    return 0
+
+
+def peak_memory_mb(function, *args):
+    """Peak RSS growth while running function once, measured in a forked child"""
+    read_fd, write_fd = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        os.close(read_fd)
+        # Release memory the parent freed but kept in the heap, and serve big
+        # buffers from fresh mappings, so reused heap pages don't hide them
+        libc = ctypes.CDLL(ctypes.util.find_library('c'))
+        libc.mallopt(M_MMAP_THRESHOLD, 128 * 1024)
+        libc.malloc_trim(0)
+        # The child starts with the parent's high-water mark; reset it to the current RSS
+        with open('/proc/self/clear_refs', 'w') as clear_refs:
+            clear_refs.write('5')
+        start_kb = _status_kb('VmRSS')
+        function(*args)
+        os.write(write_fd, str(_status_kb('VmHWM') - start_kb).encode())
+        os._exit(0)
+    os.close(write_fd)
+    with os.fdopen(read_fd) as reader:
+        growth_kb = int(reader.read() or 0)
+    os.waitpid(pid, 0)
+    return growth_kb / 1024
+
+
+def two_pass(service, processed_image):
+    text = pytesseract.image_to_string(processed_image, config=service.engine.pytesseract_config)
+    data = pytesseract.image_to_data(processed_image, output_type=pytesseract.Output.DICT)
+    confidences = [int(conf) for conf in data['conf'] if int(conf) > 0]
+    return service._clean_extracted_text(text), sum(confidences) / len(confidences) if confidences else 0
+
+
+def one_pass(service, processed_image):
+    data = pytesseract.image_to_data(
+        processed_image, config=service.engine.pytesseract_config, output_type=pytesseract.Output.DICT
+    )
+    text, confidence = service._text_and_confidence(data)
+    return service._clean_extracted_text(text), confidence
+
+
+def time_ms(function, *args):
+    samples = []
+    for _ in range(RUNS):
+        start_time = time.perf_counter()
+        result = function(*args)
+        samples.append((time.perf_counter() - start_time) * 1000)
+    return statistics.median(samples), result
+
+
+print("=== OCR Benchmark ===")
+print(f"Tesseract {pytesseract.get_tesseract_version()}, {RUNS} runs per image")
+
+service = OCRService()
+images = load_images()
+totals = {'two_pass': 0.0, 'one_pass': 0.0}
+processed_images = []
+
+for name, image_data in images:
+    pil_image = Image.open(io.BytesIO(image_data))
+    processed_image = service._preprocess_image(cv2.cvtColor(np.array(pil_image.convert('RGB')), cv2.COLOR_RGB2BGR))
+    processed_images.append(processed_image)
+
+    two_pass_ms, (two_pass_text, two_pass_confidence) = time_ms(two_pass, service, processed_image)
+    one_pass_ms, (one_pass_text, one_pass_confidence) = time_ms(one_pass, service, processed_image)
+    totals['two_pass'] += two_pass_ms
+    totals['one_pass'] += one_pass_ms
+
+    print(f"\n{name} ({pil_image.width}x{pil_image.height})")
+    print(f"- two passes: {two_pass_ms:.0f}ms, {len(two_pass_text.split())} words, confidence {two_pass_confidence:.1f}")
+    print(f"- one pass:   {one_pass_ms:.0f}ms, {len(one_pass_text.split())} words, confidence {one_pass_confidence:.1f}")
+    print(f"- same text: {two_pass_text == one_pass_text}")
+
+# End to end through the service, including decoding and preprocessing
+end_to_end = []
+for name, image_data in images:
+    upload = io.BytesIO(image_data)
+    elapsed, result = time_ms(lambda: (upload.seek(0), service.extract_text_from_image(upload))[1])
+    end_to_end.append(elapsed)
+
+print(f"\n=== Summary ({len(images)} images) ===")
+print(f"- Tesseract per image: {totals['two_pass'] / len(images):.0f}ms -> {totals['one_pass'] / len(images):.0f}ms "
+      f"({(1 - totals['one_pass'] / totals['two_pass']) * 100:.0f}% less)")
+print(f"- extract_text_from_image per image ({service.engine.backend}): {statistics.mean(end_to_end):.0f}ms")
+
+# Recognition throughput per engine, one caller and one caller per pooled handle
+print(f"\n=== Engine Throughput ({THROUGHPUT_ROUNDS} rounds of {len(images)} images) ===")
+backends = ['pytesseract'] + (['tesserocr'] if TESSEROCR_AVAILABLE else [])
+if not TESSEROCR_AVAILABLE:
+    print("- tesserocr is not installed, only pytesseract is measured")
+
+throughput = {}
+for backend in backends:
+    engine = OCREngine()
+    engine.backend = backend
+    engine.image_to_data(processed_images[0])  # warm up: model load / first handle
+    workload = processed_images * THROUGHPUT_ROUNDS
+
+    start_time = time.perf_counter()
+    for processed_image in workload:
+        engine.image_to_data(processed_image)
+    sequential = len(workload) / (time.perf_counter() - start_time)
+
+    start_time = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=engine.pool_size) as executor:
+        list(executor.map(engine.image_to_data, workload))
+    concurrent = len(workload) / (time.perf_counter() - start_time)
+
+    throughput[backend] = sequential
+    print(f"- {backend}: {sequential:.2f} images/s sequential, "
+          f"{concurrent:.2f} images/s with {engine.pool_size} threads")
+
+if len(throughput) == 2:
+    print(f"- tesserocr vs pytesseract: {throughput['tesserocr'] / throughput['pytesseract']:.2f}x sequential")
+
+# Decode and preprocessing: full-size RGB -> BGR -> gray vs draft-mode grayscale
+print(f"\n=== Decode and Preprocessing (max dimension {service.max_dimension}px) ===")
+decode_images = list(images)
+if not os.environ.get('OCR_BENCHMARK_DIR'):
+    decode_images.append(('fir_photo_48mp.jpg', synthetic_photo(FIR_TEXT, 5, size=(6000, 8000))))
+
+for name, image_data in decode_images:
+    legacy_ms, legacy_image = time_ms(legacy_preprocess, image_data)
+    lean_ms, lean_image = time_ms(lean_preprocess, service, image_data)
+    legacy_mb = peak_memory_mb(legacy_preprocess, image_data)
+    lean_mb = peak_memory_mb(lean_preprocess, service, image_data)
+
+    print(f"\n{name} ({len(image_data) / (1024 * 1024):.1f}MB)")
+    print(f"- full decode: {legacy_ms:.0f}ms, peak +{legacy_mb:.0f}MB, {legacy_image.shape[1]}x{legacy_image.shape[0]}")
+    print(f"- lean decode: {lean_ms:.0f}ms, peak +{lean_mb:.0f}MB, {lean_image.shape[1]}x{lean_image.shape[0]}")
+
+    try:
+        legacy_ocr_ms, legacy_result = time_ms(one_pass, service, legacy_image)
+        lean_ocr_ms, lean_result = time_ms(one_pass, service, lean_image)
+    except pytesseract.TesseractNotFoundError:
+        continue
+    print(f"- Tesseract: {legacy_ocr_ms:.0f}ms -> {lean_ocr_ms:.0f}ms, "
+          f"{len(legacy_result[0].split())} -> {len(lean_result[0].split())} words, "
+          f"confidence {legacy_result[1]:.1f} -> {lean_result[1]:.1f}")
+
+print(f"\n=== Benchmark Complete ===")
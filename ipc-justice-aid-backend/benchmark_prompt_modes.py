@@ -0,0 +1,70 @@
+"""
+Compare the full and compact Ollama prompt modes
+Run this with: python manage.py shell < benchmark_prompt_modes.py
+
+Prompt sizes are always reported. When Ollama is reachable each prompt is also
+sent RUNS times and the prompt/output token counts and wall-clock are averaged.
+"""
+
+import time
+
+from ipc_analysis.ipc_catalog import ipc_catalog
+from leads.services import ollama_ipc_service
+
+RUNS = 3
+
+test_case = """
+A man named Raj was driving his car recklessly on a busy road. Due to his negligent driving,
+he hit a pedestrian who later died in the hospital. The investigation revealed that Raj was
+not under the influence of alcohol but was driving at excessive speed and using his mobile phone.
+"""
+
+print("=== Prompt Mode Benchmark ===")
+print(f"IPC catalog: {len(ipc_catalog)} sections")
+
+prompts = {
+    'full': ollama_ipc_service._construct_analysis_prompt(test_case, None, None),
+    'compact': ollama_ipc_service._construct_compact_prompt(test_case, None, None),
+}
+
+print(f"\n=== Prompt Size ===")
+for mode, prompt in prompts.items():
+    # ~4 characters per token is close enough for a relative comparison
+    print(f"- {mode}: {len(prompt)} chars (~{len(prompt) // 4} tokens), "
+          f"num_predict={ollama_ipc_service.NUM_PREDICT[mode]}")
+
+print(f"\n=== Ollama Runs ({RUNS} per mode) ===")
+results = {}
+for mode, prompt in prompts.items():
+    payload = ollama_ipc_service._build_request_payload(prompt, mode)
+    samples = []
+    for run in range(RUNS):
+        start_time = time.time()
+        try:
+            response = ollama_ipc_service.client.post(
+                f"{ollama_ipc_service.base_url}/api/generate", json=payload, timeout=ollama_ipc_service.timeout
+            )
+            response.raise_for_status()
+        except Exception as e:
+            print(f"- {mode}: Ollama not reachable ({str(e)}), skipping runs")
+            break
+        result = response.json()
+        samples.append({
+            'wall_ms': (time.time() - start_time) * 1000,
+            'prompt_tokens': result.get('prompt_eval_count', 0),
+            'output_tokens': result.get('eval_count', 0),
+        })
+
+    if samples:
+        results[mode] = {key: sum(s[key] for s in samples) / len(samples) for key in samples[0]}
+        print(f"- {mode}: {results[mode]['prompt_tokens']:.0f} prompt tokens, "
+              f"{results[mode]['output_tokens']:.0f} output tokens, {results[mode]['wall_ms']:.0f}ms")
+
+if len(results) == 2:
+    full, compact = results['full'], results['compact']
+    print(f"\n=== Reduction ===")
+    for key in ('prompt_tokens', 'output_tokens', 'wall_ms'):
+        if full[key]:
+            print(f"- {key}: {(1 - compact[key] / full[key]) * 100:.1f}%")
+
+print(f"\n=== Benchmark Complete ===")
@@ -0,0 +1,235 @@
+"""
+Benchmark upload handling for OCR and document summarization: peak memory and
+latency of the old path, which read the whole upload into a BytesIO for
+validation and again for extraction (and pickled the bytes to the OCR pool),
+against the single-read path that parses the upload buffer or memory-mapped
+temp file in place
+Run this with: python manage.py shell < benchmark_uploads.py
+
+Generates a ~10MB phone-photo JPEG and a ~50MB scanned-document PDF (text
+pages with embedded page images) and wraps them in the same
+TemporaryUploadedFile objects Django creates for large uploads. Tesseract is
+not involved: the image path is timed up to the grayscale decode.
+"""
+
+import ctypes
+import ctypes.util
+import io
+import os
+import pickle
+import statistics
+import threading
+import time
+import zlib
+
+import numpy as np
+import PyPDF2
+from django.core.files.uploadedfile import TemporaryUploadedFile
+from PIL import Image
+
+from ipc_analysis.document_summarizer_service import document_summarizer_service
+from ipc_analysis.ocr_service import OCRService
+from ipc_analysis.uploads import open_source, picklable_source
+
+RUNS = 3
+IMAGE_TARGET_MB = 9.5
+PDF_TARGET_MB = 48
+PDF_PAGES = 40
+M_MMAP_THRESHOLD = -3  # glibc mallopt parameter
+
+
+def noisy_photo_jpeg(target_mb):
+    """JPEG of a 12MP noisy photo, just under target_mb"""
+    rng = np.random.default_rng(7)
+    height, width = 4032, 3024
+    gradient = np.linspace(90, 200, width, dtype=np.float32)[None, :, None]
+    pixels = np.clip(gradient + rng.normal(0, 40, (height, width, 3)), 0, 255).astype(np.uint8)
+    photo = Image.fromarray(pixels)
+    for quality in (95, 92, 90, 85, 80, 75, 70, 60, 50):
+        buffer = io.BytesIO()
+        photo.save(buffer, format='JPEG', quality=quality)
+        if buffer.tell() <= target_mb * 1024 * 1024:
+            break
+    return buffer.getvalue()
+
+
+def scanned_pdf(target_mb, pages):
+    """PDF whose pages each carry a line of text and an incompressible page image"""
+    rng = np.random.default_rng(11)
+    image_bytes = int(target_mb * 1024 * 1024 / pages)
+    image_side = int(image_bytes ** 0.5)
+
+    objects = []
+
+    def add(body):
+        objects.append(body)
+        return len(objects)
+
+    font = add(b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>')
+    page_ids = []
+    pages_id = len(objects) + 1 + pages * 3
+    for number in range(pages):
+        pixels = rng.integers(0, 256, image_side * image_side, dtype=np.uint8).tobytes()
+        image = add(
+            f'<< /Type /XObject /Subtype /Image /Width {image_side} /Height {image_side} '
+            f'/ColorSpace /DeviceGray /BitsPerComponent 8 /Length {len(pixels)} >>\nstream\n'.encode()
+            + pixels + b'\nendstream'
+        )
+        text = zlib.compress(
+            f'q 500 0 0 700 50 50 cm /Im0 Do Q BT /F1 12 Tf 50 780 Td '
+            f'(Page {number + 1}: The accused is charged under Section 420 of the Indian Penal Code.) Tj ET'.encode()
+        )
+        content = add(f'<< /Length {len(text)} /Filter /FlateDecode >>\nstream\n'.encode() + text + b'\nendstream')
+        page_ids.append(add(
+            f'<< /Type /Page /Parent {pages_id} 0 R /MediaBox [0 0 612 792] /Contents {content} 0 R '
+            f'/Resources << /Font << /F1 {font} 0 R >> /XObject << /Im0 {image} 0 R >> >> >>'.encode()
+        ))
+    kids = ' '.join(f'{page} 0 R' for page in page_ids)
+    add(f'<< /Type /Pages /Kids [{kids}] /Count {pages} >>'.encode())
+    catalog = add(f'<< /Type /Catalog /Pages {pages_id} 0 R >>'.encode())
+
+    pdf = io.BytesIO()
+    pdf.write(b'%PDF-1.4\n')
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(pdf.tell())
+        pdf.write(f'{number} 0 obj\n'.encode() + body + b'\nendobj\n')
+    xref = pdf.tell()
+    pdf.write(f'xref\n0 {len(objects) + 1}\n0000000000 65535 f \n'.encode())
+    for offset in offsets:
+        pdf.write(f'{offset:010d} 00000 n \n'.encode())
+    pdf.write(f'trailer\n<< /Size {len(objects) + 1} /Root {catalog} 0 R >>\nstartxref\n{xref}\n%%EOF\n'.encode())
+    return pdf.getvalue()
+
+
+def spooled_upload(name, content_type, data):
+    """TemporaryUploadedFile, as Django builds it for uploads over FILE_UPLOAD_MAX_MEMORY_SIZE"""
+    upload = TemporaryUploadedFile(name, content_type, len(data), None)
+    upload.write(data)
+    upload.flush()
+    upload.seek(0)
+    return upload
+
+
+def _status_kb(field):
+    with open('/proc/self/status') as status:
+        for line in status:
+            if line.startswith(f'{field}:'):
+                return int(line.split()[1])
+    return 0
+
+
+def _sample_peak(field, peak, done):
+    while not done.is_set():
+        peak[0] = max(peak[0], _status_kb(field))
+        done.wait(0.002)
+
+
+def peak_memory_mb(function, *args):
+    """
+    Peak growth of RSS and of private (anonymous) memory while running
+    function once, measured in a forked child
+
+    Mapped temp file pages count towards RSS but are shared page cache, so
+    the private peak is sampled as well.
+    """
+    read_fd, write_fd = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        os.close(read_fd)
+        # Release memory the parent freed but kept in the heap, and serve big
+        # buffers from fresh mappings, so reused heap pages don't hide them
+        libc = ctypes.CDLL(ctypes.util.find_library('c'))
+        libc.mallopt(M_MMAP_THRESHOLD, 128 * 1024)
+        libc.malloc_trim(0)
+        # The child starts with the parent's high-water mark; reset it to the current RSS
+        with open('/proc/self/clear_refs', 'w') as clear_refs:
+            clear_refs.write('5')
+        start_kb = _status_kb('VmRSS')
+        start_anon_kb = _status_kb('RssAnon')
+        anon_peak, done = [start_anon_kb], threading.Event()
+        sampler = threading.Thread(target=_sample_peak, args=('RssAnon', anon_peak, done))
+        sampler.start()
+        function(*args)
+        anon_peak[0] = max(anon_peak[0], _status_kb('RssAnon'))
+        done.set()
+        sampler.join()
+        os.write(write_fd, f"{_status_kb('VmHWM') - start_kb} {anon_peak[0] - start_anon_kb}".encode())
+        os._exit(0)
+    os.close(write_fd)
+    with os.fdopen(read_fd) as reader:
+        rss_kb, anon_kb = (int(value) for value in reader.read().split())
+    os.waitpid(pid, 0)
+    return rss_kb / 1024, anon_kb / 1024
+
+
+def legacy_image(service, upload):
+    """Validation, pool hand-off and decode as they were before the single-read path"""
+    image_data = upload.read()
+    upload.seek(0)
+    Image.open(io.BytesIO(image_data)).verify()
+
+    image_data = upload.read()
+    upload.seek(0)
+    payload = pickle.dumps((image_data, time.time()))  # what ProcessPoolExecutor sends
+    image_data, _ = pickle.loads(payload)  # in the pool process
+    return service._load_grayscale(Image.open(io.BytesIO(image_data)))
+
+
+def single_read_image(service, upload):
+    service.validate_image_file(upload)
+
+    payload = pickle.dumps((picklable_source(upload), time.time()))
+    source, _ = pickle.loads(payload)
+    with open_source(source) as stream:
+        return service._load_grayscale(Image.open(stream))
+
+
+def legacy_pdf(upload):
+    pdf_data = upload.read()
+    upload.seek(0)
+    pdf_reader = PyPDF2.PdfReader(io.BytesIO(pdf_data))
+    return '\n'.join(page.extract_text() for page in pdf_reader.pages)
+
+
+def single_read_pdf(upload):
+    return document_summarizer_service._extract_text_from_pdf(upload)['text']
+
+
+def time_ms(function, *args):
+    start = time.perf_counter()
+    function(*args)
+    return (time.perf_counter() - start) * 1000
+
+
+def compare(label, old, new, *args):
+    old_ms = statistics.median(time_ms(old, *args) for _ in range(RUNS))
+    new_ms = statistics.median(time_ms(new, *args) for _ in range(RUNS))
+    old_rss, old_private = peak_memory_mb(old, *args)
+    new_rss, new_private = peak_memory_mb(new, *args)
+    print(f"- {label}")
+    print(f"    before:      {old_ms:7.0f}ms  peak RSS +{old_rss:6.1f}MB  private +{old_private:6.1f}MB")
+    print(f"    single read: {new_ms:7.0f}ms  peak RSS +{new_rss:6.1f}MB  private +{new_private:6.1f}MB")
+
+
+service = OCRService()
+image_data = noisy_photo_jpeg(IMAGE_TARGET_MB)
+pdf_data = scanned_pdf(PDF_TARGET_MB, PDF_PAGES)
+image_upload = spooled_upload('notice.jpg', 'image/jpeg', image_data)
+pdf_upload = spooled_upload('chargesheet.pdf', 'application/pdf', pdf_data)
+del image_data, pdf_data
+
+assert service.validate_image_file(image_upload)['valid']
+assert legacy_pdf(pdf_upload) == single_read_pdf(pdf_upload)
+
+print("\n## Upload Handling")
+print(f"Median of {RUNS} runs; peaks are measured in a forked process")
+compare(f"{image_upload.size / 1024 / 1024:.1f}MB JPEG: validate, hand off to the OCR pool, decode",
+        lambda upload: legacy_image(service, upload),
+        lambda upload: single_read_image(service, upload),
+        image_upload)
+compare(f"{pdf_upload.size / 1024 / 1024:.1f}MB PDF ({PDF_PAGES} pages): extract text",
+        legacy_pdf, single_read_pdf, pdf_upload)
+
+image_upload.close()
+pdf_upload.close()
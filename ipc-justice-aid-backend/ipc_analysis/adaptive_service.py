@@ -1,14 +1,35 @@
 import os
+import math
+import time
+import asyncio
 import logging
-from typing import Dict, Any
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import Dict, Any, Iterator, Tuple
+from asgiref.sync import sync_to_async
 from django.conf import settings
+from django.core.cache import cache
 
 from .services import OllamaService
 from .gemini_service import GeminiService
+from .analysis_cache import analysis_cache
+from .streaming import SectionStreamParser
+from .circuit_breaker import circuit_breakers
+from .analysis_schema import parse_failures
+from .concurrency import BackendOverloadedError
+from .local_classifier import local_ipc_classifier
+from .ipc_retrieval import ipc_retriever
+from .metrics import provider_metrics
 
 logger = logging.getLogger(__name__)
 
 
+def _in_thread(func):
+    """Wrap a blocking cache/Redis helper so the async paths don't run it on the event loop"""
+    return sync_to_async(func, thread_sensitive=False)
+
+
 class AdaptiveAnalysisService:
     """
     Adaptive service that chooses between:
@@ -17,6 +38,9 @@ class AdaptiveAnalysisService:
     based on environment configuration
     """
     
+    HEDGING_STATS_PREFIX = 'ipc_analysis:hedging'
+    HEDGING_STAT_NAMES = ('requests', 'hedges', 'launched', 'wins')
+    
     def __init__(self):
         self.environment = getattr(settings, 'ANALYSIS_ENVIRONMENT', 'auto')
         self.service_priority = self._determine_service_priority()
@@ -41,6 +65,25 @@ class AdaptiveAnalysisService:
                     logger.info("Ollama service initialized as local fallback")
                 except Exception:
                     logger.warning("Could not initialize Ollama fallback service")
+        
+        # Hedged requests: fire the fallback when the primary is slower than usual
+        hedging_settings = getattr(settings, 'ANALYSIS_HEDGING_SETTINGS', {})
+        self.hedging_enabled = hedging_settings.get('ENABLED', False)
+        self.hedge_percentile = hedging_settings.get('PERCENTILE', 95)
+        self.hedge_default_delay = hedging_settings.get('DEFAULT_DELAY_MS', 10000) / 1000
+        self.hedge_min_delay = hedging_settings.get('MIN_DELAY_MS', 1000) / 1000
+        self.hedge_min_samples = hedging_settings.get('MIN_SAMPLES', 20)
+        self._latencies = {
+            'gemini': deque(maxlen=hedging_settings.get('WINDOW_SIZE', 200)),
+            'ollama': deque(maxlen=hedging_settings.get('WINDOW_SIZE', 200)),
+        }
+        self._latency_lock = threading.Lock()
+        self._hedge_executor = None
+        if self.hedging_enabled:
+            self._hedge_executor = ThreadPoolExecutor(
+                max_workers=hedging_settings.get('MAX_WORKERS', 8),
+                thread_name_prefix='analysis-hedge'
+            )
     
     def _determine_service_priority(self) -> Dict[str, str]:
         """Determine which service to use based on environment and availability"""
@@ -92,49 +135,571 @@ class AdaptiveAnalysisService:
         """
         Analyze legal case using the appropriate service with fallback support
         
+        Results produced by the primary service are served from the analysis
+        cache when the same description was analyzed before. When the local
+        classifier is enabled its prediction is attached as ``preliminary``,
+        or returned on its own if it is confident enough in 'full' mode.
+        
         Args:
             case_description (str): The legal case description
             
         Returns:
             Dict containing the analysis response and metadata
         """
+        start_time = time.time()
+        classification = local_ipc_classifier.classify(case_description)
+        if classification and classification['full_answer']:
+            return self._record_analysis(self._local_response(classification, start_time), start_time)
+        
+        result = self._with_local_answer(self._analyze_cached(case_description), classification, start_time)
+        return self._record_analysis(result, start_time)
+    
+    async def aanalyze_case(self, case_description: str) -> Dict[str, Any]:
+        """Async variant of analyze_case for the async views"""
+        start_time = time.time()
+        classification = await _in_thread(local_ipc_classifier.classify)(case_description)
+        if classification and classification['full_answer']:
+            return self._record_analysis(self._local_response(classification, start_time), start_time)
+        
+        result = await self._aanalyze_cached(case_description)
+        return self._record_analysis(self._with_local_answer(result, classification, start_time), start_time)
+    
+    def _analyze_cached(self, case_description: str) -> Dict[str, Any]:
+        """Analyze with the LLM services through the analysis cache"""
         primary_service = self.service_priority['primary']
+        service = self._get_service(primary_service)
+        if service is None:
+            return self._analyze_uncached(case_description)
         
-        try:
-            # Try primary service
-            if primary_service == 'gemini' and self.gemini_service:
-                logger.debug("Using Gemini service for analysis")
-                result = self.gemini_service.analyze_case(case_description)
-                result['service_used'] = 'gemini'
+        start_time = time.time()
+        result, cache_hit = analysis_cache.get_or_compute(
+            case_description,
+            provider=primary_service,
+            model_name=service.model_name,
+            prompt_version=service.PROMPT_VERSION,
+            compute=lambda: self._analyze_uncached(case_description),
+            is_cacheable=lambda r: (
+                r.get('success') and r.get('service_used') == primary_service
+                and not (r.get('analysis') or {}).get('partial')
+            ),
+        )
+        
+        if cache_hit:
+            result['cached'] = True
+            result['cached_response_time_ms'] = result.get('response_time_ms')
+            result['response_time_ms'] = int((time.time() - start_time) * 1000)
+        elif result.get('coalesced'):
+            result['response_time_ms'] = int((time.time() - start_time) * 1000)
+        
+        return result
+    
+    async def _aanalyze_cached(self, case_description: str) -> Dict[str, Any]:
+        """Async variant of _analyze_cached"""
+        primary_service = self.service_priority['primary']
+        service = self._get_service(primary_service)
+        if service is None:
+            return await self._aanalyze_uncached(case_description)
+        
+        start_time = time.time()
+        result, cache_hit = await analysis_cache.aget_or_compute(
+            case_description,
+            provider=primary_service,
+            model_name=service.model_name,
+            prompt_version=service.PROMPT_VERSION,
+            compute=lambda: self._aanalyze_uncached(case_description),
+            is_cacheable=lambda r: (
+                r.get('success') and r.get('service_used') == primary_service
+                and not (r.get('analysis') or {}).get('partial')
+            ),
+        )
+        
+        if cache_hit:
+            result['cached'] = True
+            result['cached_response_time_ms'] = result.get('response_time_ms')
+            result['response_time_ms'] = int((time.time() - start_time) * 1000)
+        elif result.get('coalesced'):
+            result['response_time_ms'] = int((time.time() - start_time) * 1000)
+        
+        return result
+    
+    def _record_analysis(self, result: Dict[str, Any], start_time: float) -> Dict[str, Any]:
+        """Record the analysis duration, and a fallback when the primary didn't serve it"""
+        service_used = result.get('service_used')
+        provider_metrics.observe_analysis(service_used, time.time() - start_time, bool(result.get('cached')))
+        if service_used and ('fallback' in service_used or result.get('fallback_reason')):
+            provider_metrics.count_fallback(self.service_priority['primary'], service_used)
+        return result
+    
+    def _local_response(self, classification: Dict[str, Any], start_time: float,
+                        error_message: str = None) -> Dict[str, Any]:
+        """Serve the local classifier's prediction as the analysis"""
+        result = {
+            'success': True,
+            'analysis': local_ipc_classifier.build_analysis(classification),
+            'response_time_ms': int((time.time() - start_time) * 1000),
+            'raw_response': None,
+            'service_used': 'local_classifier',
+            'error': None
+        }
+        if error_message:
+            result['fallback_reason'] = error_message
+        return result
+    
+    def _with_local_answer(self, result: Dict[str, Any], classification: Dict[str, Any],
+                           start_time: float) -> Dict[str, Any]:
+        """Attach the local prediction to an LLM result, or stand in for a failed one"""
+        if not classification or not classification['sections']:
+            return result
+        if result.get('service_used') == 'fallback':
+            logger.warning("All analysis services failed, serving the local classifier's prediction")
+            return self._local_response(classification, start_time, result.get('error'))
+        result['preliminary'] = local_ipc_classifier.build_analysis(classification)
+        return result
+    
+    def _get_service(self, service_name: str):
+        """Return the service instance for a provider name, if initialized"""
+        if service_name == 'gemini':
+            return self.gemini_service
+        if service_name == 'ollama':
+            return self.ollama_service
+        return None
+    
+    def _analyze_uncached(self, case_description: str) -> Dict[str, Any]:
+        """Run the analysis against the primary service, falling back on failure"""
+        primary_service = self.service_priority['primary']
+        
+        if self._can_hedge():
+            return self._analyze_hedged(case_description)
+        
+        errors = []
+        overloaded = None
+        for service_name in self._get_candidates():
+            if not circuit_breakers.get(service_name).allow_request():
+                logger.warning(f"Skipping {service_name}: circuit open")
+                errors.append(f"{service_name}: circuit open")
+                continue
+            
+            logger.debug(f"Using {service_name} service for analysis")
+            try:
+                result = self._call_service(service_name, case_description)
+            except BackendOverloadedError as e:
+                overloaded = e
+                result = {'success': False, 'error': str(e)}
+            except Exception as e:
+                result = {'success': False, 'error': str(e)}
+            
+            if result.get('success'):
+                if service_name != primary_service:
+                    result['service_used'] = f"{service_name}_fallback"
+                    result['fallback_reason'] = '; '.join(errors)
+                    result['primary_service_failed'] = primary_service
                 return result
-                
-            elif primary_service == 'ollama' and self.ollama_service:
-                logger.debug("Using Ollama service for analysis")
-                result = self.ollama_service.analyze_case(case_description)
-                result['service_used'] = 'ollama'
+            
+            logger.error(f"Error in analysis service ({service_name}): {result.get('error')}")
+            errors.append(f"{service_name}: {result.get('error')}")
+        
+        if overloaded is not None:
+            # Let the API answer with Retry-After rather than a failed analysis
+            raise overloaded
+        
+        # All services failed
+        error_message = '; '.join(errors) or f"Primary service '{primary_service}' not available"
+        return self._get_fallback_response(case_description, error_message)
+    
+    async def _aanalyze_uncached(self, case_description: str) -> Dict[str, Any]:
+        """Async variant of _analyze_uncached"""
+        primary_service = self.service_priority['primary']
+        
+        if await _in_thread(self._can_hedge)():
+            return await self._aanalyze_hedged(case_description)
+        
+        errors = []
+        overloaded = None
+        for service_name in self._get_candidates():
+            if not await _in_thread(circuit_breakers.get(service_name).allow_request)():
+                logger.warning(f"Skipping {service_name}: circuit open")
+                errors.append(f"{service_name}: circuit open")
+                continue
+            
+            try:
+                result = await self._acall_service(service_name, case_description)
+            except BackendOverloadedError as e:
+                overloaded = e
+                result = {'success': False, 'error': str(e)}
+            except Exception as e:
+                result = {'success': False, 'error': str(e)}
+            
+            if result.get('success'):
+                if service_name != primary_service:
+                    result['service_used'] = f"{service_name}_fallback"
+                    result['fallback_reason'] = '; '.join(errors)
+                    result['primary_service_failed'] = primary_service
                 return result
+            
+            logger.error(f"Error in analysis service ({service_name}): {result.get('error')}")
+            errors.append(f"{service_name}: {result.get('error')}")
+        
+        if overloaded is not None:
+            raise overloaded
+        
+        error_message = '; '.join(errors) or f"Primary service '{primary_service}' not available"
+        return self._get_fallback_response(case_description, error_message)
+    
+    def _get_candidates(self):
+        """Providers to try, in order"""
+        primary_service = self.service_priority['primary']
+        candidates = [primary_service]
+        if primary_service == 'gemini':
+            candidates.append('ollama')
+        return [name for name in candidates if self._get_service(name) is not None]
+    
+    def _can_hedge(self) -> bool:
+        return (
+            self.hedging_enabled
+            and self.service_priority['primary'] == 'gemini'
+            and self.gemini_service is not None
+            and self.ollama_service is not None
+            and circuit_breakers.get('gemini').is_closed()
+            and circuit_breakers.get('ollama').is_closed()
+        )
+    
+    def _analyze_hedged(self, case_description: str) -> Dict[str, Any]:
+        """
+        Run the primary, and also the fallback if the primary is slow
+        
+        The fallback is fired when the primary has not answered within the
+        configured percentile of its recent latencies, or straight away if the
+        primary fails first. The first successful response wins; the loser is
+        left to finish in the background and its result is discarded.
+        """
+        primary_service = 'gemini'
+        secondary_service = 'ollama'
+        self._incr_hedging_stat(primary_service, 'requests')
+        
+        futures = {self._launch(primary_service, case_description): primary_service}
+        hedge_delay = self._get_hedge_delay(primary_service)
+        done, pending = wait(futures, timeout=hedge_delay)
+        
+        hedged = False
+        if not done:
+            logger.info(f"Gemini has not answered within {hedge_delay:.1f}s, hedging with Ollama")
+            futures[self._launch(secondary_service, case_description)] = secondary_service
+            self._incr_hedging_stat(primary_service, 'hedges')
+            pending = set(futures)
+            hedged = True
+        
+        errors = []
+        overloaded = None
+        while pending or done:
+            for future in done:
+                service_name = futures[future]
+                try:
+                    result = future.result()
+                except BackendOverloadedError as e:
+                    overloaded = e
+                    result = {'success': False, 'error': str(e)}
+                except Exception as e:
+                    result = {'success': False, 'error': str(e)}
                 
-            else:
-                # Primary service not available, try fallbacks
-                raise Exception(f"Primary service '{primary_service}' not available")
+                if result.get('success'):
+                    for other in pending:
+                        other.cancel()
+                    self._incr_hedging_stat(service_name, 'wins')
+                    result['hedged'] = hedged
+                    if service_name != primary_service:
+                        result['service_used'] = f"{service_name}_fallback"
+                        result['primary_service_failed'] = primary_service
+                        result['fallback_reason'] = '; '.join(errors) or 'primary exceeded hedge delay'
+                    return result
                 
+                logger.error(f"Hedged analysis failed on {service_name}: {result.get('error')}")
+                errors.append(f"{service_name}: {result.get('error')}")
+            
+            if not pending and secondary_service not in futures.values():
+                # Primary failed before the hedge fired, fall back immediately
+                pending = {self._launch(secondary_service, case_description)}
+                futures[next(iter(pending))] = secondary_service
+            
+            if not pending:
+                break
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        
+        if overloaded is not None:
+            raise overloaded
+        return self._get_fallback_response(case_description, '; '.join(errors))
+    
+    async def _aanalyze_hedged(self, case_description: str) -> Dict[str, Any]:
+        """
+        Async variant of _analyze_hedged
+        
+        Both calls run as tasks on the event loop, so the losing call is
+        cancelled instead of being left to finish.
+        """
+        primary_service = 'gemini'
+        secondary_service = 'ollama'
+        incr_stat = _in_thread(self._incr_hedging_stat)
+        await incr_stat(primary_service, 'requests')
+        
+        tasks = {await self._alaunch(primary_service, case_description): primary_service}
+        hedge_delay = self._get_hedge_delay(primary_service)
+        done, pending = await asyncio.wait(tasks, timeout=hedge_delay)
+        
+        hedged = False
+        if not done:
+            logger.info(f"Gemini has not answered within {hedge_delay:.1f}s, hedging with Ollama")
+            tasks[await self._alaunch(secondary_service, case_description)] = secondary_service
+            await incr_stat(primary_service, 'hedges')
+            pending = set(tasks)
+            hedged = True
+        
+        errors = []
+        overloaded = None
+        try:
+            while pending or done:
+                for task in done:
+                    service_name = tasks[task]
+                    try:
+                        result = task.result()
+                    except BackendOverloadedError as e:
+                        overloaded = e
+                        result = {'success': False, 'error': str(e)}
+                    except Exception as e:
+                        result = {'success': False, 'error': str(e)}
+                    
+                    if result.get('success'):
+                        await incr_stat(service_name, 'wins')
+                        result['hedged'] = hedged
+                        if service_name != primary_service:
+                            result['service_used'] = f"{service_name}_fallback"
+                            result['primary_service_failed'] = primary_service
+                            result['fallback_reason'] = '; '.join(errors) or 'primary exceeded hedge delay'
+                        return result
+                    
+                    logger.error(f"Hedged analysis failed on {service_name}: {result.get('error')}")
+                    errors.append(f"{service_name}: {result.get('error')}")
+                
+                if not pending and secondary_service not in tasks.values():
+                    # Primary failed before the hedge fired, fall back immediately
+                    task = await self._alaunch(secondary_service, case_description)
+                    tasks[task] = secondary_service
+                    pending = {task}
+                
+                if not pending:
+                    break
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for task in pending:
+                task.cancel()
+        
+        if overloaded is not None:
+            raise overloaded
+        return self._get_fallback_response(case_description, '; '.join(errors))
+    
+    async def _alaunch(self, service_name: str, case_description: str) -> asyncio.Task:
+        await _in_thread(self._incr_hedging_stat)(service_name, 'launched')
+        return asyncio.ensure_future(self._acall_service(service_name, case_description))
+    
+    def _launch(self, service_name: str, case_description: str):
+        self._incr_hedging_stat(service_name, 'launched')
+        return self._hedge_executor.submit(self._call_service, service_name, case_description)
+    
+    def _call_service(self, service_name: str, case_description: str) -> Dict[str, Any]:
+        """Call one provider, recording its latency and the outcome in its circuit breaker"""
+        breaker = circuit_breakers.get(service_name)
+        start_time = time.time()
+        try:
+            result = self._get_service(service_name).analyze_case(case_description)
+        except BackendOverloadedError:
+            # Load shedding on our side says nothing about the provider's health,
+            # but a claimed probe slot has to be given back
+            breaker.release_probe()
+            raise
+        except Exception:
+            breaker.record_failure()
+            raise
+        
+        result['service_used'] = service_name
+        if result.get('success'):
+            breaker.record_success()
+            with self._latency_lock:
+                self._latencies[service_name].append(time.time() - start_time)
+        else:
+            breaker.record_failure()
+        return result
+    
+    async def _acall_service(self, service_name: str, case_description: str) -> Dict[str, Any]:
+        """Async variant of _call_service"""
+        breaker = circuit_breakers.get(service_name)
+        start_time = time.time()
+        try:
+            result = await self._get_service(service_name).aanalyze_case(case_description)
+        except BackendOverloadedError:
+            await _in_thread(breaker.release_probe)()
+            raise
+        except Exception:
+            await _in_thread(breaker.record_failure)()
+            raise
+        
+        result['service_used'] = service_name
+        if result.get('success'):
+            await _in_thread(breaker.record_success)()
+            with self._latency_lock:
+                self._latencies[service_name].append(time.time() - start_time)
+        else:
+            await _in_thread(breaker.record_failure)()
+        return result
+    
+    def _get_hedge_delay(self, service_name: str) -> float:
+        """Return the configured latency percentile of recent successful calls, in seconds"""
+        with self._latency_lock:
+            samples = sorted(self._latencies[service_name])
+        
+        if len(samples) < self.hedge_min_samples:
+            return self.hedge_default_delay
+        
+        index = max(math.ceil(self.hedge_percentile / 100 * len(samples)) - 1, 0)
+        return max(samples[index], self.hedge_min_delay)
+    
+    def _incr_hedging_stat(self, service_name: str, stat_name: str):
+        key = f"{self.HEDGING_STATS_PREFIX}:{service_name}:{stat_name}"
+        try:
+            cache.add(key, 0, None)
+            cache.incr(key)
+        except Exception as e:
+            logger.debug(f"Could not update hedging counter {key}: {str(e)}")
+    
+    def get_hedging_stats(self) -> Dict[str, Any]:
+        """Return hedge rate and per-provider win rate"""
+        stats = {
+            'enabled': self.hedging_enabled,
+            'percentile': self.hedge_percentile,
+            'current_delay_ms': int(self._get_hedge_delay('gemini') * 1000),
+            'providers': {}
+        }
+        try:
+            for service_name in ('gemini', 'ollama'):
+                keys = {
+                    name: f"{self.HEDGING_STATS_PREFIX}:{service_name}:{name}"
+                    for name in self.HEDGING_STAT_NAMES
+                }
+                values = cache.get_many(list(keys.values()))
+                provider_stats = {name: values.get(key, 0) for name, key in keys.items()}
+                provider_stats['hedge_rate'] = (
+                    round(provider_stats['hedges'] / provider_stats['requests'], 4)
+                    if provider_stats['requests'] else 0.0
+                )
+                provider_stats['win_rate'] = (
+                    round(provider_stats['wins'] / provider_stats['launched'], 4)
+                    if provider_stats['launched'] else 0.0
+                )
+                stats['providers'][service_name] = provider_stats
         except Exception as e:
-            logger.error(f"Error in primary analysis service ({primary_service}): {str(e)}")
+            stats['error'] = str(e)
+        return stats
+    
+    def stream_analysis(self, case_description: str) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        """
+        Stream a case analysis as (event, data) pairs
+        
+        Emits a 'preliminary' event with the local classifier's prediction when
+        it is enabled, a 'section' event for every IPC section as soon as the
+        model has finished writing it, a 'reset' event if a provider fails part-way and
+        the fallback starts over, and a final 'done' event carrying the same
+        result dict that analyze_case returns.
+        """
+        start_time = time.time()
+        classification = local_ipc_classifier.classify(case_description)
+        if classification and classification['full_answer']:
+            result = self._local_response(classification, start_time)
+            for section in result['analysis']['sections_applied']:
+                yield 'section', {'key': 'sections_applied', 'section': section}
+            yield 'done', self._record_analysis(result, start_time)
+            return
+        if classification and classification['sections']:
+            yield 'preliminary', local_ipc_classifier.build_analysis(classification)
+        
+        primary_service = self.service_priority['primary']
+        service = self._get_service(primary_service)
+        
+        cache_key = None
+        if service is not None:
+            cache_key = analysis_cache.key_for(
+                case_description,
+                provider=primary_service,
+                model_name=service.model_name,
+                prompt_version=service.PROMPT_VERSION,
+            )
+        
+        if cache_key:
+            cached = analysis_cache.get(cache_key, primary_service)
+            if cached is not None:
+                for section in cached['analysis'].get('sections_applied', []):
+                    yield 'section', {'key': 'sections_applied', 'section': section}
+                cached['cached'] = True
+                cached['cached_response_time_ms'] = cached.get('response_time_ms')
+                cached['response_time_ms'] = int((time.time() - start_time) * 1000)
+                yield 'done', self._record_analysis(cached, start_time)
+                return
+        
+        errors = []
+        overloaded = None
+        for service_name in self._get_candidates():
+            service = self._get_service(service_name)
+            breaker = circuit_breakers.get(service_name)
+            if not breaker.allow_request():
+                errors.append(f"{service_name}: circuit open")
+                continue
             
-            # Try fallback services
-            if primary_service == 'gemini' and self.ollama_service:
-                try:
-                    logger.info("Gemini failed, trying Ollama fallback")
-                    result = self.ollama_service.analyze_case(case_description)
-                    result['service_used'] = 'ollama_fallback'
-                    result['fallback_reason'] = str(e)
-                    result['primary_service_failed'] = primary_service
-                    return result
-                except Exception as fallback_error:
-                    logger.error(f"Ollama fallback also failed: {str(fallback_error)}")
+            parser = SectionStreamParser()
+            sections_sent = 0
+            try:
+                for chunk in service.stream_analysis(case_description):
+                    for array_key, section in parser.feed(chunk):
+                        sections_sent += 1
+                        yield 'section', {'key': array_key, 'section': section}
+            except BackendOverloadedError as e:
+                breaker.release_probe()
+                overloaded = e
+                errors.append(f"{service_name}: {str(e)}")
+                continue
+            except Exception as e:
+                logger.error(f"Streaming analysis failed on {service_name}: {str(e)}")
+                breaker.record_failure()
+                errors.append(f"{service_name}: {str(e)}")
+                if sections_sent:
+                    yield 'reset', {'reason': str(e)}
+                continue
+            
+            breaker.record_success()
+            if service_name == 'gemini':
+                analysis = service._parse_legal_response(parser.buffer, case_description)
+            else:
+                analysis = service._parse_ollama_response(parser.buffer)
             
-            # All services failed
-            return self._get_fallback_response(case_description, str(e))
+            result = {
+                'success': True,
+                'analysis': analysis,
+                'response_time_ms': int((time.time() - start_time) * 1000),
+                'raw_response': parser.buffer,
+                'service_used': service_name if service_name == primary_service else f"{service_name}_fallback",
+                'streamed': True,
+                'error': None
+            }
+            
+            if cache_key and service_name == primary_service:
+                analysis_cache.set(cache_key, primary_service, result, result['response_time_ms'])
+            
+            yield 'done', self._record_analysis(result, start_time)
+            return
+        
+        if overloaded is not None:
+            raise overloaded
+        
+        error_message = '; '.join(errors) or f"Primary service '{primary_service}' not available"
+        result = self._with_local_answer(
+            self._get_fallback_response(case_description, error_message), classification, start_time
+        )
+        yield 'done', self._record_analysis(result, start_time)
     
     def _get_fallback_response(self, case_description: str, error_message: str) -> Dict[str, Any]:
         """Provide a basic fallback response when services fail"""
@@ -207,6 +772,46 @@ class AdaptiveAnalysisService:
                 'service_priority': self.service_priority
             }
     
+    async def ahealth_check(self) -> Dict[str, Any]:
+        """Async variant of health_check; the providers are checked concurrently"""
+        primary_service = self.service_priority['primary']
+        health_data = {
+            'primary': None,
+            'fallbacks': [],
+            'environment': self.environment,
+            'service_priority': self.service_priority
+        }
+        
+        services = [
+            (service_name, service_instance)
+            for service_name, service_instance in (('gemini', self.gemini_service), ('ollama', self.ollama_service))
+            if service_instance
+        ]
+        results = await asyncio.gather(
+            *(service_instance.ahealth_check() for _, service_instance in services),
+            return_exceptions=True
+        )
+        
+        for (service_name, _), health in zip(services, results):
+            if service_name == primary_service:
+                if isinstance(health, Exception):
+                    health = {'status': 'error', 'error': str(health)}
+                health['primary_service'] = True
+                health_data['primary'] = health
+            elif isinstance(health, Exception):
+                health_data['fallbacks'].append({
+                    'status': 'error',
+                    'service': service_name,
+                    'error': str(health),
+                    'role': 'fallback'
+                })
+            else:
+                health['primary_service'] = False
+                health['role'] = 'fallback'
+                health_data['fallbacks'].append(health)
+        
+        return health_data
+    
     def get_service_info(self) -> Dict[str, Any]:
         """Get information about the current service configuration"""
         return {
@@ -218,7 +823,15 @@ class AdaptiveAnalysisService:
                 'ollama': self.ollama_service is not None
             },
             'debug_mode': getattr(settings, 'DEBUG', False),
-            'service_priority': self.service_priority
+            'service_priority': self.service_priority,
+            'analysis_cache': analysis_cache.get_stats(),
+            'hedging': self.get_hedging_stats(),
+            'parse_failures': parse_failures.get_stats(),
+            'local_classifier': local_ipc_classifier.get_info(),
+            'ipc_retrieval': ipc_retriever.get_info(),
+            'circuit_breakers': {
+                name: circuit_breakers.get(name).get_state() for name in self._get_candidates()
+            }
         }
 
 
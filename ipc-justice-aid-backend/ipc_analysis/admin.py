@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import LegalCase, IPCSection, LegalAnalysis, AnalysisHistory
+from .models import LegalCase, IPCSection, LegalAnalysis, AnalysisHistory, BulkAnalysisJob
 
 
 @admin.register(IPCSection)
@@ -52,3 +52,12 @@ class AnalysisHistoryAdmin(admin.ModelAdmin):
     def case_preview(self, obj):
         return f"{obj.case_description[:50]}..."
     case_preview.short_description = 'Case Description'
+
+
+@admin.register(BulkAnalysisJob)
+class BulkAnalysisJobAdmin(admin.ModelAdmin):
+    list_display = ['job_id', 'user', 'status', 'input_format', 'processed_cases', 'total_cases', 'created_at']
+    list_filter = ['status', 'input_format', 'created_at']
+    search_fields = ['job_id', 'user__email']
+    readonly_fields = ['job_id', 'created_at', 'started_at', 'completed_at']
+    date_hierarchy = 'created_at'
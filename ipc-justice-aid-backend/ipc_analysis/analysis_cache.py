@@ -0,0 +1,268 @@
+"""
+Content-addressed result cache for LLM case analysis.
+
+Entries live in the Redis cache configured in ``settings.CACHES`` and are keyed
+on a hash of the normalized case description plus the provider, model name and
+prompt version that produced them.
+"""
+import hashlib
+import logging
+import re
+import time
+import unicodedata
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+
+from .coalescing import async_single_flight, single_flight
+
+logger = logging.getLogger(__name__)
+
+
+class AnalysisCache:
+    """Cache layer placed in front of the LLM analysis services"""
+
+    KEY_PREFIX = 'ipc_analysis:cache'
+    STAT_NAMES = ('hits', 'misses', 'stores', 'saved_ms', 'coalesced')
+
+    def __init__(self):
+        cache_settings = getattr(settings, 'ANALYSIS_CACHE_SETTINGS', {})
+        self.enabled = cache_settings.get('ENABLED', True)
+        self.timeout = cache_settings.get('TTL', 60 * 60 * 24 * 7)
+        self.cache_alias = cache_settings.get('CACHE_ALIAS', 'default')
+
+        # (provider, model_name) pairs already checked against the stored model
+        self._synced_models = set()
+
+    @property
+    def cache(self):
+        return caches[self.cache_alias]
+
+    @staticmethod
+    def normalize_description(case_description: str) -> str:
+        """Normalize a case description so trivially different inputs share a key"""
+        normalized = unicodedata.normalize('NFKC', case_description or '')
+        normalized = normalized.casefold()
+        return re.sub(r'\s+', ' ', normalized).strip()
+
+    def build_key(self, case_description: str, provider: str, model_name: str,
+                  prompt_version: str, **extra) -> str:
+        """Build the cache key for an analysis request"""
+        self._sync_model(provider, model_name)
+        generation = self._get_generation(provider)
+
+        model_digest = hashlib.sha1(model_name.encode('utf-8')).hexdigest()[:12]
+        return (
+            f"{self.KEY_PREFIX}:{provider}:g{generation}:{model_digest}:"
+            f"p{prompt_version}:{self.fingerprint(case_description, **extra)}"
+        )
+
+    def fingerprint(self, case_description: str, **extra) -> str:
+        """Hash the normalized prompt inputs of an analysis request"""
+        hasher = hashlib.sha256()
+        hasher.update(self.normalize_description(case_description).encode('utf-8'))
+        for name in sorted(extra):
+            if extra[name]:
+                hasher.update(f"\x1f{name}={self.normalize_description(str(extra[name]))}".encode('utf-8'))
+        return hasher.hexdigest()
+
+    def key_for(self, *args, **kwargs) -> Optional[str]:
+        """Build a cache key, or return None when caching is disabled or unavailable"""
+        if not self.enabled:
+            return None
+        try:
+            return self.build_key(*args, **kwargs)
+        except Exception as e:
+            logger.warning(f"Analysis cache unavailable: {str(e)}")
+            return None
+
+    def get_or_compute(self, case_description: str, provider: str, model_name: str,
+                       prompt_version: str, compute: Callable[[], Dict[str, Any]],
+                       is_cacheable: Callable[[Dict[str, Any]], bool],
+                       **extra) -> Tuple[Dict[str, Any], bool]:
+        """
+        Return a cached analysis, or compute and store it
+
+        On a miss, identical requests already in flight in this or another
+        worker are coalesced so only one of them calls the provider.
+
+        Args:
+            case_description: The case description being analyzed
+            provider: Provider label (e.g. 'gemini', 'ollama')
+            model_name: Model that produces the analysis
+            prompt_version: Version of the prompt template used
+            compute: Callable producing the analysis on a cache miss
+            is_cacheable: Predicate deciding whether a computed result may be stored
+            **extra: Additional prompt inputs that must be part of the key
+
+        Returns:
+            Tuple of (result, cache_hit). Results shared from a coalesced
+            in-flight call are flagged with ``coalesced``.
+        """
+        key = self.key_for(case_description, provider, model_name, prompt_version, **extra)
+        if key is not None:
+            cached = self.get(key, provider)
+            if cached is not None:
+                return cached, True
+
+        flight_key = self._flight_key(case_description, provider, model_name, prompt_version, **extra)
+
+        start_time = time.time()
+        result, shared = single_flight.do(flight_key, compute)
+        elapsed_ms = int((time.time() - start_time) * 1000)
+
+        if shared:
+            # The leader has already stored the result
+            self._incr(provider, 'coalesced')
+            return dict(result, coalesced=True), False
+
+        if key is not None and is_cacheable(result):
+            self.set(key, provider, result, elapsed_ms)
+
+        return result, False
+
+    async def aget_or_compute(self, case_description: str, provider: str, model_name: str,
+                              prompt_version: str, compute: Callable[[], Awaitable[Dict[str, Any]]],
+                              is_cacheable: Callable[[Dict[str, Any]], bool],
+                              **extra) -> Tuple[Dict[str, Any], bool]:
+        """
+        Async variant of get_or_compute for the async views
+
+        ``compute`` is a coroutine function. Identical requests are coalesced
+        within the worker's event loop first, then across workers and Celery
+        processes through Redis; cache reads and writes run in a thread.
+        """
+        key = await sync_to_async(self.key_for, thread_sensitive=False)(
+            case_description, provider, model_name, prompt_version, **extra
+        )
+        if key is not None:
+            cached = await sync_to_async(self.get, thread_sensitive=False)(key, provider)
+            if cached is not None:
+                return cached, True
+
+        flight_key = self._flight_key(case_description, provider, model_name, prompt_version, **extra)
+
+        start_time = time.time()
+        (result, shared_across_workers), shared = await async_single_flight.do(
+            flight_key, lambda: single_flight.ado(flight_key, compute)
+        )
+        shared = shared or shared_across_workers
+        elapsed_ms = int((time.time() - start_time) * 1000)
+
+        if shared:
+            await sync_to_async(self._incr, thread_sensitive=False)(provider, 'coalesced')
+            return dict(result, coalesced=True), False
+
+        if key is not None and is_cacheable(result):
+            await sync_to_async(self.set, thread_sensitive=False)(key, provider, result, elapsed_ms)
+
+        return result, False
+
+    def _flight_key(self, case_description: str, provider: str, model_name: str,
+                    prompt_version: str, **extra) -> str:
+        return (
+            f"{provider}:{hashlib.sha1(model_name.encode('utf-8')).hexdigest()[:12]}:"
+            f"p{prompt_version}:{self.fingerprint(case_description, **extra)}"
+        )
+
+    def get(self, key: str, provider: str) -> Optional[Dict[str, Any]]:
+        """Look up a cached result, recording the hit or miss"""
+        try:
+            entry = self.cache.get(key)
+        except Exception as e:
+            logger.warning(f"Analysis cache lookup failed: {str(e)}")
+            return None
+
+        if entry is None:
+            self._incr(provider, 'misses')
+            return None
+
+        self._incr(provider, 'hits')
+        self._incr(provider, 'saved_ms', entry.get('compute_ms', 0))
+        logger.info(f"Analysis cache hit for provider {provider}")
+        return entry['result']
+
+    def set(self, key: str, provider: str, result: Dict[str, Any], compute_ms: int = 0):
+        """Store a computed result"""
+        try:
+            self.cache.set(key, {'result': result, 'compute_ms': compute_ms}, self.timeout)
+            self._incr(provider, 'stores')
+        except Exception as e:
+            logger.warning(f"Analysis cache store failed: {str(e)}")
+
+    def invalidate(self, provider: str):
+        """Invalidate every cached result for a provider by bumping its generation"""
+        generation_key = self._generation_key(provider)
+        try:
+            self.cache.add(generation_key, 0, None)
+            generation = self.cache.incr(generation_key)
+            logger.info(f"Invalidated analysis cache for provider {provider} (generation {generation})")
+        except Exception as e:
+            logger.warning(f"Analysis cache invalidation failed: {str(e)}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Return hit/miss counters per provider"""
+        stats = {'enabled': self.enabled, 'ttl_seconds': self.timeout, 'providers': {}}
+        if not self.enabled:
+            return stats
+
+        try:
+            for provider in self.cache.get(self._providers_key()) or []:
+                keys = {name: self._stat_key(provider, name) for name in self.STAT_NAMES}
+                values = self.cache.get_many(list(keys.values()))
+                provider_stats = {name: values.get(key, 0) for name, key in keys.items()}
+                lookups = provider_stats['hits'] + provider_stats['misses']
+                provider_stats['hit_rate'] = round(provider_stats['hits'] / lookups, 4) if lookups else 0.0
+                provider_stats['generation'] = self._get_generation(provider)
+                stats['providers'][provider] = provider_stats
+        except Exception as e:
+            stats['error'] = str(e)
+
+        return stats
+
+    def _sync_model(self, provider: str, model_name: str):
+        """Invalidate a provider's entries when its configured model changes"""
+        if (provider, model_name) in self._synced_models:
+            return
+
+        model_key = f"{self.KEY_PREFIX}:model:{provider}"
+        previous_model = self.cache.get(model_key)
+        if previous_model is not None and previous_model != model_name:
+            logger.info(f"Model for {provider} changed from {previous_model} to {model_name}")
+            self.invalidate(provider)
+        self.cache.set(model_key, model_name, None)
+
+        providers = set(self.cache.get(self._providers_key()) or [])
+        if provider not in providers:
+            providers.add(provider)
+            self.cache.set(self._providers_key(), sorted(providers), None)
+
+        self._synced_models.add((provider, model_name))
+
+    def _get_generation(self, provider: str) -> int:
+        return self.cache.get(self._generation_key(provider)) or 0
+
+    def _incr(self, provider: str, stat_name: str, amount: int = 1):
+        if not amount:
+            return
+        key = self._stat_key(provider, stat_name)
+        try:
+            self.cache.add(key, 0, None)
+            self.cache.incr(key, amount)
+        except Exception as e:
+            logger.debug(f"Could not update analysis cache counter {key}: {str(e)}")
+
+    def _generation_key(self, provider: str) -> str:
+        return f"{self.KEY_PREFIX}:generation:{provider}"
+
+    def _providers_key(self) -> str:
+        return f"{self.KEY_PREFIX}:providers"
+
+    def _stat_key(self, provider: str, stat_name: str) -> str:
+        return f"{self.KEY_PREFIX}:stats:{provider}:{stat_name}"
+
+
+# Global instance shared by the analysis services
+analysis_cache = AnalysisCache()
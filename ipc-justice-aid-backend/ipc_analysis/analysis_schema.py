@@ -0,0 +1,159 @@
+"""
+JSON schemas for the analysis results the LLM providers are asked to return.
+
+One definition drives structured output on every provider: Ollama takes the
+JSON schema as its ``format`` parameter and Gemini takes the OpenAPI subset
+produced by ``to_gemini_schema`` as ``responseSchema``. Parse failures are
+counted per provider and output mode so the effect of structured output shows
+up in the health check.
+"""
+import copy
+import logging
+from typing import Any, Dict
+
+from django.conf import settings
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+
+def _section_schema(*fields: str) -> Dict[str, Any]:
+    return {
+        'type': 'object',
+        'properties': {field: {'type': 'string'} for field in fields},
+        'required': list(fields),
+    }
+
+
+# Result of OllamaService / GeminiService (ipc_analysis)
+ANALYSIS_SCHEMA = {
+    'type': 'object',
+    'properties': {
+        'sections_applied': {
+            'type': 'array',
+            'items': _section_schema('section_number', 'description', 'reason'),
+        },
+        'explanation': {'type': 'string'},
+    },
+    'required': ['sections_applied', 'explanation'],
+}
+
+# Result of OllamaIPCService (leads) with the full prompt
+CITIZEN_ANALYSIS_SCHEMA = {
+    'type': 'object',
+    'properties': {
+        'applicable_ipc_sections': {
+            'type': 'array',
+            'items': _section_schema('section_number', 'description', 'why_applicable', 'punishment'),
+        },
+        'defensive_ipc_sections': {
+            'type': 'array',
+            'items': _section_schema('section_number', 'description', 'why_applicable', 'punishment'),
+        },
+        'severity': {'type': 'string', 'enum': ['Low', 'Medium', 'High']},
+        'total_sections_identified': {'type': 'integer'},
+        'total_defensive_sections': {'type': 'integer'},
+    },
+    'required': ['applicable_ipc_sections', 'defensive_ipc_sections', 'severity'],
+}
+
+# Result of OllamaIPCService with the compact prompt; details come from the IPC catalog
+COMPACT_CITIZEN_ANALYSIS_SCHEMA = {
+    'type': 'object',
+    'properties': {
+        'applicable_ipc_sections': {
+            'type': 'array',
+            'items': _section_schema('section_number', 'why_applicable'),
+        },
+        'defensive_ipc_sections': {
+            'type': 'array',
+            'items': _section_schema('section_number', 'why_applicable'),
+        },
+        'severity': {'type': 'string', 'enum': ['Low', 'Medium', 'High']},
+    },
+    'required': ['applicable_ipc_sections', 'defensive_ipc_sections', 'severity'],
+}
+
+
+def structured_output_enabled() -> bool:
+    return getattr(settings, 'LLM_STRUCTURED_OUTPUT', True)
+
+
+def ollama_format(schema: Dict[str, Any]) -> Any:
+    """Value for Ollama's ``format`` parameter: the schema, or plain JSON mode when disabled"""
+    return schema if structured_output_enabled() else 'json'
+
+
+def to_gemini_schema(schema: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Convert a JSON schema to the OpenAPI subset Gemini accepts as responseSchema
+
+    Gemini uses upper-case type names and keeps object keys in the order given
+    by propertyOrdering, which is set from the schema's property order.
+    """
+    converted = {}
+    for key, value in schema.items():
+        if key == 'type':
+            converted['type'] = value.upper()
+        elif key == 'properties':
+            converted['properties'] = {name: to_gemini_schema(prop) for name, prop in value.items()}
+            converted['propertyOrdering'] = list(value)
+        elif key == 'items':
+            converted['items'] = to_gemini_schema(value)
+        elif key in ('required', 'enum', 'description', 'nullable', 'format'):
+            converted[key] = copy.deepcopy(value)
+    return converted
+
+
+class ParseFailureTracker:
+    """Counts parsed and unparseable LLM responses per provider and output mode"""
+
+    KEY_PREFIX = 'ipc_analysis:parse'
+    MODES = ('structured', 'freeform')
+
+    def record(self, provider: str, failed: bool, partial: bool = False):
+        """Record one parsed response; ``partial`` marks a truncated response that was repaired"""
+        mode = 'structured' if structured_output_enabled() else 'freeform'
+        if failed:
+            logger.warning(f"Could not parse {provider} response ({mode} output)")
+        try:
+            self._incr(f"{self.KEY_PREFIX}:{provider}:{mode}:responses")
+            if failed:
+                self._incr(f"{self.KEY_PREFIX}:{provider}:{mode}:failures")
+            if partial:
+                self._incr(f"{self.KEY_PREFIX}:{provider}:{mode}:partial")
+        except Exception as e:
+            logger.debug(f"Could not record parse result for {provider}: {str(e)}")
+
+    def get_stats(self, providers=('ollama', 'gemini')) -> Dict[str, Any]:
+        """Return response, failure and repaired counts with the failure rate per provider and mode"""
+        keys = [
+            f"{self.KEY_PREFIX}:{provider}:{mode}:{name}"
+            for provider in providers for mode in self.MODES for name in ('responses', 'failures', 'partial')
+        ]
+        try:
+            values = cache.get_many(keys)
+        except Exception as e:
+            return {'error': str(e)}
+
+        stats = {'structured_output': structured_output_enabled()}
+        for provider in providers:
+            stats[provider] = {}
+            for mode in self.MODES:
+                responses = values.get(f"{self.KEY_PREFIX}:{provider}:{mode}:responses", 0)
+                failures = values.get(f"{self.KEY_PREFIX}:{provider}:{mode}:failures", 0)
+                stats[provider][mode] = {
+                    'responses': responses,
+                    'failures': failures,
+                    'partial': values.get(f"{self.KEY_PREFIX}:{provider}:{mode}:partial", 0),
+                    'failure_rate': round(failures / responses, 4) if responses else 0.0,
+                }
+        return stats
+
+    def _incr(self, key: str):
+        cache.add(key, 0, None)
+        cache.incr(key)
+
+
+# Global instance shared by the analysis services
+parse_failures = ParseFailureTracker()
@@ -4,3 +4,10 @@ from django.apps import AppConfig
 class IpcAnalysisConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'ipc_analysis'
+
+    def ready(self):
+        from .ipc_retrieval import ipc_retriever
+
+        # Build the retrieval index at startup rather than on the first analysis
+        if ipc_retriever.enabled:
+            ipc_retriever.index
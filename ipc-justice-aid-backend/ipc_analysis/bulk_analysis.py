@@ -0,0 +1,334 @@
+"""
+Bulk case analysis from an uploaded CSV or NDJSON file.
+
+Rows are fanned out to the adaptive analysis service with bounded
+parallelism, so the analysis cache, request coalescing, circuit breakers and
+concurrency limits apply exactly as for single requests. Successful analyses
+are persisted in batches and every row gets a line in an NDJSON results file,
+saved through the default storage backend.
+"""
+import csv
+import io
+import json
+import logging
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor, ALL_COMPLETED, FIRST_COMPLETED, wait
+from typing import Any, Dict, Iterator, List, Optional
+
+from django.conf import settings
+from django.core.files import File
+from django.db import transaction
+from django.utils import timezone
+
+from .adaptive_service import adaptive_analysis_service
+from .concurrency import BackendOverloadedError
+from .models import LegalCase, LegalAnalysis, AnalysisHistory, IPCSection, BulkAnalysisJob
+
+logger = logging.getLogger(__name__)
+
+
+# Accepted column / key names, in order of preference
+CASE_DESCRIPTION_FIELDS = ('case_description', 'description', 'fir_summary', 'summary', 'text')
+REFERENCE_FIELDS = ('reference', 'case_reference', 'fir_number', 'case_id', 'id')
+
+
+def detect_input_format(filename: str, requested_format: Optional[str] = None) -> Optional[str]:
+    """Return 'csv' or 'ndjson' from an explicit format or the file extension"""
+    if requested_format:
+        requested_format = requested_format.lower()
+        return requested_format if requested_format in ('csv', 'ndjson') else None
+
+    extension = os.path.splitext(filename or '')[1].lower()
+    if extension == '.csv':
+        return 'csv'
+    if extension in ('.ndjson', '.jsonl'):
+        return 'ndjson'
+    return None
+
+
+def iter_bulk_rows(file_obj, input_format: str) -> Iterator[Dict[str, Any]]:
+    """
+    Yield {'row', 'reference', 'case_description'} dicts from an uploaded file
+
+    Raises:
+        ValueError: If the file cannot be parsed
+    """
+    text = io.TextIOWrapper(file_obj, encoding='utf-8-sig', newline='')
+    try:
+        if input_format == 'csv':
+            yield from _iter_csv_rows(text)
+        else:
+            yield from _iter_ndjson_rows(text)
+    except UnicodeDecodeError:
+        raise ValueError("File must be UTF-8 encoded")
+    except csv.Error as e:
+        raise ValueError(f"Invalid CSV: {str(e)}")
+    finally:
+        # Don't let the wrapper close the underlying upload
+        text.detach()
+
+
+def _iter_csv_rows(text) -> Iterator[Dict[str, Any]]:
+    reader = csv.DictReader(text)
+    fieldnames = {name.strip().lower(): name for name in (reader.fieldnames or []) if name}
+
+    description_field = next((fieldnames[f] for f in CASE_DESCRIPTION_FIELDS if f in fieldnames), None)
+    if description_field is None:
+        raise ValueError(f"CSV needs a column named one of: {', '.join(CASE_DESCRIPTION_FIELDS)}")
+    reference_field = next((fieldnames[f] for f in REFERENCE_FIELDS if f in fieldnames), None)
+
+    for row_number, record in enumerate(reader, start=1):
+        yield {
+            'row': row_number,
+            'reference': record.get(reference_field) if reference_field else None,
+            'case_description': (record.get(description_field) or '').strip(),
+        }
+
+
+def _iter_ndjson_rows(text) -> Iterator[Dict[str, Any]]:
+    row_number = 0
+    for line_number, line in enumerate(text, start=1):
+        line = line.strip()
+        if not line:
+            continue
+
+        try:
+            record = json.loads(line)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"Invalid JSON on line {line_number}: {e.msg}")
+
+        row_number += 1
+        if isinstance(record, str):
+            yield {'row': row_number, 'reference': None, 'case_description': record.strip()}
+            continue
+        if not isinstance(record, dict):
+            raise ValueError(f"Line {line_number} must be a JSON object or string")
+
+        description = next((record[f] for f in CASE_DESCRIPTION_FIELDS if record.get(f)), '')
+        reference = next((record[f] for f in REFERENCE_FIELDS if record.get(f) is not None), None)
+        yield {
+            'row': row_number,
+            'reference': str(reference) if reference is not None else None,
+            'case_description': str(description).strip(),
+        }
+
+
+class BulkAnalysisRunner:
+    """Runs a BulkAnalysisJob to completion"""
+
+    PROGRESS_INTERVAL = 2  # seconds between progress writes
+
+    def __init__(self, job: BulkAnalysisJob):
+        bulk_settings = getattr(settings, 'BULK_ANALYSIS_SETTINGS', {})
+        legal_settings = getattr(settings, 'LEGAL_ANALYSIS_SETTINGS', {})
+        self.job = job
+        self.max_parallelism = bulk_settings.get('MAX_PARALLELISM', 4)
+        self.batch_size = bulk_settings.get('BATCH_SIZE', 25)
+        self.max_row_retries = bulk_settings.get('MAX_ROW_RETRIES', 3)
+        self.max_description_length = legal_settings.get('MAX_CASE_DESCRIPTION_LENGTH', 5000)
+
+        self._batch: List[Dict[str, Any]] = []
+        self._results_file = None
+        self._last_progress_save = 0
+
+    def run(self):
+        job = self.job
+        job.status = 'running'
+        job.started_at = timezone.now()
+        job.save(update_fields=['status', 'started_at'])
+
+        # Spooled locally and saved through the storage backend at the end, so the
+        # web process finds it whether media lives on disk or in Azure
+        futures = {}
+        with tempfile.TemporaryFile() as self._results_file:
+            try:
+                with job.input_file.open('rb') as input_file, \
+                        ThreadPoolExecutor(max_workers=self.max_parallelism,
+                                           thread_name_prefix='bulk-analysis') as executor:
+                    for row in iter_bulk_rows(input_file, job.input_format):
+                        error = self._validate_row(row)
+                        if error:
+                            self._record_failure(row, error)
+                            continue
+
+                        futures[executor.submit(self._analyze, row['case_description'])] = row
+                        # Keep a bounded window in flight rather than queueing every row
+                        if len(futures) >= self.max_parallelism * 2:
+                            self._collect(futures, return_when=FIRST_COMPLETED)
+
+                    while futures:
+                        self._collect(futures, return_when=FIRST_COMPLETED)
+                    self._flush()
+
+                self._save_results()
+                job.status = 'completed'
+            except Exception as e:
+                logger.error(f"Bulk analysis job {job.job_id} failed: {str(e)}", exc_info=True)
+                job.status = 'failed'
+                job.error_message = str(e)
+                self._save_partial_results(futures)
+
+        job.completed_at = timezone.now()
+        job.save()
+        logger.info(
+            f"Bulk analysis job {job.job_id} {job.status}: "
+            f"{job.succeeded_cases} succeeded, {job.failed_cases} failed of {job.total_cases}"
+        )
+
+    def _save_partial_results(self, futures: Dict):
+        """Keep the rows processed before a failure, including analyses not yet flushed"""
+        try:
+            # The executor has shut down, so the rows still in flight are finished
+            self._collect(futures, return_when=ALL_COMPLETED)
+            self._flush()
+        except Exception as e:
+            logger.error(f"Could not store the finished analyses of job {self.job.job_id}: {str(e)}")
+
+        if self._results_file.tell() and not self.job.results_file:
+            try:
+                self._save_results()
+            except Exception as e:
+                logger.error(f"Could not save partial results of job {self.job.job_id}: {str(e)}")
+
+    def _save_results(self):
+        self._results_file.seek(0)
+        self.job.results_file.save(f"{self.job.job_id}.ndjson", File(self._results_file), save=False)
+
+    def _validate_row(self, row: Dict[str, Any]) -> Optional[str]:
+        description = row['case_description']
+        if len(description) < 10:
+            return "Case description must be at least 10 characters long."
+        if len(description) > self.max_description_length:
+            return f"Case description exceeds {self.max_description_length} characters."
+        return None
+
+    def _analyze(self, case_description: str) -> Dict[str, Any]:
+        """Analyze one case, backing off while the backend sheds load"""
+        for attempt in range(self.max_row_retries + 1):
+            try:
+                return adaptive_analysis_service.analyze_case(case_description)
+            except BackendOverloadedError as e:
+                if attempt == self.max_row_retries:
+                    raise
+                time.sleep(e.retry_after)
+
+    def _collect(self, futures: Dict, return_when):
+        done, _ = wait(futures, return_when=return_when)
+        for future in done:
+            row = futures.pop(future)
+            try:
+                result = future.result()
+            except Exception as e:
+                self._record_failure(row, str(e))
+                continue
+
+            if result.get('success'):
+                self._batch.append({'row': row, 'result': result})
+                if len(self._batch) >= self.batch_size:
+                    self._flush()
+            else:
+                self._record_failure(row, result.get('error') or 'Analysis failed')
+
+    def _flush(self):
+        """Persist the pending batch of successful analyses"""
+        if not self._batch:
+            return
+
+        batch, self._batch = self._batch, []
+        user = self.job.user
+
+        with transaction.atomic():
+            cases = LegalCase.objects.bulk_create([
+                LegalCase(user=user, case_description=item['row']['case_description'])
+                for item in batch
+            ])
+            analyses = LegalAnalysis.objects.bulk_create([
+                LegalAnalysis(legal_case=case, analysis_json=item['result']['analysis'])
+                for case, item in zip(cases, batch)
+            ])
+            AnalysisHistory.objects.bulk_create([
+                AnalysisHistory(
+                    user=user,
+                    case_description=item['row']['case_description'],
+                    ollama_response=item['result']['analysis'],
+                    response_time_ms=item['result'].get('response_time_ms', 0)
+                )
+                for item in batch
+            ])
+            self._link_ipc_sections(analyses)
+
+        for case, analysis, item in zip(cases, analyses, batch):
+            self._write_result({
+                'row': item['row']['row'],
+                'reference': item['row']['reference'],
+                'success': True,
+                'case_id': case.id,
+                'analysis_id': analysis.id,
+                'sections_applied': analysis.get_sections_applied(),
+                'explanation': analysis.get_explanation(),
+                'service_used': item['result'].get('service_used'),
+                'response_time_ms': item['result'].get('response_time_ms'),
+            })
+
+        self.job.processed_cases += len(batch)
+        self.job.succeeded_cases += len(batch)
+        self._save_progress(force=True)
+
+    def _link_ipc_sections(self, analyses: List[LegalAnalysis]):
+        """Batch equivalent of AnalyzeCaseView._link_ipc_sections"""
+        section_data = {}
+        for analysis in analyses:
+            for section in analysis.get_sections_applied():
+                number = str(section.get('section_number') or '').strip()
+                if number and len(number) <= 10:
+                    section_data.setdefault(number, section)
+
+        if not section_data:
+            return
+
+        IPCSection.objects.bulk_create([
+            IPCSection(
+                section_number=number,
+                title=(section.get('description') or '')[:255],
+                description=section.get('reason') or ''
+            )
+            for number, section in section_data.items()
+        ], ignore_conflicts=True)
+        sections = IPCSection.objects.in_bulk(list(section_data), field_name='section_number')
+
+        through = LegalAnalysis.primary_sections.through
+        links = []
+        for analysis in analyses:
+            numbers = {str(s.get('section_number') or '').strip() for s in analysis.get_sections_applied()}
+            links.extend(
+                through(legalanalysis_id=analysis.id, ipcsection_id=sections[number].id)
+                for number in numbers if number in sections
+            )
+        through.objects.bulk_create(links, ignore_conflicts=True)
+
+    def _record_failure(self, row: Dict[str, Any], error: str):
+        self._write_result({
+            'row': row['row'],
+            'reference': row['reference'],
+            'success': False,
+            'error': error,
+        })
+        self.job.processed_cases += 1
+        self.job.failed_cases += 1
+        self._save_progress()
+
+    def _write_result(self, record: Dict[str, Any]):
+        self._results_file.write((json.dumps(record, default=str) + '\n').encode('utf-8'))
+
+    def _save_progress(self, force: bool = False):
+        now = time.time()
+        if not force and now - self._last_progress_save < self.PROGRESS_INTERVAL:
+            return
+        self._last_progress_save = now
+        BulkAnalysisJob.objects.filter(pk=self.job.pk).update(
+            processed_cases=self.job.processed_cases,
+            succeeded_cases=self.job.succeeded_cases,
+            failed_cases=self.job.failed_cases,
+        )
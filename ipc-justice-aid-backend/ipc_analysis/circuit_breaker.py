@@ -0,0 +1,214 @@
+"""
+Per-provider circuit breakers for the LLM backends.
+
+State lives in the shared Django cache (Redis) so every gunicorn worker and
+Celery process sees the same view of a provider's health. A provider that
+keeps failing is opened and skipped immediately; once the recovery timeout has
+passed a single probe request is let through to decide whether to close it.
+"""
+import logging
+import threading
+import time
+from typing import Any, Dict
+
+from django.conf import settings
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+
+DEFAULT_BREAKER_SETTINGS = {
+    'FAILURE_THRESHOLD': 5,
+    'RECOVERY_TIMEOUT': 30,
+    'PROBE_TIMEOUT': 120,
+}
+
+
+class CircuitOpenError(Exception):
+    """Raised when a provider is skipped because its circuit is open"""
+
+    def __init__(self, provider: str, retry_after: int):
+        super().__init__(f"Circuit open for {provider}, retry after {retry_after}s")
+        self.provider = provider
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """Closed/open/half-open breaker for a single provider"""
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    KEY_PREFIX = 'ipc_analysis:circuit'
+
+    def __init__(self, provider: str, breaker_settings: Dict[str, Any]):
+        self.provider = provider
+        self.failure_threshold = breaker_settings['FAILURE_THRESHOLD']
+        self.recovery_timeout = breaker_settings['RECOVERY_TIMEOUT']
+        # Must exceed the duration of one provider call including its retries
+        self.probe_timeout = breaker_settings['PROBE_TIMEOUT']
+
+        self.state_key = f"{self.KEY_PREFIX}:{provider}:state"
+        self.failures_key = f"{self.KEY_PREFIX}:{provider}:failures"
+        self.probe_key = f"{self.KEY_PREFIX}:{provider}:probe"
+        self.rejections_key = f"{self.KEY_PREFIX}:{provider}:rejections"
+
+    def allow_request(self) -> bool:
+        """
+        Return True if a request may be sent to the provider
+
+        While the circuit is open this returns False, except for the one
+        caller that claims the probe slot after the recovery timeout.
+        """
+        state = self._get_state()
+        if state['state'] == self.CLOSED:
+            return True
+
+        if time.time() - state['opened_at'] >= self.recovery_timeout:
+            try:
+                if cache.add(self.probe_key, 1, self.probe_timeout):
+                    self._set_state(self.HALF_OPEN, state['opened_at'])
+                    logger.info(f"Circuit for {self.provider} half-open, sending probe request")
+                    return True
+            except Exception as e:
+                logger.warning(f"Circuit breaker probe failed for {self.provider}: {str(e)}")
+                return True
+
+        self._incr(self.rejections_key)
+        return False
+
+    def is_closed(self) -> bool:
+        return self._get_state()['state'] == self.CLOSED
+
+    def retry_after(self) -> int:
+        """Seconds until the next probe may be sent"""
+        state = self._get_state()
+        if state['state'] == self.CLOSED:
+            return 0
+        return max(int(state['opened_at'] + self.recovery_timeout - time.time()), 1)
+
+    def check(self):
+        """Raise CircuitOpenError if the provider should be skipped"""
+        if not self.allow_request():
+            raise CircuitOpenError(self.provider, self.retry_after())
+
+    def record_success(self):
+        state = self._get_state()
+        try:
+            if state['state'] != self.CLOSED:
+                logger.info(f"Circuit for {self.provider} closed after successful probe")
+                cache.delete_many([self.state_key, self.probe_key])
+            cache.delete(self.failures_key)
+        except Exception as e:
+            logger.debug(f"Could not record success for {self.provider}: {str(e)}")
+
+    def record_failure(self):
+        state = self._get_state()
+        if state['state'] != self.CLOSED:
+            # The probe failed, stay open for another recovery period
+            self._open()
+            return
+
+        failures = self._incr(self.failures_key)
+        if failures >= self.failure_threshold:
+            self._open()
+
+    def release_probe(self):
+        """
+        Free the probe slot without recording an outcome
+
+        For callers that were let through but never reached the provider,
+        e.g. shed by the concurrency limiter. Otherwise the circuit stays
+        half-open and rejects everyone until the probe slot expires.
+        """
+        if self._get_state()['state'] != self.HALF_OPEN:
+            return
+        try:
+            cache.delete(self.probe_key)
+        except Exception as e:
+            logger.debug(f"Could not release probe slot for {self.provider}: {str(e)}")
+
+    def get_state(self) -> Dict[str, Any]:
+        """Return the breaker state for health reporting"""
+        state = self._get_state()
+        values = cache.get_many([self.failures_key, self.rejections_key])
+        return {
+            'state': state['state'],
+            'consecutive_failures': values.get(self.failures_key, 0),
+            'rejected_requests': values.get(self.rejections_key, 0),
+            'failure_threshold': self.failure_threshold,
+            'recovery_timeout': self.recovery_timeout,
+            'retry_after': self.retry_after(),
+        }
+
+    def reset(self):
+        cache.delete_many([self.state_key, self.failures_key, self.probe_key])
+
+    def _open(self):
+        logger.warning(f"Circuit for {self.provider} opened, skipping it for {self.recovery_timeout}s")
+        self._set_state(self.OPEN, time.time())
+        try:
+            cache.delete_many([self.failures_key, self.probe_key])
+        except Exception as e:
+            logger.debug(f"Could not clear breaker counters for {self.provider}: {str(e)}")
+
+    def _get_state(self) -> Dict[str, Any]:
+        try:
+            state = cache.get(self.state_key)
+        except Exception as e:
+            logger.warning(f"Circuit breaker state unavailable for {self.provider}: {str(e)}")
+            state = None
+        return state or {'state': self.CLOSED, 'opened_at': 0}
+
+    def _set_state(self, state: str, opened_at: float):
+        try:
+            cache.set(self.state_key, {'state': state, 'opened_at': opened_at}, None)
+        except Exception as e:
+            logger.warning(f"Could not store circuit breaker state for {self.provider}: {str(e)}")
+
+    def _incr(self, key: str) -> int:
+        try:
+            cache.add(key, 0, None)
+            return cache.incr(key)
+        except Exception as e:
+            logger.debug(f"Could not update breaker counter {key}: {str(e)}")
+            return 0
+
+
+class CircuitBreakerRegistry:
+    """Creates and caches one CircuitBreaker per provider"""
+
+    def __init__(self):
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._lock = threading.Lock()
+
+    def get(self, provider: str) -> CircuitBreaker:
+        breaker = self._breakers.get(provider)
+        if breaker is not None:
+            return breaker
+
+        with self._lock:
+            if provider not in self._breakers:
+                self._breakers[provider] = CircuitBreaker(provider, self._get_breaker_settings(provider))
+            return self._breakers[provider]
+
+    def get_states(self) -> Dict[str, Dict[str, Any]]:
+        states = {}
+        for provider, breaker in list(self._breakers.items()):
+            try:
+                states[provider] = breaker.get_state()
+            except Exception as e:
+                states[provider] = {'state': 'unknown', 'error': str(e)}
+        return states
+
+    def _get_breaker_settings(self, provider: str) -> Dict[str, Any]:
+        configured = getattr(settings, 'CIRCUIT_BREAKER_SETTINGS', {})
+        breaker_settings = dict(DEFAULT_BREAKER_SETTINGS)
+        breaker_settings.update(configured.get('DEFAULT', {}))
+        breaker_settings.update(configured.get(provider, {}))
+        return breaker_settings
+
+
+# Global registry shared by the analysis services in this process
+circuit_breakers = CircuitBreakerRegistry()
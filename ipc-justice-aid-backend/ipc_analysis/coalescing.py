@@ -0,0 +1,324 @@
+"""
+Single-flight coalescing of identical in-flight analysis requests.
+
+Concurrent callers with the same key share one provider call. Within a process
+followers wait on the leader's thread; across gunicorn workers and Celery
+processes the leader holds a Redis lock and publishes its result on a channel
+that followers subscribe to. AsyncSingleFlight does the same for coroutines
+within one event loop, in front of SingleFlight.ado for the cross-process part.
+"""
+import asyncio
+import json
+import logging
+import threading
+import time
+import uuid
+import weakref
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+
+RELEASE_LOCK_SCRIPT = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    return redis.call("del", KEYS[1])
+end
+return 0
+"""
+
+
+def _in_thread(func):
+    """Run a blocking Redis call off the event loop"""
+    return sync_to_async(func, thread_sensitive=False)
+
+
+class _InFlightCall:
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.failed = False
+
+
+class SingleFlight:
+    """Runs at most one computation per key at a time, sharing its result"""
+
+    KEY_PREFIX = 'ipc_analysis:inflight'
+
+    def __init__(self):
+        coalescing_settings = getattr(settings, 'ANALYSIS_COALESCING_SETTINGS', {})
+        self.enabled = coalescing_settings.get('ENABLED', True)
+        self.lock_timeout = coalescing_settings.get('LOCK_TIMEOUT', 330)
+        self.wait_timeout = coalescing_settings.get('WAIT_TIMEOUT', 330)
+        self.result_ttl = coalescing_settings.get('RESULT_TTL', 60)
+        self.cache_alias = coalescing_settings.get('CACHE_ALIAS', 'default')
+
+        self._calls: Dict[str, _InFlightCall] = {}
+        self._lock = threading.Lock()
+        self._release_script = None
+
+    def do(self, key: str, compute: Callable[[], Dict[str, Any]]) -> Tuple[Dict[str, Any], bool]:
+        """
+        Run ``compute`` unless an identical call is already in flight
+
+        Returns:
+            Tuple of (result, shared) where shared is True when the result
+            came from another caller's computation
+        """
+        if not self.enabled:
+            return compute(), False
+
+        with self._lock:
+            call = self._calls.get(key)
+            is_leader = call is None
+            if is_leader:
+                call = self._calls[key] = _InFlightCall()
+
+        if not is_leader:
+            if call.event.wait(self.wait_timeout) and not call.failed:
+                return call.result, True
+            logger.warning("In-flight analysis did not complete in time, computing independently")
+            return compute(), False
+
+        try:
+            call.result, shared = self._do_distributed(key, compute)
+            return call.result, shared
+        except Exception:
+            call.failed = True
+            raise
+        finally:
+            call.event.set()
+            with self._lock:
+                self._calls.pop(key, None)
+
+    def _do_distributed(self, key: str, compute: Callable[[], Dict[str, Any]]) -> Tuple[Dict[str, Any], bool]:
+        redis = self._get_redis()
+        if redis is None:
+            return compute(), False
+
+        lock_key, result_key, channel = self._redis_keys(key)
+        deadline = time.time() + self.wait_timeout
+
+        try:
+            while True:
+                token = uuid.uuid4().hex
+                if redis.set(lock_key, token, nx=True, px=int(self.lock_timeout * 1000)):
+                    return self._lead(redis, compute, lock_key, result_key, channel, token), False
+
+                result = self._follow(redis, lock_key, result_key, channel, deadline)
+                if result is not None:
+                    logger.info("Coalesced analysis request onto an in-flight call")
+                    return result, True
+
+                if time.time() >= deadline:
+                    break
+        except _LeaderComputeError as e:
+            raise e.original
+        except Exception as e:
+            logger.warning(f"Distributed request coalescing unavailable: {str(e)}")
+            return compute(), False
+
+        logger.warning("Timed out waiting for in-flight analysis, computing independently")
+        return compute(), False
+
+    async def ado(self, key: str, compute: Callable[[], Awaitable[Dict[str, Any]]]
+                  ) -> Tuple[Dict[str, Any], bool]:
+        """
+        Async variant of do(), coalescing across processes only
+
+        Coroutines in the same event loop are coalesced by AsyncSingleFlight
+        in front of this. The Redis calls run in a thread and followers poll
+        for the result, so no thread is held for the length of the leader's call.
+        """
+        if not self.enabled:
+            return await compute(), False
+
+        redis = await _in_thread(self._get_redis)()
+        if redis is None:
+            return await compute(), False
+
+        lock_key, result_key, channel = self._redis_keys(key)
+        deadline = time.time() + self.wait_timeout
+
+        try:
+            while True:
+                token = uuid.uuid4().hex
+                if await _in_thread(redis.set)(lock_key, token, nx=True, px=int(self.lock_timeout * 1000)):
+                    return await self._alead(redis, compute, lock_key, result_key, channel, token), False
+
+                result = await self._afollow(redis, lock_key, result_key, deadline)
+                if result is not None:
+                    logger.info("Coalesced analysis request onto an in-flight call")
+                    return result, True
+
+                if time.time() >= deadline:
+                    break
+        except _LeaderComputeError as e:
+            raise e.original
+        except Exception as e:
+            logger.warning(f"Distributed request coalescing unavailable: {str(e)}")
+            return await compute(), False
+
+        logger.warning("Timed out waiting for in-flight analysis, computing independently")
+        return await compute(), False
+
+    def _lead(self, redis, compute, lock_key, result_key, channel, token) -> Dict[str, Any]:
+        try:
+            try:
+                result = compute()
+            except Exception as e:
+                raise _LeaderComputeError(e)
+
+            self._publish(redis, result_key, channel, result)
+            return result
+        finally:
+            self._release(redis, lock_key, token)
+
+    async def _alead(self, redis, compute, lock_key, result_key, channel, token) -> Dict[str, Any]:
+        try:
+            try:
+                result = await compute()
+            except Exception as e:
+                raise _LeaderComputeError(e)
+
+            await _in_thread(self._publish)(redis, result_key, channel, result)
+            return result
+        finally:
+            await _in_thread(self._release)(redis, lock_key, token)
+
+    def _publish(self, redis, result_key: str, channel: str, result: Dict[str, Any]):
+        """Hand the leader's result to the followers"""
+        payload = json.dumps(result, default=str)
+        try:
+            redis.set(result_key, payload, ex=self.result_ttl)
+            redis.publish(channel, payload)
+        except Exception as e:
+            # The followers compute it themselves once the lock is released
+            logger.warning(f"Could not publish in-flight result: {str(e)}")
+
+    def _release(self, redis, lock_key: str, token: str):
+        try:
+            self._get_release_script(redis)(keys=[lock_key], args=[token])
+        except Exception as e:
+            logger.warning(f"Could not release in-flight lock: {str(e)}")
+
+    def _follow(self, redis, lock_key, result_key, channel, deadline) -> Optional[Dict[str, Any]]:
+        """Wait for the leader's result; returns None if the leader went away without one"""
+        pubsub = redis.pubsub(ignore_subscribe_messages=True)
+        pubsub.subscribe(channel)
+        try:
+            while time.time() < deadline:
+                # Checked after subscribing so a result published in between is not missed
+                payload = redis.get(result_key)
+                if payload:
+                    return json.loads(payload)
+
+                if not redis.exists(lock_key):
+                    return None
+
+                message = pubsub.get_message(timeout=min(1.0, max(deadline - time.time(), 0)))
+                if message and message.get('type') == 'message':
+                    return json.loads(message['data'])
+            return None
+        finally:
+            pubsub.close()
+
+    async def _afollow(self, redis, lock_key, result_key, deadline) -> Optional[Dict[str, Any]]:
+        """Async variant of _follow; polls instead of blocking a thread on the channel"""
+        check = _in_thread(self._check_leader)
+        delay = 0.05
+        while time.time() < deadline:
+            result, leader_active = await check(redis, lock_key, result_key)
+            if result is not None:
+                return result
+            if not leader_active:
+                return None
+
+            await asyncio.sleep(min(delay, max(deadline - time.time(), 0.01)))
+            delay = min(delay * 2, 0.5)
+        return None
+
+    @staticmethod
+    def _check_leader(redis, lock_key, result_key) -> Tuple[Optional[Dict[str, Any]], bool]:
+        """Return the leader's result if published, and whether it still holds the lock"""
+        pipe = redis.pipeline()
+        pipe.get(result_key)
+        pipe.exists(lock_key)
+        payload, locked = pipe.execute()
+        return (json.loads(payload) if payload else None), bool(locked)
+
+    def _redis_keys(self, key: str) -> Tuple[str, str, str]:
+        """Lock, result and channel names for a key"""
+        prefix = f"{self.KEY_PREFIX}:{key}"
+        return f"{prefix}:lock", f"{prefix}:result", f"{prefix}:channel"
+
+    def _get_redis(self):
+        try:
+            from django_redis import get_redis_connection
+            return get_redis_connection(self.cache_alias)
+        except Exception as e:
+            logger.debug(f"Redis not available for request coalescing: {str(e)}")
+            return None
+
+    def _get_release_script(self, redis):
+        if self._release_script is None:
+            self._release_script = redis.register_script(RELEASE_LOCK_SCRIPT)
+        return self._release_script
+
+
+class _LeaderComputeError(Exception):
+    """Wraps an exception raised by the leader's own computation"""
+
+    def __init__(self, original: Exception):
+        super().__init__(str(original))
+        self.original = original
+
+
+class AsyncSingleFlight:
+    """
+    Runs at most one coroutine per key at a time within an event loop
+
+    Followers await the leader's task, shielded so that a follower whose
+    request is cancelled does not cancel the shared call.
+    """
+
+    def __init__(self):
+        coalescing_settings = getattr(settings, 'ANALYSIS_COALESCING_SETTINGS', {})
+        self.enabled = coalescing_settings.get('ENABLED', True)
+        self.wait_timeout = coalescing_settings.get('WAIT_TIMEOUT', 330)
+
+        # event loop -> {key: task}
+        self._calls = weakref.WeakKeyDictionary()
+
+    async def do(self, key: str, compute: Callable[[], Awaitable[Dict[str, Any]]]
+                 ) -> Tuple[Dict[str, Any], bool]:
+        """Async variant of SingleFlight.do"""
+        if not self.enabled:
+            return await compute(), False
+
+        calls = self._calls.setdefault(asyncio.get_running_loop(), {})
+        task = calls.get(key)
+        if task is not None:
+            try:
+                result = await asyncio.wait_for(asyncio.shield(task), self.wait_timeout)
+            except asyncio.TimeoutError:
+                logger.warning("In-flight analysis did not complete in time, computing independently")
+                return await compute(), False
+            except asyncio.CancelledError:
+                if task.cancelled():
+                    return await compute(), False
+                raise
+            except Exception:
+                return await compute(), False
+            return result, True
+
+        task = calls[key] = asyncio.ensure_future(compute())
+        task.add_done_callback(lambda _: calls.pop(key, None) if calls.get(key) is task else None)
+        return await asyncio.shield(task), False
+
+
+# Global instances shared by the analysis services
+single_flight = SingleFlight()
+async_single_flight = AsyncSingleFlight()
@@ -0,0 +1,400 @@
+"""
+Admission control and adaptive concurrency limits for the LLM backends.
+
+Each backend has a distributed semaphore (a Redis sorted set of leases) sized
+by a limit that adapts AIMD-style to observed latency: it grows by roughly one
+slot per window of fast completions and is cut multiplicatively when calls are
+slow or fail. Callers that cannot get a slot wait in a bounded queue; when the
+queue is full, or the wait runs out, BackendOverloadedError is raised so the
+API can answer immediately with Retry-After instead of piling up timeouts.
+"""
+import asyncio
+import logging
+import threading
+import time
+import uuid
+from contextlib import asynccontextmanager, contextmanager
+from typing import Any, Dict, Optional
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+from .metrics import provider_metrics
+
+logger = logging.getLogger(__name__)
+
+
+DEFAULT_LIMITER_SETTINGS = {
+    'ENABLED': True,
+    'INITIAL_LIMIT': 4,
+    'MIN_LIMIT': 1,
+    'MAX_LIMIT': 16,
+    'MAX_QUEUE': 16,
+    'QUEUE_TIMEOUT': 30,
+    'LEASE_TIMEOUT': 300,
+    'TARGET_LATENCY_MS': 30000,
+    'DECREASE_FACTOR': 0.7,
+    'DECREASE_INTERVAL': 10,
+    'RETRY_AFTER': 10,
+}
+
+# Returns 1 when a slot was acquired, 0 when the caller is queued and -1 when
+# the queue is full. Queued callers are admitted in deadline (arrival) order.
+ACQUIRE_SCRIPT = """
+local now = tonumber(ARGV[2])
+redis.call('zremrangebyscore', KEYS[1], '-inf', now)
+redis.call('zremrangebyscore', KEYS[2], '-inf', now)
+
+local limit = math.floor(tonumber(redis.call('get', KEYS[3]) or ARGV[4]))
+local available = limit - redis.call('zcard', KEYS[1])
+local rank = redis.call('zrank', KEYS[2], ARGV[1])
+
+if available > 0 then
+    if (rank and rank < available) or (not rank and redis.call('zcard', KEYS[2]) < available) then
+        redis.call('zadd', KEYS[1], ARGV[3], ARGV[1])
+        redis.call('zrem', KEYS[2], ARGV[1])
+        return 1
+    end
+end
+
+if rank then
+    return 0
+end
+if redis.call('zcard', KEYS[2]) >= tonumber(ARGV[5]) then
+    return -1
+end
+redis.call('zadd', KEYS[2], ARGV[6], ARGV[1])
+return 0
+"""
+
+# Releases a lease and applies the AIMD adjustment; returns the new limit
+RELEASE_SCRIPT = """
+redis.call('zrem', KEYS[1], ARGV[1])
+
+local limit = tonumber(redis.call('get', KEYS[2]) or ARGV[5])
+local min_limit = tonumber(ARGV[6])
+local max_limit = tonumber(ARGV[7])
+local now = tonumber(ARGV[9])
+
+if ARGV[3] == '1' and tonumber(ARGV[2]) <= tonumber(ARGV[4]) then
+    limit = math.min(max_limit, limit + 1 / limit)
+else
+    local last_decrease = tonumber(redis.call('get', KEYS[3]) or '0')
+    if now - last_decrease >= tonumber(ARGV[10]) then
+        limit = math.max(min_limit, limit * tonumber(ARGV[8]))
+        redis.call('set', KEYS[3], ARGV[9])
+    end
+end
+
+redis.call('set', KEYS[2], tostring(limit))
+return tostring(limit)
+"""
+
+
+class BackendOverloadedError(Exception):
+    """Raised when an LLM backend has no free slot and its wait queue is full or timed out"""
+
+    def __init__(self, backend: str, retry_after: int, reason: str):
+        super().__init__(f"{backend} is overloaded ({reason}), retry after {retry_after}s")
+        self.backend = backend
+        self.retry_after = retry_after
+        self.reason = reason
+
+    @property
+    def status_code(self) -> int:
+        # Shed immediately when the queue is full or the provider quota is
+        # used up; a queued request that could not be served in time means
+        # the backend itself is saturated
+        return 429 if self.reason in ('queue_full', 'quota_exhausted') else 503
+
+    def response_data(self) -> Dict[str, Any]:
+        return {
+            'error': 'Analysis service is busy, please retry shortly',
+            'details': str(self),
+            'retry_after': self.retry_after,
+        }
+
+
+class SlotLease:
+    """
+    Outcome of the call made while holding a slot
+
+    The call counts as a success if the block exits without an exception and
+    failed() was not called. Callers that check the response only after
+    leaving the slot pass it to received() first.
+    """
+
+    def __init__(self):
+        self.success = True
+
+    def failed(self):
+        self.success = False
+
+    def received(self, response):
+        """Count a rate limit or server error response as a failed call"""
+        if response.status_code == 429 or response.status_code >= 500:
+            self.failed()
+        return response
+
+
+class ConcurrencyLimiter:
+    """Distributed, adaptive concurrency limit for one LLM backend"""
+
+    KEY_PREFIX = 'ipc_analysis:concurrency'
+
+    def __init__(self, backend: str, limiter_settings: Dict[str, Any], cache_alias: str = 'default'):
+        self.backend = backend
+        self.enabled = limiter_settings['ENABLED']
+        self.initial_limit = limiter_settings['INITIAL_LIMIT']
+        self.min_limit = limiter_settings['MIN_LIMIT']
+        self.max_limit = limiter_settings['MAX_LIMIT']
+        self.max_queue = limiter_settings['MAX_QUEUE']
+        self.queue_timeout = limiter_settings['QUEUE_TIMEOUT']
+        # Leases of crashed workers expire after this; must exceed one provider call
+        self.lease_timeout = limiter_settings['LEASE_TIMEOUT']
+        self.target_latency_ms = limiter_settings['TARGET_LATENCY_MS']
+        self.decrease_factor = limiter_settings['DECREASE_FACTOR']
+        self.decrease_interval = limiter_settings['DECREASE_INTERVAL']
+        self.retry_after = limiter_settings['RETRY_AFTER']
+        self.cache_alias = cache_alias
+
+        self.holders_key = f"{self.KEY_PREFIX}:{backend}:holders"
+        self.waiters_key = f"{self.KEY_PREFIX}:{backend}:waiters"
+        self.limit_key = f"{self.KEY_PREFIX}:{backend}:limit"
+        self.last_decrease_key = f"{self.KEY_PREFIX}:{backend}:last_decrease"
+        self.rejections_key = f"{self.KEY_PREFIX}:{backend}:rejections"
+        self.timeouts_key = f"{self.KEY_PREFIX}:{backend}:timeouts"
+
+        self._scripts = None
+
+    @contextmanager
+    def slot(self):
+        """
+        Hold one of the backend's concurrency slots for the duration of a call
+
+        Yields a SlotLease; pass it the response if its status is checked
+        outside the block, so error responses shrink the limit.
+        """
+        token = None
+        if self.enabled:
+            wait_start = time.time()
+            token = self.acquire()
+            provider_metrics.observe_queue_wait(self.backend, 'concurrency', time.time() - wait_start)
+        start_time = time.time()
+        lease = SlotLease()
+        try:
+            yield lease
+        except BaseException:
+            lease.failed()
+            raise
+        finally:
+            if token is not None:
+                self.release(token, int((time.time() - start_time) * 1000), lease.success)
+
+    @asynccontextmanager
+    async def aslot(self):
+        """Async variant of slot(); waiting for a slot does not block the event loop"""
+        token = None
+        if self.enabled:
+            wait_start = time.time()
+            token = await self.aacquire()
+            provider_metrics.observe_queue_wait(self.backend, 'concurrency', time.time() - wait_start)
+        start_time = time.time()
+        lease = SlotLease()
+        try:
+            yield lease
+        except BaseException:
+            lease.failed()
+            raise
+        finally:
+            if token is not None:
+                await sync_to_async(self.release, thread_sensitive=False)(
+                    token, int((time.time() - start_time) * 1000), lease.success
+                )
+
+    def acquire(self) -> Optional[str]:
+        """
+        Wait for a free slot, raising BackendOverloadedError if none is available
+
+        Returns the lease token, or None when Redis is unavailable (fail open).
+        """
+        redis = self._get_redis()
+        if redis is None:
+            return None
+
+        token = uuid.uuid4().hex
+        deadline = time.time() + self.queue_timeout
+        delay = 0.05
+
+        while True:
+            outcome = self._try_acquire(redis, token, deadline)
+            if outcome == 'acquired':
+                return token
+            if outcome == 'unavailable':
+                return None
+
+            time.sleep(min(delay, max(deadline - time.time(), 0.01)))
+            delay = min(delay * 2, 0.5)
+
+    async def aacquire(self) -> Optional[str]:
+        """Async variant of acquire()"""
+        redis = self._get_redis()
+        if redis is None:
+            return None
+
+        token = uuid.uuid4().hex
+        deadline = time.time() + self.queue_timeout
+        delay = 0.05
+        try_acquire = sync_to_async(self._try_acquire, thread_sensitive=False)
+
+        while True:
+            outcome = await try_acquire(redis, token, deadline)
+            if outcome == 'acquired':
+                return token
+            if outcome == 'unavailable':
+                return None
+
+            await asyncio.sleep(min(delay, max(deadline - time.time(), 0.01)))
+            delay = min(delay * 2, 0.5)
+
+    def _try_acquire(self, redis, token: str, deadline: float) -> str:
+        """
+        Make one attempt at a slot: returns 'acquired', 'queued' or 'unavailable'
+
+        Raises BackendOverloadedError when the queue is full or the deadline has passed.
+        """
+        now = time.time()
+        try:
+            status = self._get_scripts(redis)['acquire'](
+                keys=[self.holders_key, self.waiters_key, self.limit_key],
+                args=[token, now, now + self.lease_timeout, self.initial_limit, self.max_queue, deadline]
+            )
+        except Exception as e:
+            logger.warning(f"Concurrency limiter unavailable for {self.backend}: {str(e)}")
+            return 'unavailable'
+
+        if status == 1:
+            return 'acquired'
+
+        if status == -1:
+            self._incr(redis, self.rejections_key)
+            logger.warning(f"Rejected {self.backend} request: wait queue full")
+            raise BackendOverloadedError(self.backend, self.retry_after, 'queue_full')
+
+        if now >= deadline:
+            try:
+                redis.zrem(self.waiters_key, token)
+            except Exception:
+                pass
+            self._incr(redis, self.timeouts_key)
+            logger.warning(f"Rejected {self.backend} request: no slot within {self.queue_timeout}s")
+            raise BackendOverloadedError(self.backend, self.retry_after, 'queue_timeout')
+
+        return 'queued'
+
+    def release(self, token: str, latency_ms: int, success: bool):
+        """Release a slot and adapt the limit to the call's outcome"""
+        redis = self._get_redis()
+        if redis is None:
+            return
+
+        try:
+            self._get_scripts(redis)['release'](
+                keys=[self.holders_key, self.limit_key, self.last_decrease_key],
+                args=[
+                    token, latency_ms, '1' if success else '0', self.target_latency_ms,
+                    self.initial_limit, self.min_limit, self.max_limit, self.decrease_factor,
+                    time.time(), self.decrease_interval
+                ]
+            )
+        except Exception as e:
+            logger.warning(f"Could not release {self.backend} concurrency slot: {str(e)}")
+
+    def is_saturated(self) -> bool:
+        """True when a new request would be rejected because the wait queue is full"""
+        state = self.get_state()
+        return state.get('queue_depth', 0) >= self.max_queue
+
+    def get_state(self) -> Dict[str, Any]:
+        """Return the live limit, in-flight count, queue depth and rejection counters"""
+        state = {'enabled': self.enabled, 'max_queue': self.max_queue}
+        redis = self._get_redis()
+        if redis is None:
+            state['error'] = 'redis unavailable'
+            return state
+
+        try:
+            now = time.time()
+            pipe = redis.pipeline()
+            pipe.get(self.limit_key)
+            pipe.zcount(self.holders_key, now, '+inf')
+            pipe.zcount(self.waiters_key, now, '+inf')
+            pipe.get(self.rejections_key)
+            pipe.get(self.timeouts_key)
+            limit, in_flight, queue_depth, rejections, timeouts = pipe.execute()
+        except Exception as e:
+            state['error'] = str(e)
+            return state
+
+        state.update({
+            'limit': round(float(limit), 2) if limit else float(self.initial_limit),
+            'in_flight': in_flight,
+            'queue_depth': queue_depth,
+            'rejected_queue_full': int(rejections or 0),
+            'rejected_queue_timeout': int(timeouts or 0),
+        })
+        return state
+
+    def _incr(self, redis, key: str):
+        try:
+            redis.incr(key)
+        except Exception as e:
+            logger.debug(f"Could not update limiter counter {key}: {str(e)}")
+
+    def _get_redis(self):
+        try:
+            from django_redis import get_redis_connection
+            return get_redis_connection(self.cache_alias)
+        except Exception as e:
+            logger.debug(f"Redis not available for concurrency limiting: {str(e)}")
+            return None
+
+    def _get_scripts(self, redis):
+        if self._scripts is None:
+            self._scripts = {
+                'acquire': redis.register_script(ACQUIRE_SCRIPT),
+                'release': redis.register_script(RELEASE_SCRIPT),
+            }
+        return self._scripts
+
+
+class ConcurrencyLimiterRegistry:
+    """Creates and caches one ConcurrencyLimiter per backend"""
+
+    def __init__(self):
+        self._limiters: Dict[str, ConcurrencyLimiter] = {}
+        self._lock = threading.Lock()
+
+    def get(self, backend: str) -> ConcurrencyLimiter:
+        limiter = self._limiters.get(backend)
+        if limiter is not None:
+            return limiter
+
+        with self._lock:
+            if backend not in self._limiters:
+                self._limiters[backend] = ConcurrencyLimiter(backend, self._get_limiter_settings(backend))
+            return self._limiters[backend]
+
+    def get_states(self) -> Dict[str, Dict[str, Any]]:
+        return {backend: limiter.get_state() for backend, limiter in list(self._limiters.items())}
+
+    def _get_limiter_settings(self, backend: str) -> Dict[str, Any]:
+        configured = getattr(settings, 'LLM_CONCURRENCY_SETTINGS', {})
+        limiter_settings = dict(DEFAULT_LIMITER_SETTINGS)
+        limiter_settings.update(configured.get('DEFAULT', {}))
+        limiter_settings.update(configured.get(backend, {}))
+        return limiter_settings
+
+
+# Global registry shared by the analysis services in this process
+backend_limiters = ConcurrencyLimiterRegistry()
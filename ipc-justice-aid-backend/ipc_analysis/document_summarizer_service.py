@@ -2,10 +2,12 @@
 import logging
 import json
 from typing import Dict, Any, Optional
+from .concurrency import BackendOverloadedError
 from .ocr_service import OCRService
 from .services import OllamaService
+from .json_extraction import extract_json_object
+from .uploads import open_upload
 import PyPDF2
-import io
 
 logger = logging.getLogger(__name__)
 
@@ -69,6 +71,8 @@ class DocumentSummarizerService:
                 }
             }
             
+        except BackendOverloadedError:
+            raise
         except Exception as e:
             logger.error(f"Document summarization failed: {str(e)}")
             return {
@@ -79,22 +83,21 @@ class DocumentSummarizerService:
     def _extract_text_from_pdf(self, pdf_file) -> Dict[str, Any]:
         """Extract text from PDF file"""
         try:
-            pdf_data = pdf_file.read()
-            pdf_file.seek(0)  # Reset file pointer
-            
-            # Use PyPDF2 for text extraction
-            pdf_reader = PyPDF2.PdfReader(io.BytesIO(pdf_data))
-            
-            text_content = []
-            page_count = len(pdf_reader.pages)
-            
-            for page_num, page in enumerate(pdf_reader.pages):
-                try:
-                    page_text = page.extract_text()
-                    if page_text.strip():
-                        text_content.append(page_text)
-                except Exception as e:
-                    logger.warning(f"Failed to extract text from page {page_num + 1}: {str(e)}")
+            # Use PyPDF2 for text extraction, parsing the upload buffer or
+            # memory-mapped temp file in place instead of a copy of the PDF
+            with open_upload(pdf_file) as stream:
+                pdf_reader = PyPDF2.PdfReader(stream)
+                
+                text_content = []
+                page_count = len(pdf_reader.pages)
+                
+                for page_num, page in enumerate(pdf_reader.pages):
+                    try:
+                        page_text = page.extract_text()
+                        if page_text.strip():
+                            text_content.append(page_text)
+                    except Exception as e:
+                        logger.warning(f"Failed to extract text from page {page_num + 1}: {str(e)}")
             
             extracted_text = '\n'.join(text_content)
             
@@ -222,17 +225,7 @@ Make sure your response is valid JSON format. Use simple, clear language that an
         
         try:
             # Look for JSON blocks in the text
-            import re
-            json_pattern = r'\{.*?\}'
-            matches = re.findall(json_pattern, text, re.DOTALL)
-            
-            for match in matches:
-                try:
-                    return json.loads(match)
-                except:
-                    continue
-            
-            return None
+            return extract_json_object(text)
             
         except Exception as e:
             logger.warning(f"JSON parsing failed: {str(e)}")
@@ -277,3 +270,7 @@ Make sure your response is valid JSON format. Use simple, clear language that an
                 'valid': False,
                 'error': f'File validation error: {str(e)}'
             }
+
+
+# Global instance - shared across requests so the provider clients are reused
+document_summarizer_service = DocumentSummarizerService()
@@ -1,23 +1,60 @@
-import requests
+import asyncio
 import json
 import time
 import re
+from asgiref.sync import sync_to_async
 from django.conf import settings
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Iterator, Optional, Tuple
 import logging
 
+from .http_clients import REQUEST_ERRORS, TIMEOUT_ERRORS, get_async_provider_client, get_provider_client
+from .concurrency import BackendOverloadedError, backend_limiters
+from .quota import parse_retry_after, provider_quotas
+from .analysis_schema import ANALYSIS_SCHEMA, parse_failures, structured_output_enabled, to_gemini_schema
+from .json_extraction import extract_json_object, has_key, repair_truncated_json
+from .ipc_retrieval import ipc_retriever
+from .metrics import gemini_usage, provider_metrics
+
 logger = logging.getLogger(__name__)
 
 
 class GeminiService:
     """Service class to interact with Google Gemini API for IPC analysis"""
     
+    # Part of the analysis cache key
+    PROMPT_VERSION = '2'
+    
+    MAX_OUTPUT_TOKENS = 1024
+    
+    # Simple test request
+    HEALTH_CHECK_PAYLOAD = {
+        "contents": [
+            {
+                "parts": [
+                    {
+                        "text": "Say 'Hello' to test the connection."
+                    }
+                ]
+            }
+        ],
+        "generationConfig": {
+            "maxOutputTokens": 10
+        }
+    }
+    
     def __init__(self):
         self.api_key = getattr(settings, 'GEMINI_API_KEY', None)
         self.model_name = getattr(settings, 'GEMINI_MODEL', 'gemini-1.5-flash')  # or 'gemini-1.5-pro'
-        self.api_url = f"https://generativelanguage.googleapis.com/v1beta/models/{self.model_name}:generateContent"
+        self.api_base_url = getattr(
+            settings, 'GEMINI_API_BASE_URL', 'https://generativelanguage.googleapis.com/v1beta'
+        ).rstrip('/')
+        self.api_url = f"{self.api_base_url}/models/{self.model_name}:generateContent"
+        self.stream_api_url = f"{self.api_base_url}/models/{self.model_name}:streamGenerateContent"
         self.timeout = getattr(settings, 'GEMINI_TIMEOUT', 60)
         self.max_retries = getattr(settings, 'GEMINI_MAX_RETRIES', 3)
+        self.client = get_provider_client('gemini')
+        self.limiter = backend_limiters.get('gemini')
+        self.quota = provider_quotas.get('gemini')
         
         # Available Gemini models:
         # - gemini-1.5-flash: Faster, good for most tasks
@@ -46,42 +83,58 @@ class GeminiService:
         
         try:
             response = self._call_gemini_api(prompt)
-            end_time = time.time()
-            
-            response_time_ms = int((end_time - start_time) * 1000)
-            
             # Parse the response from Gemini
-            analysis_result = self._parse_legal_response(response, case_description)
-            
-            return {
-                'success': True,
-                'analysis': analysis_result,
-                'response_time_ms': response_time_ms,
-                'raw_response': response,
-                'model_used': self.model_name,
-                'error': None
-            }
+            return self._case_result(start_time, response, self._parse_legal_response(response, case_description))
             
+        except BackendOverloadedError:
+            raise
         except Exception as e:
-            end_time = time.time()
-            response_time_ms = int((end_time - start_time) * 1000)
             logger.error(f"Gemini API error: {str(e)}")
+            return self._case_result(start_time, error=str(e))
+    
+    async def aanalyze_case(self, case_description: str) -> Dict[str, Any]:
+        """Async variant of analyze_case for the async views"""
+        if not self.api_key:
+            return self._get_error_response("Gemini API key not configured")
+        
+        prompt = self._create_legal_prompt(case_description)
+        start_time = time.time()
+        
+        try:
+            response = await self._acall_gemini_api(prompt)
+            # Parsing records stats in the cache, so keep it off the event loop
+            analysis_result = await sync_to_async(self._parse_legal_response, thread_sensitive=False)(
+                response, case_description
+            )
+            return self._case_result(start_time, response, analysis_result)
             
-            return {
-                'success': False,
-                'analysis': None,
-                'response_time_ms': response_time_ms,
-                'raw_response': None,
-                'model_used': self.model_name,
-                'error': str(e)
-            }
+        except BackendOverloadedError:
+            raise
+        except Exception as e:
+            logger.error(f"Gemini API error: {str(e)}")
+            return self._case_result(start_time, error=str(e))
+    
+    def _case_result(self, start_time: float, response: Optional[str] = None,
+                     analysis: Optional[Dict[str, Any]] = None, error: Optional[str] = None) -> Dict[str, Any]:
+        """Result of analyze_case, successful unless an error is given"""
+        return {
+            'success': error is None,
+            'analysis': analysis,
+            'response_time_ms': int((time.time() - start_time) * 1000),
+            'raw_response': response,
+            'model_used': self.model_name,
+            'error': error
+        }
     
     def _create_legal_prompt(self, case_description: str) -> str:
         """Create a formatted prompt for legal analysis - matches Ollama service prompt exactly"""
+        candidates = ipc_retriever.format_candidates(case_description)
+        if candidates:
+            candidates += "\n\n"
         prompt = f"""
 {case_description.strip()}
 
-Which IPC sections will be applied in this case? Give response in JSON format with a description of those IPCs and why were those applied.
+{candidates}Which IPC sections will be applied in this case? Give response in JSON format with a description of those IPCs and why were those applied.
 
 Please provide the response in the following JSON format:
 {{
@@ -97,9 +150,8 @@ Please provide the response in the following JSON format:
 """
         return prompt
     
-    def _call_gemini_api(self, prompt: str) -> str:
-        """Make the actual API call to Gemini API"""
-        # Gemini API request format
+    def _build_payload(self, prompt: str) -> Dict[str, Any]:
+        """Build the Gemini generateContent request body"""
         payload = {
             "contents": [
                 {
@@ -114,7 +166,7 @@ Please provide the response in the following JSON format:
                 "temperature": 0.3,  # Low temperature for consistent legal analysis
                 "topK": 40,
                 "topP": 0.95,
-                "maxOutputTokens": 1024,
+                "maxOutputTokens": self.MAX_OUTPUT_TOKENS,
                 "stopSequences": []
             },
             "safetySettings": [
@@ -137,71 +189,204 @@ Please provide the response in the following JSON format:
             ]
         }
         
+        if structured_output_enabled():
+            # Constrain the output to the analysis schema
+            payload["generationConfig"]["responseMimeType"] = "application/json"
+            payload["generationConfig"]["responseSchema"] = to_gemini_schema(ANALYSIS_SCHEMA)
+        
+        return payload
+    
+    def _call_gemini_api(self, prompt: str) -> str:
+        """Make the actual API call to Gemini API"""
+        payload = self._build_payload(prompt)
+        
         # Add API key to URL
         url_with_key = f"{self.api_url}?key={self.api_key}"
+        estimated_tokens = self.quota.estimate_tokens(prompt, self.MAX_OUTPUT_TOKENS)
         
         for attempt in range(self.max_retries):
             try:
-                response = requests.post(
-                    url_with_key,
-                    headers=self.headers,
-                    json=payload,
-                    timeout=self.timeout
-                )
+                # Waits for quota headroom shared by all workers
+                reserved_tokens = self.quota.reserve(estimated_tokens)
+                with self.limiter.slot() as lease, provider_metrics.track('gemini') as call:
+                    response = self.client.post(
+                        url_with_key,
+                        headers=self.headers,
+                        json=payload,
+                        timeout=self.timeout
+                    )
+                    call.received(response)
+                    lease.received(response)
                 
-                if response.status_code == 200:
-                    result = response.json()
-                    
-                    # Extract text from Gemini response format
-                    if 'candidates' in result and len(result['candidates']) > 0:
-                        candidate = result['candidates'][0]
-                        if 'content' in candidate and 'parts' in candidate['content']:
-                            parts = candidate['content']['parts']
-                            if len(parts) > 0 and 'text' in parts[0]:
-                                return parts[0]['text']
+                response_text, wait_time = self._handle_response(response, call, reserved_tokens, attempt)
+                if response_text is not None:
+                    return response_text
                     
-                    # Fallback to raw response if structure is unexpected
-                    return str(result)
-                
-                elif response.status_code == 429:
-                    # Rate limit, wait and retry
-                    if attempt < self.max_retries - 1:
-                        wait_time = (2 ** attempt) * 2  # Exponential backoff starting at 2s
-                        logger.info(f"Rate limited, waiting {wait_time}s before retry...")
-                        time.sleep(wait_time)
-                        continue
-                    else:
-                        raise Exception("Rate limit exceeded after multiple retries")
-                
-                elif response.status_code == 400:
-                    # Bad request - probably a prompt issue
-                    error_details = response.json() if response.content else {}
-                    raise Exception(f"Bad request: {error_details}")
-                
-                elif response.status_code == 403:
-                    # Permission denied - API key issue
-                    raise Exception("Permission denied - check your Gemini API key")
+            except REQUEST_ERRORS as e:
+                wait_time = self._retry_delay(e, attempt)
+            
+            if wait_time:
+                time.sleep(wait_time)
+        
+        raise Exception("Failed to get response from Gemini API")
+    
+    async def _acall_gemini_api(self, prompt: str) -> str:
+        """Async variant of _call_gemini_api; backoff sleeps don't block the event loop"""
+        payload = self._build_payload(prompt)
+        url_with_key = f"{self.api_url}?key={self.api_key}"
+        client = get_async_provider_client('gemini')
+        estimated_tokens = self.quota.estimate_tokens(prompt, self.MAX_OUTPUT_TOKENS)
+        
+        for attempt in range(self.max_retries):
+            try:
+                reserved_tokens = await self.quota.areserve(estimated_tokens)
+                async with self.limiter.aslot() as lease:
+                    with provider_metrics.track('gemini') as call:
+                        response = await client.post(
+                            url_with_key,
+                            headers=self.headers,
+                            json=payload,
+                            timeout=self.timeout
+                        )
+                        call.received(response)
+                        lease.received(response)
                 
-                else:
-                    raise Exception(f"Gemini API error: {response.status_code} - {response.text}")
+                # Settling and throttling update the shared quota in the cache
+                response_text, wait_time = await sync_to_async(self._handle_response, thread_sensitive=False)(
+                    response, call, reserved_tokens, attempt
+                )
+                if response_text is not None:
+                    return response_text
                     
-            except requests.exceptions.Timeout:
-                if attempt < self.max_retries - 1:
-                    logger.warning(f"Request timeout, retrying... (attempt {attempt + 1})")
-                    continue
-                else:
-                    raise Exception("Request timeout after multiple retries")
+            except REQUEST_ERRORS as e:
+                wait_time = self._retry_delay(e, attempt)
             
-            except requests.exceptions.RequestException as e:
-                if attempt < self.max_retries - 1:
-                    logger.warning(f"Request failed, retrying... (attempt {attempt + 1}): {str(e)}")
-                    time.sleep(1)
-                    continue
-                else:
-                    raise Exception(f"Request failed after multiple retries: {str(e)}")
+            if wait_time:
+                await asyncio.sleep(wait_time)
         
         raise Exception("Failed to get response from Gemini API")
     
+    def _handle_response(self, response, call, reserved_tokens: int, attempt: int) -> Tuple[Optional[str], float]:
+        """
+        Settle a generateContent response against the quota
+        
+        Returns:
+            (text, 0) on success, or (None, seconds to wait) when a rate limited
+            call should be retried
+        """
+        if response.status_code == 200:
+            result = response.json()
+            self.quota.settle(reserved_tokens, self._get_token_count(result))
+            call.record_usage(**gemini_usage(result))
+            return self._extract_response_text(result), 0
+        
+        if response.status_code == 429:
+            if attempt >= self.max_retries - 1:
+                raise Exception("Rate limit exceeded after multiple retries")
+            
+            # Rate limit: pause every worker, the next reservation waits it out
+            provider_metrics.count_retry('gemini', 'rate_limited')
+            if self.quota.throttle(parse_retry_after(response.headers.get('Retry-After'))):
+                return None, 0
+            wait_time = (2 ** attempt) * 2  # Exponential backoff starting at 2s
+            logger.info(f"Rate limited, waiting {wait_time}s before retry...")
+            return None, wait_time
+        
+        self._raise_for_status(response)
+    
+    def _retry_delay(self, error: Exception, attempt: int) -> float:
+        """Seconds to wait before retrying a failed request; raises once retries are used up"""
+        if isinstance(error, TIMEOUT_ERRORS):
+            if attempt >= self.max_retries - 1:
+                raise Exception("Request timeout after multiple retries")
+            logger.warning(f"Request timeout, retrying... (attempt {attempt + 1})")
+            provider_metrics.count_retry('gemini', 'timeout')
+            return 0
+        
+        if attempt >= self.max_retries - 1:
+            raise Exception(f"Request failed after multiple retries: {str(error)}")
+        logger.warning(f"Request failed, retrying... (attempt {attempt + 1}): {str(error)}")
+        provider_metrics.count_retry('gemini', 'error')
+        return 1
+    
+    def _extract_response_text(self, result: Dict[str, Any]) -> str:
+        """Extract the generated text from a generateContent response"""
+        if 'candidates' in result and len(result['candidates']) > 0:
+            candidate = result['candidates'][0]
+            if candidate.get('finishReason') == 'MAX_TOKENS':
+                logger.warning("Gemini response hit maxOutputTokens, it will be repaired if truncated")
+            if 'content' in candidate and 'parts' in candidate['content']:
+                parts = candidate['content']['parts']
+                if len(parts) > 0 and 'text' in parts[0]:
+                    return parts[0]['text']
+        
+        # Fallback to raw response if structure is unexpected
+        return str(result)
+    
+    @staticmethod
+    def _get_token_count(result: Dict[str, Any]) -> Optional[int]:
+        """Tokens charged for a call, from the response's usage metadata"""
+        return result.get('usageMetadata', {}).get('totalTokenCount')
+    
+    def _raise_for_status(self, response):
+        """Raise for a non-retryable error response"""
+        if response.status_code == 400:
+            # Bad request - probably a prompt issue
+            error_details = response.json() if response.content else {}
+            raise Exception(f"Bad request: {error_details}")
+        
+        if response.status_code == 403:
+            # Permission denied - API key issue
+            raise Exception("Permission denied - check your Gemini API key")
+        
+        raise Exception(f"Gemini API error: {response.status_code} - {response.text}")
+    
+    def stream_analysis(self, case_description: str) -> Iterator[str]:
+        """
+        Stream the model output for a case description using streamGenerateContent
+        
+        Yields:
+            Text chunks as Gemini generates them
+        """
+        if not self.api_key:
+            raise Exception("Gemini API key not configured")
+        
+        prompt = self._create_legal_prompt(case_description)
+        payload = self._build_payload(prompt)
+        url_with_key = f"{self.stream_api_url}?alt=sse&key={self.api_key}"
+        
+        reserved_tokens = self.quota.reserve(self.quota.estimate_tokens(prompt, self.MAX_OUTPUT_TOKENS))
+        token_count = None
+        usage = {}
+        
+        with self.limiter.slot(), provider_metrics.track('gemini') as call, \
+                self.client.post(url_with_key, headers=self.headers, json=payload,
+                                 timeout=self.timeout, stream=True) as response:
+            call.received(response)
+            if response.status_code == 429:
+                self.quota.throttle(parse_retry_after(response.headers.get('Retry-After')))
+                raise Exception("Rate limit exceeded")
+            if response.status_code != 200:
+                raise Exception(f"Gemini API error: {response.status_code} - {response.text}")
+            
+            for line in response.iter_lines(decode_unicode=True):
+                if not line or not line.startswith('data:'):
+                    continue
+                
+                event = json.loads(line[len('data:'):].strip())
+                # Every event carries the running usage; the last one has the total
+                token_count = self._get_token_count(event) or token_count
+                if event.get('usageMetadata'):
+                    usage = gemini_usage(event)
+                for candidate in event.get('candidates', [])[:1]:
+                    for part in candidate.get('content', {}).get('parts', []):
+                        if part.get('text'):
+                            call.first_byte()
+                            yield part['text']
+        
+        self.quota.settle(reserved_tokens, token_count)
+        call.record_usage(**usage)
+    
     def _parse_legal_response(self, response_text: str, original_case: str) -> Dict[str, Any]:
         """Parse the response using the same logic as Ollama service"""
         try:
@@ -213,11 +398,13 @@ Please provide the response in the following JSON format:
             
             # Validate required fields (same as Ollama service)
             if 'sections_applied' not in parsed:
+                parse_failures.record('gemini', failed=True)
                 raise ValueError("Missing 'sections_applied' in response")
             
             if 'explanation' not in parsed:
                 parsed['explanation'] = "No explanation provided"
             
+            parse_failures.record('gemini', failed=False)
             return parsed
             
         except json.JSONDecodeError as e:
@@ -226,19 +413,19 @@ Please provide the response in the following JSON format:
     
     def _extract_json_from_text(self, text: str) -> Dict[str, Any]:
         """Extract JSON from text response - same logic as Ollama service"""
-        import re
-        
-        # Look for JSON patterns in the text (same as Ollama service)
-        json_pattern = r'\{.*\}'
-        match = re.search(json_pattern, text, re.DOTALL)
+        parsed = extract_json_object(text, has_key('sections_applied'))
+        if parsed is not None:
+            parse_failures.record('gemini', failed=False)
+            return parsed
         
-        if match:
-            try:
-                return json.loads(match.group())
-            except json.JSONDecodeError:
-                pass
+        # Keep the complete sections of a response cut off by the output token limit
+        parsed = repair_truncated_json(text, has_key('sections_applied'))
+        if parsed is not None:
+            parse_failures.record('gemini', failed=False, partial=True)
+            return parsed
         
         # Fallback: create a basic structure (same as Ollama service)
+        parse_failures.record('gemini', failed=True)
         return {
             "sections_applied": [
                 {
@@ -284,54 +471,45 @@ Please provide the response in the following JSON format:
     def health_check(self) -> Dict[str, Any]:
         """Check if Gemini service is available"""
         if not self.api_key:
-            return {
-                'status': 'unhealthy',
-                'error': 'API key not configured',
-                'service': 'gemini'
-            }
+            return self._health_status(error='API key not configured')
         
         try:
-            # Simple test request
-            test_payload = {
-                "contents": [
-                    {
-                        "parts": [
-                            {
-                                "text": "Say 'Hello' to test the connection."
-                            }
-                        ]
-                    }
-                ],
-                "generationConfig": {
-                    "maxOutputTokens": 10
-                }
-            }
-            
-            url_with_key = f"{self.api_url}?key={self.api_key}"
-            
-            response = requests.post(
-                url_with_key,
+            response = self.client.post(
+                f"{self.api_url}?key={self.api_key}",
                 headers=self.headers,
-                json=test_payload,
+                json=self.HEALTH_CHECK_PAYLOAD,
                 timeout=10
             )
-            
-            if response.status_code == 200:
-                return {
-                    'status': 'healthy',
-                    'model_name': self.model_name,
-                    'service': 'gemini'
-                }
-            else:
-                return {
-                    'status': 'unhealthy',
-                    'error': f"HTTP {response.status_code}",
-                    'service': 'gemini'
-                }
-                
+            return self._health_status(status_code=response.status_code)
         except Exception as e:
+            return self._health_status(error=str(e))
+    
+    async def ahealth_check(self) -> Dict[str, Any]:
+        """Async variant of health_check"""
+        if not self.api_key:
+            return self._health_status(error='API key not configured')
+        
+        try:
+            response = await get_async_provider_client('gemini').post(
+                f"{self.api_url}?key={self.api_key}",
+                headers=self.headers,
+                json=self.HEALTH_CHECK_PAYLOAD,
+                timeout=10
+            )
+            return self._health_status(status_code=response.status_code)
+        except Exception as e:
+            return self._health_status(error=str(e))
+    
+    def _health_status(self, status_code: Optional[int] = None, error: Optional[str] = None) -> Dict[str, Any]:
+        if status_code == 200:
             return {
-                'status': 'unhealthy',
-                'error': str(e),
+                'status': 'healthy',
+                'model_name': self.model_name,
                 'service': 'gemini'
             }
+        
+        return {
+            'status': 'unhealthy',
+            'error': error or f"HTTP {status_code}",
+            'service': 'gemini'
+        }
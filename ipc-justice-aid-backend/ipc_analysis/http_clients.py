@@ -0,0 +1,271 @@
+"""
+Process-wide HTTP clients for the LLM providers.
+
+Each provider gets one keep-alive ``requests.Session`` with its own connection
+pool, connect timeout and connect-retry policy, so repeated calls reuse TCP/TLS
+connections instead of doing a fresh handshake per request. The async views
+use the ``httpx.AsyncClient`` equivalents, one per provider and event loop.
+"""
+import asyncio
+import logging
+import threading
+import weakref
+from typing import Any, Dict
+
+import httpx
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+logger = logging.getLogger(__name__)
+
+
+DEFAULT_CLIENT_SETTINGS = {
+    'POOL_CONNECTIONS': 4,
+    'POOL_MAXSIZE': 16,
+    'CONNECT_TIMEOUT': 5,
+    'TIMEOUT': 60,
+    'CONNECT_RETRIES': 2,
+    'BACKOFF_FACTOR': 0.5,
+    # One async worker holds many slow calls at once
+    'ASYNC_POOL_MAXSIZE': 100,
+}
+
+# The same failures as raised by the requests sessions and the httpx clients,
+# so the sync and async call paths share one retry classification
+TIMEOUT_ERRORS = (requests.exceptions.Timeout, httpx.TimeoutException)
+CONNECTION_ERRORS = (requests.exceptions.ConnectionError, httpx.ConnectError)
+# Any failed request, including an error status from raise_for_status()
+REQUEST_ERRORS = (requests.exceptions.RequestException, httpx.HTTPError)
+
+
+class ProviderClient:
+    """Keep-alive HTTP client for a single LLM provider"""
+
+    def __init__(self, provider: str, client_settings: Dict[str, Any]):
+        self.provider = provider
+        self.timeout = client_settings['TIMEOUT']
+        self.connect_timeout = client_settings['CONNECT_TIMEOUT']
+        self.pool_maxsize = client_settings['POOL_MAXSIZE']
+
+        # Only connection failures are retried here: the request has not been
+        # sent yet, so this is safe for POSTs. Status and read retries stay in
+        # the services, which know which responses are worth retrying.
+        retry = Retry(
+            total=client_settings['CONNECT_RETRIES'],
+            connect=client_settings['CONNECT_RETRIES'],
+            read=0,
+            status=0,
+            redirect=0,
+            backoff_factor=client_settings['BACKOFF_FACTOR'],
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(
+            pool_connections=client_settings['POOL_CONNECTIONS'],
+            pool_maxsize=client_settings['POOL_MAXSIZE'],
+            max_retries=retry,
+        )
+
+        self.session = requests.Session()
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+        self._lock = threading.Lock()
+        self._request_count = 0
+        self._error_count = 0
+
+    def request(self, method: str, url: str, **kwargs) -> requests.Response:
+        """Send a request, applying the provider's default and connect timeouts"""
+        timeout = kwargs.pop('timeout', None) or self.timeout
+        if not isinstance(timeout, tuple):
+            timeout = (min(self.connect_timeout, timeout), timeout)
+
+        with self._lock:
+            self._request_count += 1
+
+        try:
+            return self.session.request(method, url, timeout=timeout, **kwargs)
+        except requests.exceptions.RequestException:
+            with self._lock:
+                self._error_count += 1
+            raise
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url: str, **kwargs) -> requests.Response:
+        return self.request('POST', url, **kwargs)
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """Return connection reuse statistics for this client"""
+        connections_opened = 0
+        pool_requests = 0
+        idle_connections = 0
+
+        for adapter in set(self.session.adapters.values()):
+            pools = adapter.poolmanager.pools
+            for key in pools.keys():
+                pool = pools[key]
+                if pool is None:
+                    continue
+                connections_opened += pool.num_connections
+                pool_requests += pool.num_requests
+                if pool.pool is not None:
+                    idle_connections += sum(1 for conn in list(pool.pool.queue) if conn is not None)
+
+        reused = max(pool_requests - connections_opened, 0)
+        return {
+            'requests': self._request_count,
+            'errors': self._error_count,
+            'connections_opened': connections_opened,
+            'connections_reused': reused,
+            'reuse_ratio': round(reused / pool_requests, 4) if pool_requests else 0.0,
+            'idle_connections': idle_connections,
+            'pool_maxsize': self.pool_maxsize,
+            'timeout': self.timeout,
+            'connect_timeout': self.connect_timeout,
+        }
+
+    def close(self):
+        self.session.close()
+
+
+class AsyncProviderClient:
+    """Keep-alive async HTTP client for a single LLM provider, bound to one event loop"""
+
+    def __init__(self, provider: str, client_settings: Dict[str, Any]):
+        self.provider = provider
+        self.timeout = client_settings['TIMEOUT']
+        self.connect_timeout = client_settings['CONNECT_TIMEOUT']
+        self.pool_maxsize = client_settings['ASYNC_POOL_MAXSIZE']
+
+        # As with the sync client, only connection failures are retried here
+        transport = httpx.AsyncHTTPTransport(
+            retries=client_settings['CONNECT_RETRIES'],
+            limits=httpx.Limits(
+                max_connections=self.pool_maxsize,
+                max_keepalive_connections=self.pool_maxsize,
+            ),
+        )
+        self.client = httpx.AsyncClient(transport=transport)
+
+        self._request_count = 0
+        self._error_count = 0
+
+    async def request(self, method: str, url: str, **kwargs) -> httpx.Response:
+        """Send a request, applying the provider's default and connect timeouts"""
+        timeout = kwargs.pop('timeout', None) or self.timeout
+        self._request_count += 1
+
+        try:
+            return await self.client.request(
+                method, url, timeout=httpx.Timeout(timeout, connect=min(self.connect_timeout, timeout)), **kwargs
+            )
+        except httpx.HTTPError:
+            self._error_count += 1
+            raise
+
+    async def get(self, url: str, **kwargs) -> httpx.Response:
+        return await self.request('GET', url, **kwargs)
+
+    async def post(self, url: str, **kwargs) -> httpx.Response:
+        return await self.request('POST', url, **kwargs)
+
+    def get_metrics(self) -> Dict[str, Any]:
+        return {
+            'requests': self._request_count,
+            'errors': self._error_count,
+            'pool_maxsize': self.pool_maxsize,
+        }
+
+    async def aclose(self):
+        await self.client.aclose()
+
+
+class ProviderClientRegistry:
+    """Lazily creates and caches one ProviderClient per provider"""
+
+    def __init__(self):
+        self._clients: Dict[str, ProviderClient] = {}
+        self._lock = threading.Lock()
+
+    def get(self, provider: str) -> ProviderClient:
+        client = self._clients.get(provider)
+        if client is not None:
+            return client
+
+        with self._lock:
+            if provider not in self._clients:
+                self._clients[provider] = ProviderClient(provider, self._get_client_settings(provider))
+                logger.info(f"Created pooled HTTP client for {provider}")
+            return self._clients[provider]
+
+    def get_metrics(self) -> Dict[str, Dict[str, Any]]:
+        return {provider: client.get_metrics() for provider, client in self._clients.items()}
+
+    def close_all(self):
+        with self._lock:
+            for client in self._clients.values():
+                client.close()
+            self._clients.clear()
+
+    def _get_client_settings(self, provider: str) -> Dict[str, Any]:
+        configured = getattr(settings, 'LLM_HTTP_CLIENT_SETTINGS', {})
+        client_settings = dict(DEFAULT_CLIENT_SETTINGS)
+        client_settings.update(configured.get('DEFAULT', {}))
+        client_settings.update(configured.get(provider, {}))
+        return client_settings
+
+
+class AsyncProviderClientRegistry:
+    """
+    Lazily creates one AsyncProviderClient per provider and event loop
+
+    httpx connections cannot be shared between event loops. Under the ASGI
+    server there is one loop per worker; when an async view runs under WSGI
+    each request gets its own loop and its own short-lived client.
+    """
+
+    def __init__(self):
+        self._clients = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+
+    def get(self, provider: str) -> AsyncProviderClient:
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            clients = self._clients.setdefault(loop, {})
+            if provider not in clients:
+                clients[provider] = AsyncProviderClient(
+                    provider, provider_clients._get_client_settings(provider)
+                )
+                logger.info(f"Created pooled async HTTP client for {provider}")
+            return clients[provider]
+
+    def get_metrics(self) -> Dict[str, Dict[str, Any]]:
+        metrics = {}
+        with self._lock:
+            clients = [client for loop_clients in self._clients.values() for client in loop_clients.values()]
+        for client in clients:
+            provider_metrics = metrics.setdefault(client.provider, {'requests': 0, 'errors': 0, 'event_loops': 0})
+            client_metrics = client.get_metrics()
+            provider_metrics['requests'] += client_metrics['requests']
+            provider_metrics['errors'] += client_metrics['errors']
+            provider_metrics['event_loops'] += 1
+            provider_metrics['pool_maxsize'] = client_metrics['pool_maxsize']
+        return metrics
+
+
+# Global registries shared by all provider services in this process
+provider_clients = ProviderClientRegistry()
+async_provider_clients = AsyncProviderClientRegistry()
+
+
+def get_provider_client(provider: str) -> ProviderClient:
+    """Return the shared HTTP client for a provider"""
+    return provider_clients.get(provider)
+
+
+def get_async_provider_client(provider: str) -> AsyncProviderClient:
+    """Return the async HTTP client for a provider on the running event loop"""
+    return async_provider_clients.get(provider)
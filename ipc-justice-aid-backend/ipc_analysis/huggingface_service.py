@@ -6,12 +6,19 @@ from django.conf import settings
 from typing import Dict, Any, Optional
 import logging
 
+from .http_clients import get_provider_client
+from .json_extraction import extract_json_object, has_key, repair_truncated_json
+from .ipc_retrieval import ipc_retriever
+from .metrics import provider_metrics
+
 logger = logging.getLogger(__name__)
 
 
 class HuggingFaceService:
     """Service class to interact with Hugging Face Inference API for IPC analysis"""
     
+    PROMPT_VERSION = '2'
+    
     def __init__(self):
         self.api_token = getattr(settings, 'HUGGINGFACE_API_TOKEN', None)
         # Use a better model for legal analysis - Mistral is better for instruction following
@@ -19,6 +26,7 @@ class HuggingFaceService:
         self.api_url = f"https://api-inference.huggingface.co/models/{self.model_id}"
         self.timeout = getattr(settings, 'HUGGINGFACE_TIMEOUT', 60)
         self.max_retries = getattr(settings, 'HUGGINGFACE_MAX_RETRIES', 3)
+        self.client = get_provider_client('huggingface')
         
         # Alternative models for legal analysis:
         # 1. mistralai/Mistral-7B-Instruct-v0.1 - Good for instruction following
@@ -81,10 +89,13 @@ class HuggingFaceService:
     
     def _create_legal_prompt(self, case_description: str) -> str:
         """Create a formatted prompt for legal analysis - matches Ollama service prompt exactly"""
+        candidates = ipc_retriever.format_candidates(case_description)
+        if candidates:
+            candidates += "\n\n"
         prompt = f"""
 {case_description.strip()}
 
-Which IPC sections will be applied in this case? Give response in JSON format with a description of those IPCs and why were those applied.
+{candidates}Which IPC sections will be applied in this case? Give response in JSON format with a description of those IPCs and why were those applied.
 
 Please provide the response in the following JSON format:
 {{
@@ -153,12 +164,14 @@ Please provide the response in the following JSON format:
         
         for attempt in range(self.max_retries):
             try:
-                response = requests.post(
-                    self.api_url,
-                    headers=self.headers,
-                    json=payload,
-                    timeout=self.timeout
-                )
+                with provider_metrics.track('huggingface') as call:
+                    response = self.client.post(
+                        self.api_url,
+                        headers=self.headers,
+                        json=payload,
+                        timeout=self.timeout
+                    )
+                    call.received(response)
                 
                 if response.status_code == 200:
                     result = response.json()
@@ -174,6 +187,7 @@ Please provide the response in the following JSON format:
                 elif response.status_code == 503:
                     # Model loading, wait and retry
                     if attempt < self.max_retries - 1:
+                        provider_metrics.count_retry('huggingface', 'model_loading')
                         wait_time = 2 ** attempt  # Exponential backoff
                         logger.info(f"Model loading, waiting {wait_time}s before retry...")
                         time.sleep(wait_time)
@@ -187,6 +201,7 @@ Please provide the response in the following JSON format:
             except requests.exceptions.Timeout:
                 if attempt < self.max_retries - 1:
                     logger.warning(f"Request timeout, retrying... (attempt {attempt + 1})")
+                    provider_metrics.count_retry('huggingface', 'timeout')
                     continue
                 else:
                     raise Exception("Request timeout after multiple retries")
@@ -194,6 +209,7 @@ Please provide the response in the following JSON format:
             except requests.exceptions.RequestException as e:
                 if attempt < self.max_retries - 1:
                     logger.warning(f"Request failed, retrying... (attempt {attempt + 1}): {str(e)}")
+                    provider_metrics.count_retry('huggingface', 'error')
                     time.sleep(1)
                     continue
                 else:
@@ -225,17 +241,14 @@ Please provide the response in the following JSON format:
     
     def _extract_json_from_text(self, text: str) -> Dict[str, Any]:
         """Extract JSON from text response - same logic as Ollama service"""
-        import re
-        
-        # Look for JSON patterns in the text (same as Ollama service)
-        json_pattern = r'\{.*\}'
-        match = re.search(json_pattern, text, re.DOTALL)
+        parsed = extract_json_object(text, has_key('sections_applied'))
+        if parsed is not None:
+            return parsed
         
-        if match:
-            try:
-                return json.loads(match.group())
-            except json.JSONDecodeError:
-                pass
+        # Keep the complete sections of a response cut off by the token limit
+        parsed = repair_truncated_json(text, has_key('sections_applied'))
+        if parsed is not None:
+            return parsed
         
         # Fallback: create a basic structure (same as Ollama service)
         return {
@@ -296,7 +309,7 @@ Please provide the response in the following JSON format:
                 "parameters": {"max_new_tokens": 10}
             }
             
-            response = requests.post(
+            response = self.client.post(
                 self.api_url,
                 headers=self.headers,
                 json=test_payload,
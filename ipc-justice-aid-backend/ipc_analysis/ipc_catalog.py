@@ -0,0 +1,102 @@
+"""
+Server-side catalog of IPC sections loaded from the structured corpus
+(``next-frontend/ipc.json``, configurable via IPC_CORPUS_PATH).
+
+Lets the analysis services ask the model for section numbers only and fill
+in descriptions, punishments and bail/cognizance details from the corpus.
+"""
+import json
+import logging
+import re
+import threading
+from typing import Any, Dict, List, Optional
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+
+# Source annotations left in the corpus text, e.g. "[cite: 746]"
+CITATION_PATTERN = re.compile(r'\s*\[cite:[^\]]*\]')
+SECTION_PREFIX_PATTERN = re.compile(r'^(?:ipc\s*)?(?:section|sec\.?|s\.)?\s*', re.IGNORECASE)
+
+
+class IPCCatalog:
+    """Lookup of IPC sections by number, loaded once per process"""
+
+    def __init__(self, corpus_path: Optional[str] = None):
+        self.corpus_path = corpus_path
+        self._sections: Optional[Dict[str, Dict[str, Any]]] = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def normalize_section_number(value: Any) -> str:
+        """Normalize 'Section 304 A', 'IPC 304a' or '304A' to '304A'"""
+        number = SECTION_PREFIX_PATTERN.sub('', str(value or '').strip())
+        return re.sub(r'\s+', '', number).upper()
+
+    @property
+    def sections(self) -> Dict[str, Dict[str, Any]]:
+        if self._sections is None:
+            with self._lock:
+                if self._sections is None:
+                    self._sections = self._load()
+        return self._sections
+
+    @property
+    def is_available(self) -> bool:
+        return bool(self.sections)
+
+    def get(self, section_number: Any) -> Optional[Dict[str, Any]]:
+        return self.sections.get(self.normalize_section_number(section_number))
+
+    def all(self) -> List[Dict[str, Any]]:
+        return list(self.sections.values())
+
+    def __len__(self) -> int:
+        return len(self.sections)
+
+    def _load(self) -> Dict[str, Dict[str, Any]]:
+        path = self.corpus_path or getattr(settings, 'IPC_CORPUS_PATH', None)
+        if not path:
+            logger.warning("IPC_CORPUS_PATH not configured, IPC catalog is empty")
+            return {}
+
+        try:
+            with open(path, encoding='utf-8') as corpus_file:
+                entries = json.load(corpus_file)
+        except (OSError, json.JSONDecodeError) as e:
+            logger.warning(f"Could not load IPC corpus from {path}: {str(e)}")
+            return {}
+
+        sections = {}
+        for entry in entries:
+            number = self.normalize_section_number(entry.get('section'))
+            if not number:
+                continue
+            sections[number] = {
+                'section_number': number,
+                'title': self._clean(entry.get('title')),
+                'description': self._clean(entry.get('description')),
+                'punishment': self._clean(entry.get('punishment')),
+                'bailable': entry.get('bailable'),
+                'cognizable': entry.get('cognizable'),
+                'severity': entry.get('severity'),
+                'category': entry.get('category'),
+                'chapter': entry.get('chapter'),
+                'keywords': entry.get('keywords', []),
+                'related_sections': [
+                    self.normalize_section_number(related) for related in entry.get('relatedSections', [])
+                ],
+            }
+
+        logger.info(f"Loaded {len(sections)} IPC sections from {path}")
+        return sections
+
+    @staticmethod
+    def _clean(text: Optional[str]) -> str:
+        return CITATION_PATTERN.sub('', text or '').strip()
+
+
+# Global instance shared by the analysis services
+ipc_catalog = IPCCatalog()
@@ -0,0 +1,202 @@
+"""
+BM25 retrieval over the IPC catalog, used to ground the analysis prompts.
+
+Each case description is matched against the title, keywords and text of
+every section in ``ipc_catalog``; the top-k candidates are injected into the
+prompt as short excerpts so the model picks from them instead of recalling
+section text from memory. The index is built once per process.
+"""
+import logging
+import math
+import re
+import threading
+import time
+from collections import Counter
+from typing import Any, Dict, List, Optional, Tuple
+
+from django.conf import settings
+
+from .ipc_catalog import IPCCatalog, ipc_catalog
+
+logger = logging.getLogger(__name__)
+
+
+TOKEN_PATTERN = re.compile(r'[a-z0-9]+')
+STOP_WORDS = frozenset(
+    'a an and any are as at be been being but by for from had has have he her him his i if in into is it its '
+    'me my no not of on or other our shall she so such than that the their them then there these they this '
+    'to upon was we were what when where which who whoever whom will with without you your'.split()
+)
+SUFFIXES = ('ings', 'ing', 'edly', 'ed', 'ence', 'ent', 'ies', 'es', 's')
+
+# Everyday words in case descriptions mapped to the terms the corpus uses
+QUERY_EXPANSIONS = {
+    'stole': 'theft', 'stolen': 'theft', 'steal': 'theft', 'snatch': 'theft robbery',
+    'loot': 'robbery', 'kill': 'murder death', 'murder': 'death', 'die': 'death', 'died': 'death',
+    'dead': 'death', 'beat': 'hurt', 'hit': 'hurt', 'injured': 'hurt', 'injury': 'hurt', 'scam': 'cheating fraud',
+    'fraud': 'cheating', 'otp': 'cheating fraud', 'dowry': 'cruelty husband', 'harass': 'cruelty',
+    'threat': 'intimidation', 'rape': 'sexual assault', 'molest': 'assault modesty woman',
+    'kidnap': 'kidnapping abduction', 'bribe': 'gratification', 'forge': 'forgery', 'fake': 'forgery cheating',
+    'drunk': 'rash', 'speed': 'rash negligence', 'reckless': 'rash negligence',
+}
+
+DEFAULT_RETRIEVAL_SETTINGS = {
+    'ENABLED': True,
+    'TOP_K': 8,
+    'EXCERPT_CHARS': 240,
+}
+
+
+def _stem(word: str) -> str:
+    """Strip a common English suffix so 'stealing' and 'steals' meet at 'steal'"""
+    for suffix in SUFFIXES:
+        if word.endswith(suffix) and len(word) - len(suffix) >= 3:
+            return word[:-len(suffix)]
+    return word
+
+
+def tokenize(text: str) -> List[str]:
+    return [
+        _stem(word) for word in TOKEN_PATTERN.findall((text or '').lower())
+        if word not in STOP_WORDS and (len(word) > 1 or word.isdigit())
+    ]
+
+
+class IPCRetriever:
+    """Okapi BM25 index over the IPC catalog"""
+
+    # Field weights, applied by repeating the field's terms in the document
+    FIELD_WEIGHTS = (('title', 3), ('keywords', 2), ('description', 1))
+    K1 = 1.5
+    B = 0.75
+
+    def __init__(self, catalog: IPCCatalog = ipc_catalog):
+        retrieval_settings = dict(DEFAULT_RETRIEVAL_SETTINGS)
+        retrieval_settings.update(getattr(settings, 'IPC_RETRIEVAL_SETTINGS', {}))
+        self.enabled = retrieval_settings['ENABLED']
+        self.top_k = retrieval_settings['TOP_K']
+        self.excerpt_chars = retrieval_settings['EXCERPT_CHARS']
+
+        self.catalog = catalog
+        self._index: Optional[Dict[str, Any]] = None
+        self._lock = threading.Lock()
+        self.build_ms = None
+
+    @property
+    def index(self) -> Dict[str, Any]:
+        if self._index is None:
+            with self._lock:
+                if self._index is None:
+                    self._index = self._build()
+        return self._index
+
+    def _build(self) -> Dict[str, Any]:
+        start_time = time.perf_counter()
+        sections = self.catalog.all()
+
+        # term -> list of (document, term frequency)
+        postings: Dict[str, List[Tuple[int, int]]] = {}
+        lengths = []
+        for document, section in enumerate(sections):
+            tokens = [section['section_number'].lower()]
+            for field, weight in self.FIELD_WEIGHTS:
+                value = section.get(field) or ''
+                if isinstance(value, list):
+                    value = ' '.join(value)
+                tokens.extend(tokenize(value) * weight)
+            lengths.append(len(tokens))
+            for term, frequency in Counter(tokens).items():
+                postings.setdefault(term, []).append((document, frequency))
+
+        count = len(sections)
+        average_length = sum(lengths) / count if count else 0.0
+        idf = {
+            term: math.log(1 + (count - len(documents) + 0.5) / (len(documents) + 0.5))
+            for term, documents in postings.items()
+        }
+
+        self.build_ms = round((time.perf_counter() - start_time) * 1000, 2)
+        logger.info(f"Built IPC retrieval index over {count} sections ({len(postings)} terms) in {self.build_ms}ms")
+        return {
+            'sections': sections,
+            'postings': postings,
+            'idf': idf,
+            'lengths': lengths,
+            'average_length': average_length,
+        }
+
+    def search(self, query: str, top_k: Optional[int] = None) -> List[Tuple[Dict[str, Any], float]]:
+        """Return up to top_k (section, score) pairs, best first"""
+        index = self.index
+        if not index['sections']:
+            return []
+
+        scores: Dict[int, float] = {}
+        for term, query_frequency in Counter(self._expand(query)).items():
+            documents = index['postings'].get(term)
+            if not documents:
+                continue
+            idf = index['idf'][term]
+            for document, frequency in documents:
+                length_norm = self.K1 * (1 - self.B + self.B * index['lengths'][document] / index['average_length'])
+                scores[document] = scores.get(document, 0.0) + (
+                    idf * frequency * (self.K1 + 1) / (frequency + length_norm)
+                ) * query_frequency
+
+        best = sorted(scores.items(), key=lambda item: -item[1])[:top_k or self.top_k]
+        return [(index['sections'][document], round(score, 3)) for document, score in best]
+
+    @staticmethod
+    def _expand(query: str) -> List[str]:
+        """Query terms plus the corpus terms for any everyday words in it"""
+        expansions = []
+        for word in TOKEN_PATTERN.findall((query or '').lower()):
+            expansion = QUERY_EXPANSIONS.get(word) or QUERY_EXPANSIONS.get(_stem(word))
+            if expansion:
+                expansions.append(expansion)
+        return tokenize(query) + tokenize(' '.join(expansions))
+
+    def format_candidates(self, case_description: str) -> str:
+        """
+        Prompt block listing the candidate sections for a case
+
+        Returns an empty string when retrieval is disabled or nothing matched,
+        so prompts stay unchanged in that case.
+        """
+        if not self.enabled:
+            return ''
+        try:
+            matches = self.search(case_description)
+        except Exception as e:
+            logger.warning(f"IPC retrieval failed: {str(e)}")
+            return ''
+        if not matches:
+            return ''
+
+        lines = [
+            "CANDIDATE IPC SECTIONS (retrieved from the IPC text; choose from these where they fit and "
+            "add other sections only if clearly required):"
+        ]
+        for section, _ in matches:
+            line = f"- Section {section['section_number']} ({section['title']}): {self._excerpt(section['description'])}"
+            if section.get('punishment'):
+                line += f" Punishment: {section['punishment']}"
+            lines.append(line)
+        return '\n'.join(lines)
+
+    def _excerpt(self, text: str) -> str:
+        if len(text) <= self.excerpt_chars:
+            return text
+        return text[:self.excerpt_chars].rsplit(' ', 1)[0].rstrip(',;:') + '...'
+
+    def get_info(self) -> Dict[str, Any]:
+        return {
+            'enabled': self.enabled,
+            'top_k': self.top_k,
+            'sections_indexed': len(self._index['sections']) if self._index is not None else None,
+            'build_ms': self.build_ms,
+        }
+
+
+# Global instance shared by the analysis services
+ipc_retriever = IPCRetriever()
@@ -0,0 +1,315 @@
+"""
+Extraction of JSON objects from LLM output.
+
+Models wrap their JSON in prose or Markdown code fences often enough that
+``json.loads`` on the raw text is not sufficient. ``extract_json_object``
+finds the embedded object with a single string-aware brace-matching pass, so
+its cost stays linear in the length of the output no matter how many stray
+braces or quotes it contains. Text json cannot parse, including objects
+nested too deeply for the recursive decoder, counts as no object.
+"""
+import json
+import re
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+FENCE = '```'
+
+# Single-character classes, so each search is a linear scan without backtracking
+STRUCTURAL_PATTERN = re.compile(r'[{}\[\]"]')
+STRING_END_PATTERN = re.compile(r'["\\]')
+REPAIR_PATTERN = re.compile(r'[{}\[\]",]')
+
+# Arrays holding one IPC section per entry
+SECTION_ARRAY_KEYS = ('sections_applied', 'applicable_ipc_sections', 'defensive_ipc_sections', 'ipc_sections')
+
+# Free-text members worth keeping when the response was cut off inside them.
+# Any other value left incomplete (an enum such as "severity", a number) is
+# dropped so the caller's default applies instead of a truncated value.
+FREE_TEXT_KEYS = (
+    'explanation', 'simple_summary', 'detailed_summary', 'legal_implications', 'action_required',
+)
+
+CLOSERS = {'{': '}', '[': ']'}
+# Cut points tried, newest first, before giving up on a truncated object
+MAX_REPAIR_ATTEMPTS = 20
+
+
+def has_key(key: str) -> Callable[[Dict[str, Any]], bool]:
+    """
+    Predicate accepting the objects that have ``key``
+
+    Passing e.g. ``has_key('sections_applied')`` rules out the section
+    entries nested inside a truncated response.
+    """
+    return lambda parsed: key in parsed
+
+
+def extract_json_object(text: str, predicate: Optional[Callable[[Dict[str, Any]], bool]] = None
+                        ) -> Optional[Dict[str, Any]]:
+    """
+    Return the first JSON object in ``text`` accepted by ``predicate``
+
+    Objects inside fenced code blocks are preferred over objects in the
+    surrounding prose. Returns None when no acceptable object is found.
+    """
+    if not text:
+        return None
+
+    # Fast path: the whole response is the JSON object
+    stripped = text.strip()
+    if stripped.startswith('{'):
+        try:
+            parsed = json.loads(stripped)
+        except (ValueError, RecursionError):
+            pass
+        else:
+            if isinstance(parsed, dict) and (predicate is None or predicate(parsed)):
+                return parsed
+
+    for parsed in iter_json_objects(text):
+        if predicate is None or predicate(parsed):
+            return parsed
+    return None
+
+
+def iter_json_objects(text: str) -> Iterator[Dict[str, Any]]:
+    """Yield the top-level JSON objects in ``text``, fenced code blocks first"""
+    blocks = _fenced_blocks(text)
+    for start, end in blocks:
+        yield from _iter_objects(text, start, end)
+    if blocks:
+        # Prose outside the fences, in order
+        previous_end = 0
+        for start, end in blocks:
+            yield from _iter_objects(text, previous_end, start)
+            previous_end = end
+        yield from _iter_objects(text, previous_end, len(text))
+    else:
+        yield from _iter_objects(text, 0, len(text))
+
+
+def _iter_objects(text: str, start: int, end: int) -> Iterator[Dict[str, Any]]:
+    spans, _ = scan_objects(text, start, end)
+    for span_start, span_end in spans:
+        try:
+            parsed = json.loads(text[span_start:span_end])
+        except (ValueError, RecursionError):
+            continue
+        if isinstance(parsed, dict):
+            yield parsed
+
+
+def scan_objects(text: str, start: int = 0, end: Optional[int] = None
+                 ) -> Tuple[List[Tuple[int, int]], Optional[int]]:
+    """
+    Find the outermost balanced ``{...}`` spans between ``start`` and ``end``
+
+    Quotes are only tracked inside brackets, so apostrophes and quotes in the
+    surrounding prose don't throw the matching off. An opening brace that is
+    never closed (a stray one in the prose, or a truncated response) does not
+    hide the complete objects after it. Returns the list of ``(start, end)``
+    spans and the start of the outermost unclosed object (None if there is none).
+    """
+    end = len(text) if end is None else end
+    spans = []
+    # (bracket, index) of the open brackets
+    stack = []
+    in_string = False
+
+    find = text.find
+    next_structural = STRUCTURAL_PATTERN.search
+    next_string_end = STRING_END_PATTERN.search
+    index = start
+    while index < end:
+        if not stack:
+            # Skip prose straight to the next opening brace
+            index = find('{', index, end)
+            if index == -1:
+                break
+            stack.append(('{', index))
+            index += 1
+            continue
+
+        if in_string:
+            match = next_string_end(text, index, end)
+            if match is None:
+                break
+            if match.group() == '\\':
+                # Skip the escaped character
+                index = match.end() + 1
+            else:
+                in_string = False
+                index = match.end()
+            continue
+
+        match = next_structural(text, index, end)
+        if match is None:
+            break
+        char = match.group()
+        index = match.start()
+        if char == '"':
+            in_string = True
+        elif char == '{' or char == '[':
+            stack.append((char, index))
+        else:
+            bracket, object_start = stack.pop()
+            if bracket == '{' and char == '}':
+                # Spans nested in this object are superseded by it
+                while spans and spans[-1][0] > object_start:
+                    spans.pop()
+                spans.append((object_start, index + 1))
+        index += 1
+
+    unclosed_start = next((position for bracket, position in stack if bracket == '{'), None)
+    return spans, unclosed_start
+
+
+def _fenced_blocks(text: str) -> List[Tuple[int, int]]:
+    """Return the ``(start, end)`` content ranges of Markdown code fences"""
+    blocks = []
+    position = 0
+    while True:
+        opening = text.find(FENCE, position)
+        if opening == -1:
+            break
+        # Skip the language tag ("```json") up to the end of the line
+        content_start = text.find('\n', opening + len(FENCE))
+        if content_start == -1:
+            break
+        closing = text.find(FENCE, content_start)
+        if closing == -1:
+            # Unterminated fence, e.g. a truncated response
+            blocks.append((content_start + 1, len(text)))
+            break
+        blocks.append((content_start + 1, closing))
+        position = closing + len(FENCE)
+    return blocks
+
+
+def repair_truncated_json(text: str, predicate: Optional[Callable[[Dict[str, Any]], bool]] = None
+                          ) -> Optional[Dict[str, Any]]:
+    """
+    Salvage the object a response was cut off in (num_predict / maxOutputTokens)
+
+    The text is cut back to the last point where a value was complete and the
+    open arrays and objects are closed. A free-text string left open outside
+    any array (a top-level "explanation", see FREE_TEXT_KEYS) is closed rather
+    than dropped; an entry of an array is only kept if it was complete, and an
+    array cut off before its first complete entry is closed empty. Entries of
+    the section arrays without a section number are dropped. The result is
+    flagged ``partial``.
+    Returns None when nothing usable can be recovered.
+    """
+    if not text:
+        return None
+
+    for start, end in _fenced_blocks(text) + [(0, len(text))]:
+        _, unclosed_start = scan_objects(text, start, end)
+        if unclosed_start is None:
+            continue
+
+        repaired = _close_truncated_object(text[unclosed_start:end].rstrip().rstrip('`').rstrip())
+        if repaired is not None and (predicate is None or predicate(repaired)):
+            for key in SECTION_ARRAY_KEYS:
+                if isinstance(repaired.get(key), list):
+                    repaired[key] = [
+                        entry for entry in repaired[key]
+                        if isinstance(entry, dict) and entry.get('section_number')
+                    ]
+            repaired['partial'] = True
+            return repaired
+    return None
+
+
+def _close_truncated_object(fragment: str) -> Optional[Dict[str, Any]]:
+    """Close an object truncated at the end of ``fragment``"""
+    stack = []
+    # (cut index, open brackets at that point)
+    cut_points = []
+    in_string = False
+    string_start = 0
+
+    next_structural = REPAIR_PATTERN.search
+    next_string_end = STRING_END_PATTERN.search
+    index = 0
+    end = len(fragment)
+    while index < end:
+        if in_string:
+            match = next_string_end(fragment, index)
+            if match is None:
+                break
+            if match.group() == '\\':
+                index = match.end() + 1
+            else:
+                in_string = False
+                index = match.end()
+            continue
+
+        match = next_structural(fragment, index)
+        if match is None:
+            break
+        char = match.group()
+        index = match.start()
+        if char == '"':
+            in_string = True
+            string_start = index
+        elif char == ',':
+            # Everything before the comma is a complete member or element
+            _add_cut_point(cut_points, index, stack)
+        elif char in CLOSERS:
+            outermost_array = char == '[' and '[' not in stack
+            stack.append(char)
+            if outermost_array:
+                # Closes as an empty array if no entry was completed
+                _add_cut_point(cut_points, index + 1, stack)
+        else:
+            stack.pop()
+            if not stack:
+                # The object was complete after all
+                break
+            _add_cut_point(cut_points, index + 1, stack)
+        index += 1
+
+    candidates = []
+    if stack and '[' not in stack:
+        if in_string:
+            # Outside arrays a cut-off free-text value is worth keeping
+            if _member_key(fragment, string_start) in FREE_TEXT_KEYS:
+                # Drop a trailing escape that lost its character
+                trailing_backslashes = len(fragment) - len(fragment.rstrip('\\'))
+                closed = fragment[:end - 1] if trailing_backslashes % 2 else fragment
+                candidates.append(closed + '"' + ''.join(CLOSERS[b] for b in reversed(stack)))
+        elif fragment.endswith('"'):
+            # The last value is a complete string; a number or literal may have been cut short
+            candidates.append(fragment + ''.join(CLOSERS[b] for b in reversed(stack)))
+    for cut, open_brackets in reversed(cut_points[-MAX_REPAIR_ATTEMPTS:]):
+        candidates.append(fragment[:cut] + ''.join(CLOSERS[b] for b in reversed(open_brackets)))
+
+    for candidate in candidates:
+        try:
+            parsed = json.loads(candidate)
+        except (ValueError, RecursionError):
+            continue
+        if isinstance(parsed, dict):
+            return parsed
+    return None
+
+
+def _member_key(fragment: str, string_start: int) -> Optional[str]:
+    """Key of the member whose string value starts at ``string_start``, None for keys"""
+    before = fragment[:string_start].rstrip()
+    if not before.endswith(':'):
+        return None
+    before = before[:-1].rstrip()
+    if not before.endswith('"'):
+        return None
+    key_start = before.rfind('"', 0, len(before) - 1)
+    return before[key_start + 1:-1] if key_start != -1 else None
+
+
+def _add_cut_point(cut_points: List[Tuple[int, str]], index: int, stack: List[str]):
+    """Record a cut point unless it would leave a partial array entry behind"""
+    open_brackets = ''.join(stack)
+    first_array = open_brackets.find('[')
+    if first_array == -1 or '{' not in open_brackets[first_array:]:
+        cut_points.append((index, open_brackets))
@@ -0,0 +1,422 @@
+"""
+Local, CPU-only IPC section classifier used as a fast first tier.
+
+A TF-IDF + one-vs-rest logistic regression model, written in plain NumPy,
+trained by ``manage.py train_ipc_classifier`` on the stored LLM analyses
+(LegalAnalysis.analysis_json and CaseLead.ipc_sections_identified). A
+prediction is a sparse dot product over the words of the description and
+takes well under a millisecond. Depending on LOCAL_CLASSIFIER_SETTINGS['MODE'],
+AdaptiveAnalysisService shows it as a preliminary answer while the LLM
+works, or serves it as the full answer when it is confident enough.
+"""
+import json
+import logging
+import math
+import os
+import re
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+import numpy as np
+from django.conf import settings
+from django.utils import timezone
+
+from .analysis_cache import AnalysisCache
+from .ipc_catalog import IPCCatalog, ipc_catalog
+
+logger = logging.getLogger(__name__)
+
+
+TOKEN_PATTERN = re.compile(r'[a-z0-9]+')
+STOP_WORDS = frozenset(
+    'a an and are as at be been but by for from had has have he her his i in is it its me my of on or our '
+    'she so that the their them then there they this to was we were what when which who will with you your'.split()
+)
+
+# Section numbers that mark failed analyses rather than real sections
+INVALID_SECTION_NUMBERS = frozenset({'', 'UNKNOWN', 'ERROR', 'N/A', 'NONE'})
+# analysis_method values whose sections should not be learned from
+EXCLUDED_ANALYSIS_METHODS = frozenset({'fallback', 'error', 'local_classifier'})
+
+DEFAULT_CLASSIFIER_SETTINGS = {
+    'MODE': 'off',
+    'MODEL_PATH': None,
+    'THRESHOLD': 0.5,
+    'FULL_ANSWER_CONFIDENCE': 0.9,
+    'MAX_SECTIONS': 5,
+}
+
+
+def tokenize(text: str) -> List[str]:
+    """Lower-cased words without stop words, plus adjacent word pairs"""
+    words = [
+        word for word in TOKEN_PATTERN.findall(AnalysisCache.normalize_description(text))
+        if len(word) > 1 and word not in STOP_WORDS
+    ]
+    return words + [f"{first} {second}" for first, second in zip(words, words[1:])]
+
+
+class IPCClassifierModel:
+    """Trained vocabulary, IDF weights and per-section logistic regression weights"""
+
+    def __init__(self, vocabulary: Sequence[str], idf: np.ndarray, weights: np.ndarray,
+                 bias: np.ndarray, labels: Sequence[str], metadata: Optional[Dict[str, Any]] = None):
+        self.terms = list(vocabulary)
+        self.vocabulary = {term: index for index, term in enumerate(self.terms)}
+        self.idf = idf.astype(np.float32)
+        self.weights = weights.astype(np.float32)
+        self.bias = bias.astype(np.float32)
+        self.labels = list(labels)
+        self.metadata = metadata or {}
+
+    def featurize(self, text: str) -> Tuple[np.ndarray, np.ndarray]:
+        """Sparse, L2-normalized TF-IDF vector of a text as (indices, values)"""
+        return _tfidf_vector(tokenize(text), self.vocabulary, self.idf)
+
+    def predict_proba(self, text: str) -> np.ndarray:
+        """Probability of each label applying to the text"""
+        indices, values = self.featurize(text)
+        scores = self.bias + values @ self.weights[indices]
+        return _sigmoid(scores)
+
+    def save(self, path: str):
+        """Write the model atomically, so running workers never read a partial file"""
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        temporary_path = f"{path}.tmp.npz"
+        np.savez_compressed(
+            temporary_path,
+            vocabulary=np.array(self.terms),
+            idf=self.idf,
+            weights=self.weights,
+            bias=self.bias,
+            labels=np.array(self.labels),
+            metadata=np.array(json.dumps(self.metadata)),
+        )
+        os.replace(temporary_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> 'IPCClassifierModel':
+        with np.load(path, allow_pickle=False) as data:
+            return cls(
+                vocabulary=data['vocabulary'].tolist(),
+                idf=data['idf'],
+                weights=data['weights'],
+                bias=data['bias'],
+                labels=data['labels'].tolist(),
+                metadata=json.loads(str(data['metadata'])),
+            )
+
+
+def _tfidf_vector(tokens: List[str], vocabulary: Dict[str, int], idf: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    counts: Dict[int, int] = {}
+    for token in tokens:
+        index = vocabulary.get(token)
+        if index is not None:
+            counts[index] = counts.get(index, 0) + 1
+
+    indices = np.fromiter(counts.keys(), dtype=np.int64, count=len(counts))
+    # Sublinear term frequency
+    values = (1.0 + np.log(np.fromiter(counts.values(), dtype=np.float32, count=len(counts)))) * idf[indices]
+    norm = np.linalg.norm(values)
+    if norm > 0:
+        values /= norm
+    return indices, values.astype(np.float32)
+
+
+def _sigmoid(scores: np.ndarray) -> np.ndarray:
+    return 1.0 / (1.0 + np.exp(-np.clip(scores, -30, 30)))
+
+
+def train_classifier(texts: Sequence[str], label_sets: Sequence[Set[str]], min_df: int = 2,
+                     max_features: int = 20000, min_label_count: int = 3, epochs: int = 30,
+                     learning_rate: float = 0.05, l2: float = 1e-4, batch_size: int = 256,
+                     seed: int = 0) -> IPCClassifierModel:
+    """
+    Fit TF-IDF features and a one-vs-rest logistic regression with Adam
+
+    Sections seen fewer than ``min_label_count`` times are not learned.
+    Mini-batches are densified one at a time, so memory stays at
+    ``batch_size x vocabulary`` regardless of the number of examples.
+    """
+    tokenized = [tokenize(text) for text in texts]
+
+    document_frequency: Dict[str, int] = {}
+    for tokens in tokenized:
+        for token in set(tokens):
+            document_frequency[token] = document_frequency.get(token, 0) + 1
+    terms = sorted(
+        (term for term, count in document_frequency.items() if count >= min_df),
+        key=lambda term: (-document_frequency[term], term)
+    )[:max_features]
+    vocabulary = {term: index for index, term in enumerate(terms)}
+    idf = np.array([
+        math.log((1 + len(tokenized)) / (1 + document_frequency[term])) + 1 for term in terms
+    ], dtype=np.float32)
+
+    label_counts: Dict[str, int] = {}
+    for label_set in label_sets:
+        for label in label_set:
+            label_counts[label] = label_counts.get(label, 0) + 1
+    labels = sorted(label for label, count in label_counts.items() if count >= min_label_count)
+    label_index = {label: index for index, label in enumerate(labels)}
+
+    if not terms or not labels:
+        raise ValueError("Not enough training data: no term or section occurs often enough")
+
+    features = [_tfidf_vector(tokens, vocabulary, idf) for tokens in tokenized]
+    targets = np.zeros((len(texts), len(labels)), dtype=np.float32)
+    for row, label_set in enumerate(label_sets):
+        for label in label_set:
+            if label in label_index:
+                targets[row, label_index[label]] = 1.0
+
+    weights = np.zeros((len(terms), len(labels)), dtype=np.float32)
+    # Start every section at its base rate
+    prior = np.clip(targets.mean(axis=0), 1e-4, 1 - 1e-4)
+    bias = np.log(prior / (1 - prior)).astype(np.float32)
+
+    # Adam moments
+    weights_m, weights_v = np.zeros_like(weights), np.zeros_like(weights)
+    bias_m, bias_v = np.zeros_like(bias), np.zeros_like(bias)
+    beta1, beta2, epsilon = 0.9, 0.999, 1e-8
+    step = 0
+
+    rng = np.random.default_rng(seed)
+    batch = np.zeros((min(batch_size, len(features)), len(terms)), dtype=np.float32)
+    for _ in range(epochs):
+        order = rng.permutation(len(features))
+        for start in range(0, len(order), batch_size):
+            rows = order[start:start + batch_size]
+            inputs = batch[:len(rows)]
+            inputs.fill(0)
+            for position, row in enumerate(rows):
+                indices, values = features[row]
+                inputs[position, indices] = values
+
+            errors = (_sigmoid(inputs @ weights + bias) - targets[rows]) / len(rows)
+            weights_gradient = inputs.T @ errors + l2 * weights
+            bias_gradient = errors.sum(axis=0)
+
+            step += 1
+            correction1 = 1 - beta1 ** step
+            correction2 = 1 - beta2 ** step
+            for parameter, gradient, m, v in (
+                (weights, weights_gradient, weights_m, weights_v),
+                (bias, bias_gradient, bias_m, bias_v),
+            ):
+                m *= beta1
+                m += (1 - beta1) * gradient
+                v *= beta2
+                v += (1 - beta2) * gradient * gradient
+                parameter -= learning_rate * (m / correction1) / (np.sqrt(v / correction2) + epsilon)
+
+    return IPCClassifierModel(terms, idf, weights, bias, labels, {
+        'trained_at': timezone.now().isoformat(),
+        'examples': len(texts),
+        'vocabulary_size': len(terms),
+        'sections': len(labels),
+    })
+
+
+def select_sections(probabilities: np.ndarray, labels: Sequence[str], threshold: float,
+                    max_sections: int) -> Tuple[List[Tuple[str, float]], float]:
+    """
+    Pick the sections at or above ``threshold`` and score the whole prediction
+
+    The confidence is the certainty of the least certain decision: the lowest
+    probability among the chosen sections, or one minus the highest among the
+    rest, whichever is smaller. It is 0 when no section was chosen.
+    """
+    order = np.argsort(-probabilities)
+    chosen = [index for index in order[:max_sections] if probabilities[index] >= threshold]
+    if not chosen:
+        return [], 0.0
+
+    rejected = np.delete(probabilities, chosen)
+    confidence = min(
+        float(probabilities[chosen].min()),
+        1.0 - float(rejected.max()) if rejected.size else 1.0
+    )
+    return [(labels[index], float(probabilities[index])) for index in chosen], confidence
+
+
+def evaluate(model: IPCClassifierModel, texts: Sequence[str], label_sets: Sequence[Set[str]],
+             threshold: float, max_sections: int, full_answer_confidence: float) -> Dict[str, Any]:
+    """Micro precision/recall/F1 on held-out examples, and how the confident answers fare"""
+    true_positives = predicted = actual = 0
+    confident = confident_exact = 0
+    for text, label_set in zip(texts, label_sets):
+        sections, confidence = select_sections(model.predict_proba(text), model.labels, threshold, max_sections)
+        chosen = {section for section, _ in sections}
+        true_positives += len(chosen & label_set)
+        predicted += len(chosen)
+        actual += len(label_set)
+        if chosen and confidence >= full_answer_confidence:
+            confident += 1
+            confident_exact += chosen == label_set
+
+    precision = true_positives / predicted if predicted else 0.0
+    recall = true_positives / actual if actual else 0.0
+    return {
+        'examples': len(texts),
+        'precision': round(precision, 4),
+        'recall': round(recall, 4),
+        'f1': round(2 * precision * recall / (precision + recall), 4) if precision + recall else 0.0,
+        'full_answer_coverage': round(confident / len(texts), 4) if texts else 0.0,
+        'full_answer_exact_match': round(confident_exact / confident, 4) if confident else 0.0,
+    }
+
+
+def collect_training_examples() -> Tuple[List[str], List[Set[str]]]:
+    """Case descriptions and their IPC sections from stored analyses and case leads"""
+    from leads.models import CaseLead
+    from .models import LegalAnalysis
+
+    examples: Dict[str, Tuple[str, Set[str]]] = {}
+
+    def add(description: str, section_numbers: Iterable[Any]):
+        sections = {IPCCatalog.normalize_section_number(number) for number in section_numbers}
+        sections -= INVALID_SECTION_NUMBERS
+        if description and description.strip() and sections:
+            # Repeated descriptions count once, with the sections of the latest analysis
+            key = AnalysisCache.normalize_description(description)
+            examples.setdefault(key, (description, sections))
+
+    analyses = LegalAnalysis.objects.select_related('legal_case').only(
+        'analysis_json', 'legal_case__case_description'
+    ).order_by('-analyzed_at')
+    for analysis in analyses.iterator(chunk_size=500):
+        analysis_json = analysis.analysis_json or {}
+        if analysis_json.get('analysis_method') in EXCLUDED_ANALYSIS_METHODS or analysis_json.get('partial'):
+            continue
+        add(analysis.legal_case.case_description, (
+            section.get('section_number') for section in analysis_json.get('sections_applied', [])
+            if isinstance(section, dict)
+        ))
+
+    leads = CaseLead.objects.only('case_description', 'ipc_sections_identified').order_by('-created_at')
+    for lead in leads.iterator(chunk_size=500):
+        if isinstance(lead.ipc_sections_identified, list):
+            add(lead.case_description, lead.ipc_sections_identified)
+
+    texts = [description for description, _ in examples.values()]
+    label_sets = [sections for _, sections in examples.values()]
+    return texts, label_sets
+
+
+class LocalIPCClassifier:
+    """Serves predictions from the trained model, reloading it when the file is replaced"""
+
+    # Seconds between checks of the model file for a newer version
+    RELOAD_CHECK_INTERVAL = 30
+
+    def __init__(self):
+        classifier_settings = dict(DEFAULT_CLASSIFIER_SETTINGS)
+        classifier_settings.update(getattr(settings, 'LOCAL_CLASSIFIER_SETTINGS', {}))
+        self.mode = classifier_settings['MODE']
+        self.model_path = classifier_settings['MODEL_PATH']
+        self.threshold = classifier_settings['THRESHOLD']
+        self.full_answer_confidence = classifier_settings['FULL_ANSWER_CONFIDENCE']
+        self.max_sections = classifier_settings['MAX_SECTIONS']
+
+        self._model: Optional[IPCClassifierModel] = None
+        self._model_mtime = None
+        self._next_check = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.mode in ('preliminary', 'full') and bool(self.model_path)
+
+    def get_model(self) -> Optional[IPCClassifierModel]:
+        """The current model, or None when none has been trained yet"""
+        now = time.monotonic()
+        if now < self._next_check:
+            return self._model
+
+        with self._lock:
+            if now < self._next_check:
+                return self._model
+            self._next_check = now + self.RELOAD_CHECK_INTERVAL
+            try:
+                mtime = os.path.getmtime(self.model_path)
+            except OSError:
+                return self._model
+
+            if mtime != self._model_mtime:
+                try:
+                    self._model = IPCClassifierModel.load(self.model_path)
+                    self._model_mtime = mtime
+                    logger.info(
+                        f"Loaded local IPC classifier ({len(self._model.labels)} sections, "
+                        f"trained {self._model.metadata.get('trained_at')})"
+                    )
+                except Exception as e:
+                    logger.warning(f"Could not load local IPC classifier from {self.model_path}: {str(e)}")
+            return self._model
+
+    def classify(self, case_description: str) -> Optional[Dict[str, Any]]:
+        """
+        Predict the IPC sections of a case description
+
+        Returns None when the classifier is disabled or not trained, otherwise
+        the chosen sections with their probabilities, the confidence of the
+        prediction and whether it is confident enough to be the full answer.
+        """
+        if not self.enabled:
+            return None
+        model = self.get_model()
+        if model is None:
+            return None
+
+        start_time = time.perf_counter()
+        sections, confidence = select_sections(
+            model.predict_proba(case_description), model.labels, self.threshold, self.max_sections
+        )
+        return {
+            'sections': [
+                {'section_number': section, 'probability': round(probability, 4)}
+                for section, probability in sections
+            ],
+            'confidence': round(confidence, 4),
+            'full_answer': (
+                self.mode == 'full' and bool(sections) and confidence >= self.full_answer_confidence
+            ),
+            'elapsed_ms': round((time.perf_counter() - start_time) * 1000, 3),
+        }
+
+    def build_analysis(self, classification: Dict[str, Any]) -> Dict[str, Any]:
+        """Turn a classification into the sections_applied/explanation analysis format"""
+        sections_applied = []
+        for section in classification['sections']:
+            details = ipc_catalog.get(section['section_number']) or {}
+            sections_applied.append({
+                'section_number': section['section_number'],
+                'description': details.get('title') or details.get('description', ''),
+                'reason': f"Matched cases previously analyzed under this section (probability {section['probability']:.2f})",
+            })
+
+        return {
+            'sections_applied': sections_applied,
+            'explanation': (
+                "Sections suggested by the local classifier trained on earlier analyses. "
+                "Consult a lawyer before relying on them."
+            ),
+            'analysis_method': 'local_classifier',
+            'confidence_level': 'high' if classification['full_answer'] else 'preliminary',
+            'confidence': classification['confidence'],
+        }
+
+    def get_info(self) -> Dict[str, Any]:
+        model = self.get_model() if self.enabled else None
+        return {
+            'mode': self.mode,
+            'model_loaded': model is not None,
+            'full_answer_confidence': self.full_answer_confidence,
+            'model': model.metadata if model is not None else None,
+        }
+
+
+# Global instance shared by the analysis services
+local_ipc_classifier = LocalIPCClassifier()
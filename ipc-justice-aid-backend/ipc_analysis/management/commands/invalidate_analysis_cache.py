@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+
+from ipc_analysis.analysis_cache import analysis_cache
+
+
+class Command(BaseCommand):
+    help = 'Invalidate cached LLM analyses, e.g. after retraining or replacing a model'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'providers',
+            nargs='*',
+            help='Providers to invalidate (gemini, ollama, ollama_ipc). Defaults to all known providers.'
+        )
+
+    def handle(self, *args, **options):
+        providers = options['providers'] or list(analysis_cache.get_stats()['providers'])
+
+        if not providers:
+            self.stdout.write('No cached providers found')
+            return
+
+        for provider in providers:
+            analysis_cache.invalidate(provider)
+            self.stdout.write(self.style.SUCCESS(f'Invalidated analysis cache for {provider}'))
+
+        for provider, stats in analysis_cache.get_stats()['providers'].items():
+            self.stdout.write(
+                f"{provider}: hits={stats['hits']} misses={stats['misses']} "
+                f"hit_rate={stats['hit_rate']} saved_ms={stats['saved_ms']}"
+            )
@@ -0,0 +1,70 @@
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+
+from ipc_analysis.local_classifier import (
+    collect_training_examples, evaluate, local_ipc_classifier, train_classifier
+)
+
+
+class Command(BaseCommand):
+    help = 'Train the local IPC section classifier on stored analyses and case leads'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', help='Where to write the model (defaults to LOCAL_CLASSIFIER_MODEL_PATH)')
+        parser.add_argument('--holdout', type=float, default=0.1,
+                            help='Fraction of examples held out for evaluation (0 to skip)')
+        parser.add_argument('--min-examples', type=int, default=50,
+                            help='Refuse to train on fewer examples than this')
+        parser.add_argument('--min-label-count', type=int, default=3,
+                            help='Ignore sections seen fewer times than this')
+        parser.add_argument('--max-features', type=int, default=20000)
+        parser.add_argument('--epochs', type=int, default=30)
+
+    def handle(self, *args, **options):
+        output = options['output'] or local_ipc_classifier.model_path
+        if not output:
+            raise CommandError('No output path: pass --output or set LOCAL_CLASSIFIER_MODEL_PATH')
+
+        texts, label_sets = collect_training_examples()
+        self.stdout.write(f'Collected {len(texts)} labelled case descriptions')
+        if len(texts) < options['min_examples']:
+            raise CommandError(f"Need at least {options['min_examples']} examples to train")
+
+        training_options = {
+            'min_label_count': options['min_label_count'],
+            'max_features': options['max_features'],
+            'epochs': options['epochs'],
+        }
+
+        metrics = None
+        holdout_size = int(len(texts) * options['holdout'])
+        if holdout_size:
+            order = np.random.default_rng(0).permutation(len(texts))
+            held_out, kept = order[:holdout_size], order[holdout_size:]
+            model = train_classifier([texts[i] for i in kept], [label_sets[i] for i in kept], **training_options)
+            metrics = evaluate(
+                model, [texts[i] for i in held_out], [label_sets[i] for i in held_out],
+                local_ipc_classifier.threshold, local_ipc_classifier.max_sections,
+                local_ipc_classifier.full_answer_confidence
+            )
+            self.stdout.write(
+                f"Held-out evaluation on {metrics['examples']} examples: precision={metrics['precision']} "
+                f"recall={metrics['recall']} f1={metrics['f1']} "
+                f"full_answer_coverage={metrics['full_answer_coverage']} "
+                f"full_answer_exact_match={metrics['full_answer_exact_match']}"
+            )
+
+        # The saved model is trained on every example
+        start_time = time.time()
+        model = train_classifier(texts, label_sets, **training_options)
+        model.metadata['training_seconds'] = round(time.time() - start_time, 2)
+        if metrics is not None:
+            model.metadata['evaluation'] = metrics
+        model.save(output)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Saved classifier for {len(model.labels)} sections ({len(model.terms)} terms, "
+            f"{model.metadata['training_seconds']}s) to {output}"
+        ))
@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+
+from ipc_analysis.ollama_warmup import ollama_warmup_service
+
+
+class Command(BaseCommand):
+    help = 'Load the configured Ollama model so the first analysis does not pay for a cold start'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--keep-alive',
+            help='Override OLLAMA_KEEP_ALIVE for this load (e.g. 1h, or -1 to keep it loaded)'
+        )
+
+    def handle(self, *args, **options):
+        if not ollama_warmup_service.enabled:
+            self.stdout.write('Ollama warm-up disabled (OLLAMA_WARMUP_ENABLED=False)')
+            return
+
+        self.stdout.write(f'Loading Ollama model {ollama_warmup_service.model_name}...')
+        result = ollama_warmup_service.warm_up(keep_alive=options['keep_alive'])
+
+        if not result['success']:
+            self.stderr.write(self.style.WARNING(f"Ollama warm-up failed: {result['error']}"))
+            return
+
+        state = 'cold load' if result['cold_load'] else 'already loaded'
+        self.stdout.write(self.style.SUCCESS(
+            f"Ollama model ready ({state}, load {result['load_duration_ms']}ms, "
+            f"total {result['total_ms']}ms, keep_alive {result['keep_alive']})"
+        ))
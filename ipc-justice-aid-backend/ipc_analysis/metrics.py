@@ -0,0 +1,248 @@
+"""
+Prometheus metrics for the LLM provider layer.
+
+Records queue wait, time to first byte, latency, prompt/output tokens and
+tokens per second for every provider call, plus retry and fallback counters
+and the OCR pool's queue depth and per-job CPU time, and renders them for the
+``/metrics`` endpoint.
+
+prometheus_client is optional: without it every metric is a no-op and the
+endpoint answers 503. When several worker processes serve the app, point
+PROMETHEUS_MULTIPROC_DIR at a shared, empty directory so the endpoint
+aggregates all of them.
+"""
+import os
+import time
+from typing import Any, Dict, Optional, Tuple
+
+try:
+    from prometheus_client import (
+        CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge, Histogram, generate_latest
+    )
+    from prometheus_client import multiprocess
+    PROMETHEUS_AVAILABLE = True
+except ImportError:
+    PROMETHEUS_AVAILABLE = False
+
+
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120, 300)
+TOKEN_BUCKETS = (16, 32, 64, 128, 256, 512, 1024, 2048, 4096, 8192)
+TOKENS_PER_SECOND_BUCKETS = (1, 2, 5, 10, 20, 40, 80, 160, 320)
+
+
+class _NoopMetric:
+    """Stands in for a metric when prometheus_client is not installed"""
+
+    def labels(self, *args, **kwargs):
+        return self
+
+    def observe(self, value):
+        pass
+
+    def inc(self, amount=1):
+        pass
+
+    def set(self, value):
+        pass
+
+
+def _histogram(name, documentation, labels, buckets):
+    if not PROMETHEUS_AVAILABLE:
+        return _NoopMetric()
+    return Histogram(name, documentation, labels, buckets=buckets)
+
+
+def _counter(name, documentation, labels):
+    if not PROMETHEUS_AVAILABLE:
+        return _NoopMetric()
+    return Counter(name, documentation, labels)
+
+
+def _gauge(name, documentation, labels):
+    if not PROMETHEUS_AVAILABLE:
+        return _NoopMetric()
+    # Summed over the live worker processes in multiprocess mode
+    return Gauge(name, documentation, labels, multiprocess_mode='livesum')
+
+
+QUEUE_WAIT = _histogram(
+    'ipc_llm_queue_wait_seconds', 'Time waiting for a concurrency slot or rate quota before a provider call',
+    ['provider', 'stage'], LATENCY_BUCKETS
+)
+TIME_TO_FIRST_BYTE = _histogram(
+    'ipc_llm_time_to_first_byte_seconds', 'Time from sending a provider request to its first response bytes',
+    ['provider'], LATENCY_BUCKETS
+)
+REQUEST_DURATION = _histogram(
+    'ipc_llm_request_duration_seconds', 'Duration of provider requests',
+    ['provider', 'outcome'], LATENCY_BUCKETS
+)
+PROMPT_TOKENS = _histogram(
+    'ipc_llm_prompt_tokens', 'Prompt tokens per provider request', ['provider'], TOKEN_BUCKETS
+)
+OUTPUT_TOKENS = _histogram(
+    'ipc_llm_output_tokens', 'Generated tokens per provider request', ['provider'], TOKEN_BUCKETS
+)
+TOKENS_PER_SECOND = _histogram(
+    'ipc_llm_tokens_per_second', 'Generation speed of provider requests', ['provider'], TOKENS_PER_SECOND_BUCKETS
+)
+RETRIES = _counter(
+    'ipc_llm_retries_total', 'Provider requests retried', ['provider', 'reason']
+)
+FALLBACKS = _counter(
+    'ipc_llm_fallbacks_total', 'Analyses served by a provider other than the primary', ['primary', 'served_by']
+)
+ANALYSIS_DURATION = _histogram(
+    'ipc_analysis_duration_seconds', 'End-to-end duration of case analyses',
+    ['service_used', 'cached'], LATENCY_BUCKETS
+)
+OCR_QUEUE_DEPTH = _gauge(
+    'ipc_ocr_queue_depth', 'OCR jobs submitted to the process pool and not finished', []
+)
+OCR_QUEUE_WAIT = _histogram(
+    'ipc_ocr_queue_wait_seconds', 'Time OCR jobs waited for a free pool process', [], LATENCY_BUCKETS
+)
+OCR_JOB_CPU = _histogram(
+    'ipc_ocr_job_cpu_seconds', 'CPU time of OCR jobs, including tesseract subprocesses', [], LATENCY_BUCKETS
+)
+OCR_JOB_DURATION = _histogram(
+    'ipc_ocr_job_duration_seconds', 'Duration of OCR jobs as seen by the request', ['outcome'], LATENCY_BUCKETS
+)
+
+
+def ollama_usage(result: Dict[str, Any]) -> Dict[str, Any]:
+    """Token counts and generation time from an Ollama /api/generate response"""
+    eval_duration = result.get('eval_duration')
+    return {
+        'prompt_tokens': result.get('prompt_eval_count'),
+        'output_tokens': result.get('eval_count'),
+        'generation_seconds': eval_duration / 1e9 if eval_duration else None,
+    }
+
+
+def gemini_usage(result: Dict[str, Any]) -> Dict[str, Any]:
+    """Token counts from a Gemini response's usageMetadata"""
+    usage = result.get('usageMetadata') or {}
+    return {
+        'prompt_tokens': usage.get('promptTokenCount'),
+        'output_tokens': usage.get('candidatesTokenCount'),
+    }
+
+
+class ProviderCall:
+    """
+    Context manager timing one provider request
+
+    Enter it once the request holds its concurrency slot, so the duration
+    excludes queue wait. Pass the HTTP response to ``received()`` to record
+    the outcome from its status code; otherwise an exception escaping the
+    block is recorded as 'timeout' or 'error'.
+    """
+
+    def __init__(self, provider: str):
+        self.provider = provider
+        self.start_time = None
+        self.duration = None
+        self.first_byte_seconds = None
+        self.response = None
+
+    def __enter__(self):
+        self.start_time = time.time()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.duration = time.time() - self.start_time
+        if self.response is not None and self.response.status_code != 200:
+            outcome = 'rate_limited' if self.response.status_code == 429 else 'http_error'
+        elif exc_type is not None:
+            outcome = 'timeout' if 'timeout' in exc_type.__name__.lower() else 'error'
+        else:
+            outcome = 'success'
+        REQUEST_DURATION.labels(self.provider, outcome).observe(self.duration)
+
+        if outcome == 'success':
+            first_byte_seconds = self.first_byte_seconds
+            if first_byte_seconds is None:
+                first_byte_seconds = self._response_elapsed()
+            if first_byte_seconds is not None:
+                TIME_TO_FIRST_BYTE.labels(self.provider).observe(first_byte_seconds)
+        return False
+
+    def received(self, response):
+        self.response = response
+        return response
+
+    def first_byte(self):
+        """Mark the first chunk of a streamed response"""
+        if self.first_byte_seconds is None:
+            self.first_byte_seconds = time.time() - self.start_time
+
+    def record_usage(self, prompt_tokens: Optional[int] = None, output_tokens: Optional[int] = None,
+                     generation_seconds: Optional[float] = None):
+        """
+        Record token counts once the response has been read
+
+        ``generation_seconds`` is the provider's own generation time when it
+        reports one (Ollama); tokens per second use the request duration otherwise.
+        """
+        if prompt_tokens:
+            PROMPT_TOKENS.labels(self.provider).observe(prompt_tokens)
+        if output_tokens:
+            OUTPUT_TOKENS.labels(self.provider).observe(output_tokens)
+            generation_seconds = generation_seconds or self.duration or (time.time() - self.start_time)
+            if generation_seconds > 0:
+                TOKENS_PER_SECOND.labels(self.provider).observe(output_tokens / generation_seconds)
+
+    def _response_elapsed(self) -> Optional[float]:
+        # requests measures up to the response headers; httpx up to the end of the body
+        try:
+            return self.response.elapsed.total_seconds()
+        except Exception:
+            return None
+
+
+class ProviderMetrics:
+    """Entry point used by the services to record metrics"""
+
+    @property
+    def available(self) -> bool:
+        return PROMETHEUS_AVAILABLE
+
+    def track(self, provider: str) -> ProviderCall:
+        return ProviderCall(provider)
+
+    def observe_queue_wait(self, provider: str, stage: str, seconds: float):
+        QUEUE_WAIT.labels(provider, stage).observe(seconds)
+
+    def count_retry(self, provider: str, reason: str):
+        RETRIES.labels(provider, reason).inc()
+
+    def count_fallback(self, primary: str, served_by: str):
+        FALLBACKS.labels(primary, served_by).inc()
+
+    def observe_analysis(self, service_used: str, seconds: float, cached: bool = False):
+        ANALYSIS_DURATION.labels(service_used or 'unknown', 'true' if cached else 'false').observe(seconds)
+
+    def set_ocr_queue_depth(self, depth: int):
+        OCR_QUEUE_DEPTH.set(depth)
+
+    def observe_ocr_job(self, outcome: str, seconds: float, queue_wait: Optional[float] = None,
+                        cpu_seconds: Optional[float] = None):
+        OCR_JOB_DURATION.labels(outcome).observe(seconds)
+        if queue_wait is not None:
+            OCR_QUEUE_WAIT.observe(queue_wait)
+        if cpu_seconds is not None:
+            OCR_JOB_CPU.observe(cpu_seconds)
+
+    def render(self) -> Tuple[bytes, str]:
+        """Current metrics in the Prometheus text format, with their content type"""
+        if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+            registry = CollectorRegistry()
+            multiprocess.MultiProcessCollector(registry)
+        else:
+            registry = REGISTRY
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+
+
+# Global instance shared by the analysis services
+provider_metrics = ProviderMetrics()
@@ -2,6 +2,7 @@ from django.db import models
 from django.contrib.auth import get_user_model
 from django.conf import settings
 import json
+import uuid
 
 User = get_user_model()
 
@@ -76,3 +77,49 @@ class AnalysisHistory(models.Model):
     
     def __str__(self):
         return f"Analysis by {self.user.email} at {self.request_timestamp}"
+
+
+class BulkAnalysisJob(models.Model):
+    """Model to track a bulk analysis of an uploaded CSV/NDJSON file of cases"""
+    STATUS_CHOICES = [
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('completed', 'Completed'),
+        ('failed', 'Failed'),
+    ]
+    
+    FORMAT_CHOICES = [
+        ('csv', 'CSV'),
+        ('ndjson', 'NDJSON'),
+    ]
+    
+    job_id = models.UUIDField(default=uuid.uuid4, unique=True, editable=False)
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='bulk_analysis_jobs')
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='queued')
+    
+    input_file = models.FileField(upload_to='bulk_analysis/inputs/')
+    input_format = models.CharField(max_length=10, choices=FORMAT_CHOICES)
+    results_file = models.FileField(upload_to='bulk_analysis/results/', blank=True, null=True)
+    
+    # Progress
+    total_cases = models.IntegerField(default=0)
+    processed_cases = models.IntegerField(default=0)
+    succeeded_cases = models.IntegerField(default=0)
+    failed_cases = models.IntegerField(default=0)
+    
+    error_message = models.TextField(blank=True, null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    completed_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        ordering = ['-created_at']
+    
+    def __str__(self):
+        return f"Bulk analysis {self.job_id} ({self.status}) by {self.user.email}"
+    
+    @property
+    def progress_percent(self):
+        if not self.total_cases:
+            return 0
+        return round(self.processed_cases * 100 / self.total_cases, 1)
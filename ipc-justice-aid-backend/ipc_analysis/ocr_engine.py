@@ -0,0 +1,178 @@
+"""
+Tesseract engine behind OCRService.
+
+pytesseract starts a ``tesseract`` process per call, which writes the image to
+a temp file and loads the language model again every time. When tesserocr is
+installed the engine instead keeps a small pool of initialized in-process
+Tesseract handles per worker and reuses them across requests. Both backends
+return the same column dict as ``pytesseract.image_to_data``, and any
+tesserocr failure falls back to pytesseract.
+"""
+import logging
+import queue
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, List
+
+import numpy as np
+import pytesseract
+from django.conf import settings
+
+try:
+    import tesserocr
+    TESSEROCR_AVAILABLE = True
+except ImportError:
+    TESSEROCR_AVAILABLE = False
+    tesserocr = None
+
+logger = logging.getLogger(__name__)
+
+
+DEFAULT_OCR_SETTINGS = {
+    'BACKEND': 'auto',
+    'LANGUAGE': 'eng',
+    'TESSDATA_PATH': '',
+    'ENGINE_POOL_SIZE': 2,
+}
+
+# TSV columns used by OCRService, in the order Tesseract writes them
+TSV_COLUMNS = (
+    'level', 'page_num', 'block_num', 'par_num', 'line_num', 'word_num',
+    'left', 'top', 'width', 'height', 'conf', 'text'
+)
+
+
+def tsv_to_dict(tsv: str) -> Dict[str, List[Any]]:
+    """Parse Tesseract TSV rows (no header) into image_to_data's column dict"""
+    data = {column: [] for column in TSV_COLUMNS}
+    for row in tsv.splitlines():
+        cells = row.split('\t')
+        if len(cells) < len(TSV_COLUMNS) - 1:
+            continue
+        if len(cells) < len(TSV_COLUMNS):
+            cells.append('')
+        for column, cell in zip(TSV_COLUMNS[:-1], cells):
+            data[column].append(int(float(cell)))
+        data['text'].append(cells[-1])
+    return data
+
+
+class OCREngine:
+    """Runs Tesseract recognition, in-process when tesserocr is available"""
+
+    # LSTM engine, single uniform block of text (--oem 3 --psm 6)
+    OEM = 3
+    PSM = 6
+
+    def __init__(self):
+        ocr_settings = dict(DEFAULT_OCR_SETTINGS)
+        ocr_settings.update(getattr(settings, 'OCR_SETTINGS', {}))
+        self.language = ocr_settings['LANGUAGE']
+        self.tessdata_path = ocr_settings['TESSDATA_PATH']
+        self.pool_size = max(ocr_settings['ENGINE_POOL_SIZE'], 1)
+        self.backend = self._select_backend(ocr_settings['BACKEND'])
+
+        # Handles are created on first use, so each forked worker builds its own
+        self._handles = queue.LifoQueue()
+        self._handles_created = 0
+        self._lock = threading.Lock()
+
+    @property
+    def pytesseract_config(self) -> str:
+        return f'--oem {self.OEM} --psm {self.PSM}'
+
+    @staticmethod
+    def _select_backend(requested: str) -> str:
+        if requested == 'pytesseract':
+            return 'pytesseract'
+        if TESSEROCR_AVAILABLE:
+            return 'tesserocr'
+        if requested == 'tesserocr':
+            logger.warning("OCR_BACKEND is 'tesserocr' but tesserocr is not installed, using pytesseract")
+        return 'pytesseract'
+
+    def image_to_data(self, image: np.ndarray) -> Dict[str, List[Any]]:
+        """
+        Recognize a preprocessed 8-bit grayscale image
+
+        Returns:
+            Word rows as a dict of columns, like pytesseract.image_to_data
+        """
+        if self.backend == 'tesserocr':
+            try:
+                return self._tesserocr_data(image)
+            except Exception as e:
+                logger.warning(f"tesserocr recognition failed, falling back to pytesseract: {str(e)}")
+
+        return pytesseract.image_to_data(
+            image,
+            lang=self.language,
+            config=self.pytesseract_config,
+            output_type=pytesseract.Output.DICT
+        )
+
+    def _tesserocr_data(self, image: np.ndarray) -> Dict[str, List[Any]]:
+        image = np.ascontiguousarray(image, dtype=np.uint8)
+        height, width = image.shape[:2]
+        bytes_per_pixel = 1 if image.ndim == 2 else image.shape[2]
+
+        with self._handle() as api:
+            api.SetImageBytes(image.tobytes(), width, height, bytes_per_pixel, width * bytes_per_pixel)
+            return tsv_to_dict(api.GetTSVText(0))
+
+    @contextmanager
+    def _handle(self):
+        """Borrow a warm Tesseract handle, creating one while the pool has room"""
+        try:
+            api = self._handles.get_nowait()
+        except queue.Empty:
+            with self._lock:
+                create = self._handles_created < self.pool_size
+                if create:
+                    self._handles_created += 1
+            if create:
+                try:
+                    api = self._create_handle()
+                except Exception:
+                    with self._lock:
+                        self._handles_created -= 1
+                    raise
+            else:
+                api = self._handles.get()
+
+        try:
+            yield api
+        finally:
+            api.Clear()
+            self._handles.put(api)
+
+    def _create_handle(self):
+        kwargs = {
+            'lang': self.language,
+            'oem': self.OEM,
+            'psm': self.PSM,
+        }
+        if self.tessdata_path:
+            kwargs['path'] = self.tessdata_path
+        try:
+            api = tesserocr.PyTessBaseAPI(**kwargs)
+        except Exception as e:
+            # Usually missing traineddata; pytesseract will report the same problem per call
+            logger.error(f"Could not initialize tesserocr ({str(e)}), using pytesseract")
+            self.backend = 'pytesseract'
+            raise
+        version = tesserocr.tesseract_version().splitlines()[0]
+        logger.info(f"Initialized in-process Tesseract handle ({self.language}, {version})")
+        return api
+
+    def get_info(self) -> Dict[str, Any]:
+        return {
+            'backend': self.backend,
+            'language': self.language,
+            'pool_size': self.pool_size,
+            'handles_created': self._handles_created,
+        }
+
+
+# Global instance shared by every OCRService
+ocr_engine = OCREngine()
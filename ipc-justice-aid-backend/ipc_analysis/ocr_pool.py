@@ -0,0 +1,275 @@
+"""
+Process pool for OCR jobs.
+
+Decoding, preprocessing and Tesseract recognition are CPU-bound; run in the
+request thread, a burst of photo uploads starves every other endpoint served
+by the same worker. OCRService submits them here instead. Each web worker
+owns a small process pool, sized so that all web workers together run about
+one OCR process per physical core, and every OCR process keeps Tesseract and
+OpenCV single-threaded (OMP_THREAD_LIMIT, cv2.setNumThreads) so the pools do
+not oversubscribe the cores.
+
+Callers wait for at most POOL_TIMEOUT seconds. A full queue or a missed
+deadline raises BackendOverloadedError, like the LLM limiters, so the API
+answers with Retry-After instead of holding the request.
+"""
+import logging
+import math
+import multiprocessing
+import os
+import shlex
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Dict, Optional, Tuple, Union
+
+from django.conf import settings
+
+from .concurrency import BackendOverloadedError
+from .metrics import provider_metrics
+
+logger = logging.getLogger(__name__)
+
+
+DEFAULT_POOL_SETTINGS = {
+    'POOL_ENABLED': True,
+    'POOL_WORKERS': 0,
+    'WEB_WORKERS': 1,
+    'POOL_MAX_QUEUE': 8,
+    'POOL_TIMEOUT': 60,
+    'THREADS_PER_JOB': 1,
+    'RETRY_AFTER': 10,
+}
+
+
+def physical_cores() -> int:
+    """
+    Physical cores this process may use
+
+    Hyperthread siblings add little to Tesseract throughput, so they are
+    counted once. The result is capped by the CPU affinity mask and by a
+    cgroup CPU quota (containers).
+    """
+    try:
+        available = len(os.sched_getaffinity(0))
+    except AttributeError:
+        available = os.cpu_count() or 1
+
+    cores = set()
+    try:
+        with open('/proc/cpuinfo') as cpuinfo:
+            physical_id = core_id = None
+            for line in list(cpuinfo) + ['']:
+                key, _, value = line.partition(':')
+                key = key.strip()
+                if key == 'physical id':
+                    physical_id = value.strip()
+                elif key == 'core id':
+                    core_id = value.strip()
+                elif not line.strip():
+                    if core_id is not None:
+                        cores.add((physical_id, core_id))
+                    physical_id = core_id = None
+    except OSError:
+        pass
+
+    try:
+        with open('/sys/fs/cgroup/cpu.max') as cpu_max:
+            quota, period = cpu_max.read().split()
+        if quota != 'max':
+            available = min(available, max(math.ceil(int(quota) / int(period)), 1))
+    except (OSError, ValueError):
+        pass
+
+    return max(min(len(cores) or available, available), 1)
+
+
+def gunicorn_workers() -> Optional[int]:
+    """
+    Worker count given to gunicorn with -w/--workers, None if it was not
+    passed (gunicorn then uses WEB_CONCURRENCY) or this is not gunicorn
+
+    Web workers are forked from the arbiter, so its command line is ours.
+    """
+    if not os.path.basename(sys.argv[0]).startswith('gunicorn'):
+        return None
+
+    # Command line options override GUNICORN_CMD_ARGS
+    args = shlex.split(os.environ.get('GUNICORN_CMD_ARGS', '')) + sys.argv[1:]
+    workers = None
+    for index, arg in enumerate(args):
+        if arg in ('-w', '--workers'):
+            value = args[index + 1] if index + 1 < len(args) else ''
+        elif arg.startswith('--workers='):
+            value = arg[len('--workers='):]
+        elif arg.startswith('-w') and not arg.startswith('--'):
+            value = arg[2:]
+        else:
+            continue
+        try:
+            workers = int(value)
+        except ValueError:
+            pass
+    return workers
+
+
+def _init_worker(settings_module: str, threads: int):
+    # Must happen before Tesseract/OpenMP load; tesseract subprocesses inherit it too
+    os.environ['OMP_THREAD_LIMIT'] = str(threads)
+    if settings_module:
+        os.environ.setdefault('DJANGO_SETTINGS_MODULE', settings_module)
+
+    import django
+    django.setup()
+
+    from .ocr_service import CV2_AVAILABLE, cv2
+    if CV2_AVAILABLE:
+        cv2.setNumThreads(threads)
+
+
+def _cpu_seconds() -> float:
+    times = os.times()
+    return times.user + times.system + times.children_user + times.children_system
+
+
+def _run_job(source: Union[bytes, str], submitted_at: float) -> Tuple[Dict[str, Any], Dict[str, float]]:
+    """Runs in a pool process: OCR one image (contents or temp file path) and measure the job"""
+    from .ocr_service import OCRService
+
+    started_at = time.time()
+    cpu_start = _cpu_seconds()
+    result = OCRService().extract_text_from_source(source)
+    return result, {
+        'queue_wait': max(started_at - submitted_at, 0.0),
+        'cpu_seconds': _cpu_seconds() - cpu_start,
+    }
+
+
+class OCRPool:
+    """Per-worker process pool that runs OCR jobs with a deadline"""
+
+    def __init__(self):
+        pool_settings = dict(DEFAULT_POOL_SETTINGS)
+        pool_settings.update(getattr(settings, 'OCR_SETTINGS', {}))
+        self.enabled = pool_settings['POOL_ENABLED']
+        self.max_queue = pool_settings['POOL_MAX_QUEUE']
+        self.timeout = pool_settings['POOL_TIMEOUT']
+        self.threads_per_job = pool_settings['THREADS_PER_JOB']
+        self.retry_after = pool_settings['RETRY_AFTER']
+
+        # 0: share the physical cores between the web workers of this host
+        self.physical_cores = physical_cores()
+        self.workers = pool_settings['POOL_WORKERS'] or max(
+            self.physical_cores // max(pool_settings['WEB_WORKERS'], 1), 1
+        )
+        web_workers = gunicorn_workers()
+        if not pool_settings['POOL_WORKERS'] and web_workers not in (None, pool_settings['WEB_WORKERS']):
+            logger.warning(
+                f"gunicorn runs {web_workers} workers but WEB_CONCURRENCY is {pool_settings['WEB_WORKERS']}; "
+                f"OCR pools are sized for the latter. Set WEB_CONCURRENCY instead of --workers"
+            )
+
+        self._executor = None
+        self._executor_pid = None
+        self._depth = 0
+        self._lock = threading.Lock()
+
+    @property
+    def depth(self) -> int:
+        """Jobs submitted by this worker that are queued or running"""
+        return self._depth
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        # Created on first use, and again in a forked web worker, so every
+        # worker process gets its own OCR processes
+        with self._lock:
+            if self._executor is None or self._executor_pid != os.getpid():
+                if self._executor_pid != os.getpid():
+                    self._depth = 0
+                methods = multiprocessing.get_all_start_methods()
+                context = multiprocessing.get_context('forkserver' if 'forkserver' in methods else 'spawn')
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=context,
+                    initializer=_init_worker,
+                    initargs=(os.environ.get('DJANGO_SETTINGS_MODULE', ''), self.threads_per_job)
+                )
+                self._executor_pid = os.getpid()
+                logger.info(f"Started OCR pool with {self.workers} processes ({self.physical_cores} physical cores)")
+            return self._executor
+
+    def _job_done(self, future):
+        with self._lock:
+            self._depth -= 1
+            provider_metrics.set_ocr_queue_depth(self._depth)
+
+    def run(self, source: Union[bytes, str]) -> Dict[str, Any]:
+        """
+        OCR an image in the pool and wait for the result
+
+        Args:
+            source: Image file contents, or the path of a file the pool processes can read
+
+        Raises:
+            BackendOverloadedError: the queue is full or the deadline passed
+        """
+        executor = self._get_executor()
+        with self._lock:
+            if self._depth >= self.workers + self.max_queue:
+                provider_metrics.observe_ocr_job('rejected', 0.0)
+                raise BackendOverloadedError('ocr', self.retry_after, 'queue_full')
+            self._depth += 1
+            provider_metrics.set_ocr_queue_depth(self._depth)
+
+        start_time = time.time()
+        try:
+            future = executor.submit(_run_job, source, start_time)
+        except Exception:
+            self._job_done(None)
+            raise
+        # Counts down when the job finishes, even after the caller gave up on it
+        future.add_done_callback(self._job_done)
+
+        try:
+            result, job = future.result(timeout=self.timeout)
+        except FutureTimeoutError:
+            # A job that already started keeps its process until it finishes
+            future.cancel()
+            provider_metrics.observe_ocr_job('timeout', time.time() - start_time)
+            logger.warning(f"OCR job missed its {self.timeout}s deadline ({self._depth} jobs in the pool)")
+            raise BackendOverloadedError('ocr', self.retry_after, 'queue_timeout')
+        except BrokenProcessPool:
+            # A pool process died (e.g. killed for memory); start a new pool next time
+            with self._lock:
+                if self._executor is executor:
+                    self._executor = None
+            provider_metrics.observe_ocr_job('error', time.time() - start_time)
+            raise
+
+        provider_metrics.observe_ocr_job(
+            'success' if result.get('success') else 'error',
+            time.time() - start_time,
+            queue_wait=job['queue_wait'],
+            cpu_seconds=job['cpu_seconds']
+        )
+        logger.info(
+            f"OCR job finished in {time.time() - start_time:.2f}s "
+            f"(queued {job['queue_wait']:.2f}s, CPU {job['cpu_seconds']:.2f}s)"
+        )
+        return result
+
+    def get_info(self) -> Dict[str, Any]:
+        return {
+            'enabled': self.enabled,
+            'workers': self.workers,
+            'physical_cores': self.physical_cores,
+            'max_queue': self.max_queue,
+            'timeout': self.timeout,
+            'depth': self._depth,
+        }
+
+
+# Global instance shared by every OCRService
+ocr_pool = OCRPool()
@@ -8,12 +8,17 @@ except ImportError:
     CV2_AVAILABLE = False
     cv2 = None
 
-import pytesseract
 import numpy as np
 from PIL import Image
-import io
 import logging
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Optional, Tuple
+
+from django.conf import settings
+
+from .concurrency import BackendOverloadedError
+from .ocr_engine import ocr_engine
+from .ocr_pool import ocr_pool
+from .uploads import Source, open_source, open_upload, picklable_source, upload_source
 
 logger = logging.getLogger(__name__)
 
@@ -24,7 +29,10 @@ class OCRService:
     def __init__(self):
         # Configure Tesseract (path might need adjustment in Docker)
         # pytesseract.pytesseract.tesseract_cmd = '/usr/bin/tesseract'
-        pass
+        self.engine = ocr_engine
+        
+        # Longest side images are decoded to; 0 keeps the full resolution
+        self.max_dimension = getattr(settings, 'OCR_SETTINGS', {}).get('MAX_DIMENSION', 3508)
     
     def extract_text_from_image(self, image_file) -> Dict[str, Any]:
         """
@@ -37,38 +45,51 @@ class OCRService:
             Dict containing extracted text and metadata
         """
         try:
-            # Read image from uploaded file
-            image_data = image_file.read()
-            image_file.seek(0)  # Reset file pointer
+            # Run the CPU-bound part in the OCR process pool, off the request thread;
+            # spooled uploads are passed by path, not by value
+            if ocr_pool.enabled:
+                return ocr_pool.run(picklable_source(image_file))
+            return self.extract_text_from_source(upload_source(image_file))
             
-            # Convert to PIL Image
-            pil_image = Image.open(io.BytesIO(image_data))
+        except BackendOverloadedError:
+            raise
+        except Exception as e:
+            logger.error(f"OCR extraction failed: {str(e)}")
+            return {
+                'success': False,
+                'error': str(e),
+                'text': '',
+                'confidence': 0
+            }
+    
+    def extract_text_from_source(self, source: Source) -> Dict[str, Any]:
+        """
+        Extract text from an encoded image in the current process
+        
+        Args:
+            source: Image file contents, path or open binary file
             
-            # Convert to OpenCV format for preprocessing
-            opencv_image = cv2.cvtColor(np.array(pil_image), cv2.COLOR_RGB2BGR)
+        Returns:
+            Dict containing extracted text and metadata
+        """
+        try:
+            # Decode straight to grayscale at OCR resolution, reading the
+            # upload buffer or memory-mapped temp file in place
+            with open_source(source) as stream:
+                pil_image = Image.open(stream)
+                original_size = pil_image.size
+                gray_image = self._load_grayscale(pil_image)
             
             # Preprocess image for better OCR results
-            processed_image = self._preprocess_image(opencv_image)
+            processed_image = self._preprocess_image(gray_image)
             
-            # Extract text using Tesseract
-            extracted_text = pytesseract.image_to_string(
-                processed_image,
-                config='--oem 3 --psm 6'  # Use LSTM OCR Engine and assume single uniform block
-            )
+            # Extract words and their confidences in a single Tesseract pass
+            ocr_data = self.engine.image_to_data(processed_image)
+            extracted_text, avg_confidence = self._text_and_confidence(ocr_data)
             
             # Clean extracted text
             cleaned_text = self._clean_extracted_text(extracted_text)
             
-            # Get confidence scores
-            confidence_data = pytesseract.image_to_data(
-                processed_image,
-                output_type=pytesseract.Output.DICT
-            )
-            
-            # Calculate average confidence
-            confidences = [int(conf) for conf in confidence_data['conf'] if int(conf) > 0]
-            avg_confidence = sum(confidences) / len(confidences) if confidences else 0
-            
             return {
                 'success': True,
                 'text': cleaned_text,
@@ -76,8 +97,8 @@ class OCRService:
                 'word_count': len(cleaned_text.split()),
                 'character_count': len(cleaned_text),
                 'image_size': {
-                    'width': pil_image.width,
-                    'height': pil_image.height
+                    'width': original_size[0],
+                    'height': original_size[1]
                 }
             }
             
@@ -90,6 +111,38 @@ class OCRService:
                 'confidence': 0
             }
     
+    def _load_grayscale(self, pil_image: Image.Image) -> np.ndarray:
+        """
+        Decode an opened image as 8-bit grayscale, no larger than max_dimension
+        
+        JPEGs are decoded in draft mode: libjpeg keeps only the luma channel
+        and scales down by up to 8x while decoding, so a 12-48MP phone photo
+        is never held in memory at full size in RGB. Other formats are
+        converted and resized after decoding.
+        
+        Args:
+            pil_image: Image from Image.open, not decoded yet
+            
+        Returns:
+            Grayscale image array
+        """
+        width, height = pil_image.size
+        scale = 1.0
+        if self.max_dimension and max(width, height) > self.max_dimension:
+            scale = self.max_dimension / max(width, height)
+        
+        # No-op for formats other than JPEG
+        pil_image.draft('L', (max(int(width * scale), 1), max(int(height * scale), 1)))
+        
+        if pil_image.mode != 'L':
+            pil_image = pil_image.convert('L')
+        
+        # Draft mode only scales by powers of two
+        if self.max_dimension and max(pil_image.size) > self.max_dimension:
+            pil_image.thumbnail((self.max_dimension, self.max_dimension), Image.Resampling.BILINEAR)
+        
+        return np.asarray(pil_image)
+    
     def _preprocess_image(self, image: np.ndarray) -> np.ndarray:
         """
         Preprocess image to improve OCR accuracy
@@ -119,12 +172,42 @@ class OCRService:
             2
         )
         
-        # Apply morphological operations to clean up the image
-        kernel = np.ones((1, 1), np.uint8)
-        processed = cv2.morphologyEx(thresh, cv2.MORPH_CLOSE, kernel)
-        processed = cv2.morphologyEx(processed, cv2.MORPH_OPEN, kernel)
+        return thresh
+    
+    @staticmethod
+    def _text_and_confidence(ocr_data: Dict[str, list]) -> Tuple[str, float]:
+        """
+        Rebuild the recognized text and its average word confidence
         
-        return processed
+        Args:
+            ocr_data: pytesseract.image_to_data output as a dict of columns
+            
+        Returns:
+            (text with one line per Tesseract line, average confidence)
+        """
+        lines = []
+        confidences = []
+        current_line = None
+        
+        for index, word in enumerate(ocr_data.get('text', [])):
+            # Rows without text are the page/block/paragraph/line entries (conf -1)
+            word = str(word).strip()
+            if not word:
+                continue
+            
+            line_key = (ocr_data['block_num'][index], ocr_data['par_num'][index], ocr_data['line_num'][index])
+            if line_key != current_line:
+                lines.append([])
+                current_line = line_key
+            lines[-1].append(word)
+            
+            confidence = float(ocr_data['conf'][index])
+            if confidence > 0:
+                confidences.append(confidence)
+        
+        text = '\n'.join(' '.join(words) for words in lines)
+        avg_confidence = sum(confidences) / len(confidences) if confidences else 0
+        return text, avg_confidence
     
     def _clean_extracted_text(self, text: str) -> str:
         """
@@ -184,12 +267,11 @@ class OCRService:
                     'error': f'Unsupported file format. Allowed: {", ".join(allowed_formats)}'
                 }
             
-            # Try to open image to validate it's a real image
-            image_data = image_file.read()
-            image_file.seek(0)  # Reset file pointer
-            
-            pil_image = Image.open(io.BytesIO(image_data))
-            pil_image.verify()  # Verify it's a valid image
+            # Try to open image to validate it's a real image, from the same
+            # buffer or temp file that extraction reads
+            with open_upload(image_file) as stream:
+                pil_image = Image.open(stream)
+                pil_image.verify()  # Verify it's a valid image
             
             return {
                 'valid': True,
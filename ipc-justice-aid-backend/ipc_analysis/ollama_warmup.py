@@ -0,0 +1,155 @@
+"""
+Keeps the Ollama model resident so requests don't pay for a cold load.
+
+The model is loaded when the app starts (``manage.py warm_ollama``) and a
+Celery beat task re-sends ``keep_alive`` during business hours. Every Ollama
+response reports ``load_duration``; it is recorded here so cold starts show up
+in the health check.
+"""
+import logging
+import time
+from datetime import datetime
+from typing import Any, Dict, Optional, Union
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+from .http_clients import get_provider_client
+
+logger = logging.getLogger(__name__)
+
+
+def coerce_keep_alive(value: Union[str, int]) -> Union[str, int]:
+    """
+    Return a keep_alive value in the form Ollama expects
+
+    Ollama takes either a duration string ('30m') or a number of seconds
+    (negative keeps the model loaded indefinitely); a bare number sent as a
+    string is rejected as a duration without a unit.
+    """
+    keep_alive = str(value).strip()
+    try:
+        return int(keep_alive)
+    except ValueError:
+        return keep_alive
+
+
+def get_keep_alive() -> Union[str, int]:
+    """Return OLLAMA_KEEP_ALIVE in the form Ollama expects"""
+    return coerce_keep_alive(getattr(settings, 'OLLAMA_KEEP_ALIVE', '30m'))
+
+
+class OllamaWarmupService:
+    """Loads the Ollama model ahead of traffic and tracks model load times"""
+
+    STATS_PREFIX = 'ipc_analysis:ollama_load'
+
+    def __init__(self):
+        warmup_settings = getattr(settings, 'OLLAMA_WARMUP_SETTINGS', {})
+        self.base_url = getattr(settings, 'OLLAMA_BASE_URL', 'http://localhost:11434')
+        self.model_name = getattr(settings, 'OLLAMA_MODEL_NAME', 'Anupam/IPC-Helper:latest')
+        self.enabled = warmup_settings.get('ENABLED', True)
+        self.timeout = warmup_settings.get('TIMEOUT', 300)
+        self.business_hours_start = warmup_settings.get('BUSINESS_HOURS_START', '09:00')
+        self.business_hours_end = warmup_settings.get('BUSINESS_HOURS_END', '20:00')
+        self.business_days = warmup_settings.get('BUSINESS_DAYS', [0, 1, 2, 3, 4, 5])
+        # Loads slower than this are counted as cold starts
+        self.cold_load_threshold_ms = warmup_settings.get('COLD_LOAD_THRESHOLD_MS', 1000)
+        self.client = get_provider_client('ollama')
+
+    def warm_up(self, keep_alive: Optional[Union[str, int]] = None) -> Dict[str, Any]:
+        """
+        Load the model (or refresh its keep_alive) without generating anything
+
+        Returns:
+            Dict with success flag, load duration and whether it was a cold load
+        """
+        keep_alive = get_keep_alive() if keep_alive is None else coerce_keep_alive(keep_alive)
+        url = f"{self.base_url}/api/generate"
+        # A generate request without a prompt just loads the model
+        payload = {
+            "model": self.model_name,
+            "keep_alive": keep_alive,
+            "stream": False
+        }
+
+        start_time = time.time()
+        try:
+            response = self.client.post(url, json=payload, timeout=self.timeout)
+            if response.status_code != 200:
+                raise Exception(f"Ollama API error: {response.status_code} - {response.text}")
+            result = response.json()
+        except Exception as e:
+            logger.warning(f"Ollama warm-up failed: {str(e)}")
+            return {'success': False, 'model': self.model_name, 'error': str(e)}
+
+        load_duration_ms = self.record_response(result)
+        return {
+            'success': True,
+            'model': self.model_name,
+            'keep_alive': keep_alive,
+            'load_duration_ms': load_duration_ms,
+            'cold_load': load_duration_ms >= self.cold_load_threshold_ms,
+            'total_ms': int((time.time() - start_time) * 1000),
+        }
+
+    def is_business_hours(self, now: Optional[datetime] = None) -> bool:
+        now = timezone.localtime(now or timezone.now())
+        if now.weekday() not in self.business_days:
+            return False
+        current = now.strftime('%H:%M')
+        return self.business_hours_start <= current < self.business_hours_end
+
+    def record_response(self, result: Dict[str, Any]) -> int:
+        """Record the load_duration (nanoseconds) of an Ollama response; returns it in ms"""
+        load_duration_ns = result.get('load_duration')
+        if load_duration_ns is None:
+            return 0
+
+        load_duration_ms = int(load_duration_ns / 1_000_000)
+        cold_load = load_duration_ms >= self.cold_load_threshold_ms
+        if cold_load:
+            logger.info(f"Ollama cold-loaded {self.model_name} in {load_duration_ms}ms")
+
+        try:
+            self._incr('responses')
+            self._incr('total_load_ms', load_duration_ms)
+            if cold_load:
+                self._incr('cold_loads')
+                cache.set(f"{self.STATS_PREFIX}:last_cold_load", {
+                    'load_duration_ms': load_duration_ms,
+                    'at': timezone.now().isoformat(),
+                }, None)
+        except Exception as e:
+            logger.debug(f"Could not record Ollama load duration: {str(e)}")
+
+        return load_duration_ms
+
+    def get_stats(self) -> Dict[str, Any]:
+        names = ('responses', 'cold_loads', 'total_load_ms', 'last_cold_load')
+        stats = {
+            'model': self.model_name,
+            'keep_alive': get_keep_alive(),
+            'business_hours': self.is_business_hours(),
+        }
+        try:
+            values = cache.get_many([f"{self.STATS_PREFIX}:{name}" for name in names])
+            for name in names:
+                stats[name] = values.get(f"{self.STATS_PREFIX}:{name}", 0 if name != 'last_cold_load' else None)
+            stats['cold_load_rate'] = (
+                round(stats['cold_loads'] / stats['responses'], 4) if stats['responses'] else 0.0
+            )
+        except Exception as e:
+            stats['error'] = str(e)
+        return stats
+
+    def _incr(self, name: str, amount: int = 1):
+        key = f"{self.STATS_PREFIX}:{name}"
+        cache.add(key, 0, None)
+        if amount:
+            cache.incr(key, amount)
+
+
+# Global instance used by the Ollama services, the startup hook and the beat task
+ollama_warmup_service = OllamaWarmupService()
@@ -0,0 +1,345 @@
+"""
+Cluster-wide request and token quotas for the hosted LLM providers.
+
+Each provider has a token bucket in Redis per quota dimension: requests per
+minute and tokens per minute. Before a call is sent, the caller reserves one
+request plus its estimated tokens from both buckets, waiting while there is
+no headroom. Once the response is in, the estimate is settled against the
+token count the provider reports. A 429 from the provider blocks the bucket
+for every gunicorn worker and Celery process, not only the one that was
+throttled. When the wait would exceed MAX_WAIT, BackendOverloadedError is
+raised so the API can answer with Retry-After.
+"""
+import asyncio
+import logging
+import math
+import threading
+import time
+from typing import Any, Dict, Optional
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+from .concurrency import BackendOverloadedError
+from .metrics import provider_metrics
+
+logger = logging.getLogger(__name__)
+
+
+DEFAULT_QUOTA_SETTINGS = {
+    'ENABLED': True,
+    'REQUESTS_PER_MINUTE': 15,
+    'TOKENS_PER_MINUTE': 1000000,
+    'MAX_WAIT': 30,
+    # Rough prompt size estimate until the provider reports the real count
+    'CHARS_PER_TOKEN': 4,
+    # Blocking period after a 429 without a Retry-After header
+    'THROTTLE_BACKOFF': 10,
+}
+
+# Refills both buckets, then takes one request and ARGV[4] tokens if both have
+# room. Returns the seconds to wait before retrying, 0 when reserved.
+RESERVE_SCRIPT = """
+local now = tonumber(ARGV[1])
+local rpm = tonumber(ARGV[2])
+local tpm = tonumber(ARGV[3])
+local cost = math.min(tonumber(ARGV[4]), tpm)
+
+local state = redis.call('hmget', KEYS[1], 'requests', 'tokens', 'updated_at', 'blocked_until')
+local requests = tonumber(state[1]) or rpm
+local tokens = tonumber(state[2]) or tpm
+local updated_at = tonumber(state[3]) or now
+local blocked_until = tonumber(state[4]) or 0
+
+local elapsed = math.max(now - updated_at, 0)
+requests = math.min(rpm, requests + elapsed * rpm / 60)
+tokens = math.min(tpm, tokens + elapsed * tpm / 60)
+
+local wait = 0
+if blocked_until > now then
+    wait = blocked_until - now
+end
+if requests < 1 then
+    wait = math.max(wait, (1 - requests) * 60 / rpm)
+end
+if tokens < cost then
+    wait = math.max(wait, (cost - tokens) * 60 / tpm)
+end
+if wait == 0 then
+    requests = requests - 1
+    tokens = tokens - cost
+end
+
+redis.call('hset', KEYS[1], 'requests', tostring(requests), 'tokens', tostring(tokens), 'updated_at', ARGV[1])
+redis.call('expire', KEYS[1], 120)
+return tostring(wait)
+"""
+
+# Returns the difference between the estimated and the actual token count to the bucket
+SETTLE_SCRIPT = """
+local tokens = tonumber(redis.call('hget', KEYS[1], 'tokens'))
+if tokens then
+    tokens = math.min(tonumber(ARGV[2]), tokens + tonumber(ARGV[1]))
+    redis.call('hset', KEYS[1], 'tokens', tostring(tokens))
+end
+return 1
+"""
+
+# Empties the request bucket and blocks it until ARGV[2]
+THROTTLE_SCRIPT = """
+local blocked_until = tonumber(redis.call('hget', KEYS[1], 'blocked_until') or '0')
+if tonumber(ARGV[2]) > blocked_until then
+    redis.call('hset', KEYS[1], 'blocked_until', ARGV[2])
+end
+redis.call('hset', KEYS[1], 'requests', '0', 'updated_at', ARGV[1])
+redis.call('expire', KEYS[1], math.max(120, math.ceil(tonumber(ARGV[2]) - tonumber(ARGV[1])) + 60))
+return 1
+"""
+
+
+class ProviderQuota:
+    """Token buckets for one provider's requests-per-minute and tokens-per-minute quota"""
+
+    KEY_PREFIX = 'ipc_analysis:quota'
+    STAT_NAMES = ('reservations', 'delayed', 'wait_ms', 'rejections', 'throttled', 'tokens_used')
+
+    def __init__(self, provider: str, quota_settings: Dict[str, Any], cache_alias: str = 'default'):
+        self.provider = provider
+        self.enabled = quota_settings['ENABLED']
+        self.requests_per_minute = quota_settings['REQUESTS_PER_MINUTE']
+        self.tokens_per_minute = quota_settings['TOKENS_PER_MINUTE']
+        self.max_wait = quota_settings['MAX_WAIT']
+        self.chars_per_token = quota_settings['CHARS_PER_TOKEN']
+        self.throttle_backoff = quota_settings['THROTTLE_BACKOFF']
+        self.cache_alias = cache_alias
+
+        self.bucket_key = f"{self.KEY_PREFIX}:{provider}:bucket"
+        self._scripts = None
+
+    def estimate_tokens(self, prompt: str, max_output_tokens: int) -> int:
+        """Upper-bound estimate of the tokens a call will be charged"""
+        return len(prompt) // self.chars_per_token + max_output_tokens
+
+    def reserve(self, estimated_tokens: int) -> int:
+        """
+        Wait until one request and ``estimated_tokens`` tokens are available and take them
+
+        Returns the number of tokens reserved (0 when quotas are disabled or
+        Redis is unavailable), to be passed to settle() once the call is done.
+        """
+        if not self.enabled:
+            return 0
+
+        deadline = time.time() + self.max_wait
+        waited = 0.0
+        while True:
+            wait = self._try_reserve(estimated_tokens, deadline, waited)
+            if wait is None:
+                return 0
+            if wait == 0:
+                provider_metrics.observe_queue_wait(self.provider, 'quota', waited)
+                return estimated_tokens
+            time.sleep(wait)
+            waited += wait
+
+    async def areserve(self, estimated_tokens: int) -> int:
+        """Async variant of reserve()"""
+        if not self.enabled:
+            return 0
+
+        deadline = time.time() + self.max_wait
+        waited = 0.0
+        try_reserve = sync_to_async(self._try_reserve, thread_sensitive=False)
+        while True:
+            wait = await try_reserve(estimated_tokens, deadline, waited)
+            if wait is None:
+                return 0
+            if wait == 0:
+                provider_metrics.observe_queue_wait(self.provider, 'quota', waited)
+                return estimated_tokens
+            await asyncio.sleep(wait)
+            waited += wait
+
+    def _try_reserve(self, estimated_tokens: int, deadline: float, waited: float) -> Optional[float]:
+        """
+        Make one reservation attempt: returns 0 when reserved, the seconds to
+        wait otherwise, or None when Redis is unavailable (fail open)
+
+        Raises BackendOverloadedError when the wait would run past the deadline.
+        """
+        redis = self._get_redis()
+        if redis is None:
+            return None
+
+        now = time.time()
+        try:
+            wait = float(self._get_scripts(redis)['reserve'](
+                keys=[self.bucket_key],
+                args=[now, self.requests_per_minute, self.tokens_per_minute, estimated_tokens]
+            ))
+        except Exception as e:
+            logger.warning(f"Quota limiter unavailable for {self.provider}: {str(e)}")
+            return None
+
+        if wait == 0:
+            self._incr(redis, 'reservations')
+            if waited:
+                self._incr(redis, 'delayed')
+                self._incr(redis, 'wait_ms', int(waited * 1000))
+            return 0
+
+        if now + wait > deadline:
+            self._incr(redis, 'rejections')
+            logger.warning(f"Rejected {self.provider} request: quota exhausted for {wait:.1f}s")
+            raise BackendOverloadedError(self.provider, math.ceil(wait), 'quota_exhausted')
+
+        # Sleep in short steps so a freed-up bucket is noticed early
+        return min(wait, 1.0)
+
+    def settle(self, reserved_tokens: int, actual_tokens: Optional[int]):
+        """Correct a reservation with the token count the provider reported"""
+        if not reserved_tokens or actual_tokens is None:
+            return
+
+        redis = self._get_redis()
+        if redis is None:
+            return
+
+        try:
+            self._get_scripts(redis)['settle'](
+                keys=[self.bucket_key], args=[reserved_tokens - actual_tokens, self.tokens_per_minute]
+            )
+            self._incr(redis, 'tokens_used', actual_tokens)
+        except Exception as e:
+            logger.warning(f"Could not settle {self.provider} quota reservation: {str(e)}")
+
+    def throttle(self, retry_after: Optional[float] = None) -> bool:
+        """
+        Block the bucket for every worker after the provider answered 429
+
+        Returns False when the bucket could not be blocked, in which case the
+        caller has to back off on its own.
+        """
+        redis = self._get_redis() if self.enabled else None
+        if redis is None:
+            return False
+
+        now = time.time()
+        backoff = retry_after if retry_after else self.throttle_backoff
+        try:
+            self._get_scripts(redis)['throttle'](keys=[self.bucket_key], args=[now, now + backoff])
+        except Exception as e:
+            logger.warning(f"Could not record {self.provider} rate limiting: {str(e)}")
+            return False
+
+        self._incr(redis, 'throttled')
+        logger.warning(f"{self.provider} rate limited us, pausing all workers for {backoff}s")
+        return True
+
+    def get_state(self) -> Dict[str, Any]:
+        """Return the current headroom of both buckets and the reservation counters"""
+        state = {
+            'enabled': self.enabled,
+            'requests_per_minute': self.requests_per_minute,
+            'tokens_per_minute': self.tokens_per_minute,
+        }
+        redis = self._get_redis()
+        if redis is None:
+            state['error'] = 'redis unavailable'
+            return state
+
+        try:
+            pipe = redis.pipeline()
+            pipe.hmget(self.bucket_key, 'requests', 'tokens', 'updated_at', 'blocked_until')
+            for name in self.STAT_NAMES:
+                pipe.get(self._stat_key(name))
+            bucket, *counters = pipe.execute()
+        except Exception as e:
+            state['error'] = str(e)
+            return state
+
+        now = time.time()
+        requests, tokens, updated_at, blocked_until = (float(value) if value is not None else None for value in bucket)
+        elapsed = max(now - updated_at, 0) if updated_at is not None else 0
+        requests_left = self.requests_per_minute if requests is None else min(
+            self.requests_per_minute, requests + elapsed * self.requests_per_minute / 60
+        )
+        tokens_left = self.tokens_per_minute if tokens is None else min(
+            self.tokens_per_minute, tokens + elapsed * self.tokens_per_minute / 60
+        )
+
+        state.update({
+            'requests_available': round(max(requests_left, 0), 2),
+            'tokens_available': int(max(tokens_left, 0)),
+            'request_headroom': round(max(requests_left, 0) / self.requests_per_minute, 4),
+            'token_headroom': round(max(tokens_left, 0) / self.tokens_per_minute, 4),
+            'blocked_for_seconds': round(max((blocked_until or 0) - now, 0), 1),
+        })
+        state.update({name: int(value or 0) for name, value in zip(self.STAT_NAMES, counters)})
+        return state
+
+    def _incr(self, redis, stat_name: str, amount: int = 1):
+        try:
+            redis.incrby(self._stat_key(stat_name), amount)
+        except Exception as e:
+            logger.debug(f"Could not update quota counter {stat_name}: {str(e)}")
+
+    def _stat_key(self, stat_name: str) -> str:
+        return f"{self.KEY_PREFIX}:{self.provider}:{stat_name}"
+
+    def _get_redis(self):
+        try:
+            from django_redis import get_redis_connection
+            return get_redis_connection(self.cache_alias)
+        except Exception as e:
+            logger.debug(f"Redis not available for quota limiting: {str(e)}")
+            return None
+
+    def _get_scripts(self, redis):
+        if self._scripts is None:
+            self._scripts = {
+                'reserve': redis.register_script(RESERVE_SCRIPT),
+                'settle': redis.register_script(SETTLE_SCRIPT),
+                'throttle': redis.register_script(THROTTLE_SCRIPT),
+            }
+        return self._scripts
+
+
+class ProviderQuotaRegistry:
+    """Creates and caches one ProviderQuota per provider"""
+
+    def __init__(self):
+        self._quotas: Dict[str, ProviderQuota] = {}
+        self._lock = threading.Lock()
+
+    def get(self, provider: str) -> ProviderQuota:
+        quota = self._quotas.get(provider)
+        if quota is not None:
+            return quota
+
+        with self._lock:
+            if provider not in self._quotas:
+                self._quotas[provider] = ProviderQuota(provider, self._get_quota_settings(provider))
+            return self._quotas[provider]
+
+    def get_states(self) -> Dict[str, Dict[str, Any]]:
+        return {provider: quota.get_state() for provider, quota in list(self._quotas.items())}
+
+    def _get_quota_settings(self, provider: str) -> Dict[str, Any]:
+        configured = getattr(settings, 'LLM_QUOTA_SETTINGS', {})
+        quota_settings = dict(DEFAULT_QUOTA_SETTINGS)
+        quota_settings.update(configured.get('DEFAULT', {}))
+        quota_settings.update(configured.get(provider, {}))
+        return quota_settings
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Seconds from a Retry-After header, if it holds a number"""
+    try:
+        return max(float(value), 0) if value else None
+    except ValueError:
+        return None
+
+
+# Global registry shared by the analysis services in this process
+provider_quotas = ProviderQuotaRegistry()
@@ -1,5 +1,5 @@
 from rest_framework import serializers
-from .models import LegalCase, IPCSection, LegalAnalysis, AnalysisHistory
+from .models import LegalCase, IPCSection, LegalAnalysis, AnalysisHistory, BulkAnalysisJob
 
 
 class IPCSectionSerializer(serializers.ModelSerializer):
@@ -74,3 +74,17 @@ class CaseAnalysisResponseSerializer(serializers.Serializer):
     explanation = serializers.CharField()
     analyzed_at = serializers.DateTimeField()
     response_time_ms = serializers.IntegerField()
+
+
+class BulkAnalysisJobSerializer(serializers.ModelSerializer):
+    """Serializer for bulk analysis job status"""
+    progress_percent = serializers.FloatField(read_only=True)
+    
+    class Meta:
+        model = BulkAnalysisJob
+        fields = [
+            'job_id', 'status', 'input_format', 'total_cases', 'processed_cases',
+            'succeeded_cases', 'failed_cases', 'progress_percent', 'error_message',
+            'created_at', 'started_at', 'completed_at'
+        ]
+        read_only_fields = fields
@@ -1,17 +1,30 @@
-import requests
 import json
 import time
+from asgiref.sync import sync_to_async
 from django.conf import settings
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Iterator, Optional
+
+from .http_clients import get_async_provider_client, get_provider_client
+from .concurrency import BackendOverloadedError, backend_limiters
+from .ollama_warmup import get_keep_alive, ollama_warmup_service
+from .analysis_schema import ANALYSIS_SCHEMA, ollama_format, parse_failures
+from .json_extraction import extract_json_object, has_key, repair_truncated_json
+from .ipc_retrieval import ipc_retriever
+from .metrics import ollama_usage, provider_metrics
 
 
 class OllamaService:
     """Service class to interact with Ollama API for IPC analysis"""
     
+    # Bump whenever the prompt template changes so cached analyses are not reused
+    PROMPT_VERSION = '2'
+    
     def __init__(self):
         self.base_url = getattr(settings, 'OLLAMA_BASE_URL', 'http://localhost:11434')
         self.model_name = getattr(settings, 'OLLAMA_MODEL_NAME', 'Anupam/IPC-Helper:latest')
         self.timeout = getattr(settings, 'OLLAMA_TIMEOUT', 30)
+        self.client = get_provider_client('ollama')
+        self.limiter = backend_limiters.get('ollama')
     
     def analyze_case(self, case_description: str) -> Dict[str, Any]:
         """
@@ -29,39 +42,52 @@ class OllamaService:
         
         try:
             response = self._call_ollama_api(prompt)
-            end_time = time.time()
-            
-            response_time_ms = int((end_time - start_time) * 1000)
-            
             # Parse the JSON response from Ollama
-            analysis_result = self._parse_ollama_response(response)
-            
-            return {
-                'success': True,
-                'analysis': analysis_result,
-                'response_time_ms': response_time_ms,
-                'raw_response': response,
-                'error': None
-            }
+            return self._case_result(start_time, response, self._parse_ollama_response(response))
             
+        except BackendOverloadedError:
+            raise
         except Exception as e:
-            end_time = time.time()
-            response_time_ms = int((end_time - start_time) * 1000)
+            return self._case_result(start_time, error=str(e))
+    
+    async def aanalyze_case(self, case_description: str) -> Dict[str, Any]:
+        """Async variant of analyze_case for the async views"""
+        prompt = self._create_prompt(case_description)
+        
+        start_time = time.time()
+        
+        try:
+            response = await self._acall_ollama_api(prompt)
+            # Parsing records stats in the cache, so keep it off the event loop
+            analysis_result = await sync_to_async(self._parse_ollama_response, thread_sensitive=False)(response)
+            return self._case_result(start_time, response, analysis_result)
             
-            return {
-                'success': False,
-                'analysis': None,
-                'response_time_ms': response_time_ms,
-                'raw_response': None,
-                'error': str(e)
-            }
+        except BackendOverloadedError:
+            raise
+        except Exception as e:
+            return self._case_result(start_time, error=str(e))
+    
+    @staticmethod
+    def _case_result(start_time: float, response: Optional[str] = None,
+                     analysis: Optional[Dict[str, Any]] = None, error: Optional[str] = None) -> Dict[str, Any]:
+        """Result of analyze_case, successful unless an error is given"""
+        return {
+            'success': error is None,
+            'analysis': analysis,
+            'response_time_ms': int((time.time() - start_time) * 1000),
+            'raw_response': response,
+            'error': error
+        }
     
     def _create_prompt(self, case_description: str) -> str:
         """Create a formatted prompt for the Ollama model"""
+        candidates = ipc_retriever.format_candidates(case_description)
+        if candidates:
+            candidates += "\n\n"
         prompt = f"""
 {case_description.strip()}
 
-Which IPC sections will be applied in this case? Give response in JSON format with a description of those IPCs and why were those applied.
+{candidates}Which IPC sections will be applied in this case? Give response in JSON format with a description of those IPCs and why were those applied.
 
 Please provide the response in the following JSON format:
 {{
@@ -77,38 +103,100 @@ Please provide the response in the following JSON format:
 """
         return prompt
     
+    def _build_payload(self, prompt: str, stream: bool = False) -> Dict[str, Any]:
+        return {
+            "model": self.model_name,
+            "prompt": prompt,
+            "stream": stream,
+            "format": ollama_format(ANALYSIS_SCHEMA),
+            "keep_alive": get_keep_alive()
+        }
+    
     def _call_ollama_api(self, prompt: str) -> str:
         """Make the actual API call to Ollama"""
         url = f"{self.base_url}/api/generate"
         
-        payload = {
-            "model": self.model_name,
-            "prompt": prompt,
-            "stream": False,
-            "format": "json"
-        }
+        payload = self._build_payload(prompt)
         
         headers = {
             "Content-Type": "application/json"
         }
         
-        response = requests.post(
-            url, 
-            json=payload, 
-            headers=headers, 
-            timeout=self.timeout
-        )
+        with self.limiter.slot() as lease, provider_metrics.track('ollama') as call:
+            response = self.client.post(
+                url, 
+                json=payload, 
+                headers=headers, 
+                timeout=self.timeout
+            )
+            call.received(response)
+            lease.received(response)
+        
+        return self._handle_response(response, call)
+    
+    async def _acall_ollama_api(self, prompt: str) -> str:
+        """Async variant of _call_ollama_api"""
+        url = f"{self.base_url}/api/generate"
+        client = get_async_provider_client('ollama')
+        
+        async with self.limiter.aslot() as lease:
+            with provider_metrics.track('ollama') as call:
+                response = await client.post(url, json=self._build_payload(prompt), timeout=self.timeout)
+                call.received(response)
+                lease.received(response)
         
+        # Records warm-up state in the cache, so keep it off the event loop
+        return await sync_to_async(self._handle_response, thread_sensitive=False)(response, call)
+    
+    def _handle_response(self, response, call) -> str:
+        """Check a /api/generate response, record its usage and return the generated text"""
         if response.status_code != 200:
             raise Exception(f"Ollama API error: {response.status_code} - {response.text}")
         
         result = response.json()
+        ollama_warmup_service.record_response(result)
+        call.record_usage(**ollama_usage(result))
         
         if 'response' not in result:
             raise Exception("Invalid response format from Ollama API")
         
         return result['response']
     
+    def stream_analysis(self, case_description: str) -> Iterator[str]:
+        """
+        Stream the model output for a case description
+        
+        Yields:
+            Text chunks as Ollama generates them
+        """
+        prompt = self._create_prompt(case_description)
+        url = f"{self.base_url}/api/generate"
+        
+        payload = self._build_payload(prompt, stream=True)
+        
+        with self.limiter.slot(), provider_metrics.track('ollama') as call, \
+                self.client.post(url, json=payload, timeout=self.timeout, stream=True) as response:
+            call.received(response)
+            if response.status_code != 200:
+                raise Exception(f"Ollama API error: {response.status_code} - {response.text}")
+            
+            for line in response.iter_lines():
+                if not line:
+                    continue
+                
+                chunk = json.loads(line)
+                if chunk.get('error'):
+                    raise Exception(f"Ollama API error: {chunk['error']}")
+                
+                if chunk.get('response'):
+                    call.first_byte()
+                    yield chunk['response']
+                
+                if chunk.get('done'):
+                    ollama_warmup_service.record_response(chunk)
+                    call.record_usage(**ollama_usage(chunk))
+                    break
+    
     def _parse_ollama_response(self, response_text: str) -> Dict[str, Any]:
         """Parse the JSON response from Ollama"""
         try:
@@ -117,11 +205,13 @@ Please provide the response in the following JSON format:
             
             # Validate required fields
             if 'sections_applied' not in parsed:
+                parse_failures.record('ollama', failed=True)
                 raise ValueError("Missing 'sections_applied' in response")
             
             if 'explanation' not in parsed:
                 parsed['explanation'] = "No explanation provided"
             
+            parse_failures.record('ollama', failed=False)
             return parsed
             
         except json.JSONDecodeError as e:
@@ -130,19 +220,19 @@ Please provide the response in the following JSON format:
     
     def _extract_json_from_text(self, text: str) -> Dict[str, Any]:
         """Extract JSON from text response that might have additional formatting"""
-        import re
-        
-        # Look for JSON patterns in the text
-        json_pattern = r'\{.*\}'
-        match = re.search(json_pattern, text, re.DOTALL)
+        parsed = extract_json_object(text, has_key('sections_applied'))
+        if parsed is not None:
+            parse_failures.record('ollama', failed=False)
+            return parsed
         
-        if match:
-            try:
-                return json.loads(match.group())
-            except json.JSONDecodeError:
-                pass
+        # Keep the complete sections of a response cut off by the output token limit
+        parsed = repair_truncated_json(text, has_key('sections_applied'))
+        if parsed is not None:
+            parse_failures.record('ollama', failed=False, partial=True)
+            return parsed
         
         # Fallback: create a basic structure
+        parse_failures.record('ollama', failed=True)
         return {
             "sections_applied": [
                 {
@@ -157,29 +247,41 @@ Please provide the response in the following JSON format:
     def health_check(self) -> Dict[str, Any]:
         """Check if Ollama service is available"""
         try:
-            url = f"{self.base_url}/api/tags"
-            response = requests.get(url, timeout=5)
-            
-            if response.status_code == 200:
-                models = response.json().get('models', [])
-                model_available = any(
-                    model.get('name') == self.model_name 
-                    for model in models
-                )
-                
-                return {
-                    'status': 'healthy',
-                    'model_available': model_available,
-                    'available_models': [m.get('name') for m in models]
-                }
-            else:
-                return {
-                    'status': 'unhealthy',
-                    'error': f"HTTP {response.status_code}"
-                }
-                
+            response = self.client.get(f"{self.base_url}/api/tags", timeout=5)
+            return self._health_from_tags(response.status_code, response.json() if response.status_code == 200 else None)
         except Exception as e:
             return {
                 'status': 'unhealthy',
                 'error': str(e)
             }
+    
+    async def ahealth_check(self) -> Dict[str, Any]:
+        """Async variant of health_check"""
+        try:
+            response = await get_async_provider_client('ollama').get(f"{self.base_url}/api/tags", timeout=5)
+            return self._health_from_tags(response.status_code, response.json() if response.status_code == 200 else None)
+        except Exception as e:
+            return {
+                'status': 'unhealthy',
+                'error': str(e)
+            }
+    
+    def _health_from_tags(self, status_code: int, result: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        """Build the health status from an /api/tags response"""
+        if status_code != 200:
+            return {
+                'status': 'unhealthy',
+                'error': f"HTTP {status_code}"
+            }
+        
+        models = result.get('models', [])
+        model_available = any(
+            model.get('name') == self.model_name 
+            for model in models
+        )
+        
+        return {
+            'status': 'healthy',
+            'model_available': model_available,
+            'available_models': [m.get('name') for m in models]
+        }
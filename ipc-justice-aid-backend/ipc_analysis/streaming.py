@@ -0,0 +1,151 @@
+"""
+Helpers for streaming case analysis to clients as Server-Sent Events
+"""
+import asyncio
+import json
+import logging
+import threading
+from typing import Any, AsyncIterator, Dict, Iterable, List, Optional, Tuple, TypeVar
+
+logger = logging.getLogger(__name__)
+
+
+T = TypeVar('T')
+
+# Marks the end of iterate_in_thread's queue
+_END = object()
+
+# Array keys whose object entries are emitted as soon as they are complete
+SECTION_ARRAY_KEYS = ('sections_applied', 'applicable_ipc_sections', 'defensive_ipc_sections')
+
+
+class SectionStreamParser:
+    """
+    Incremental scanner that picks complete IPC section objects out of a
+    partially generated JSON document.
+
+    Text is fed in as it arrives from the model; each call to ``feed`` returns
+    the ``(array_key, section)`` pairs completed by that chunk.
+    """
+
+    def __init__(self, array_keys=SECTION_ARRAY_KEYS):
+        self.array_keys = set(array_keys)
+        self.buffer = ''
+        self._pos = 0
+        self._in_string = False
+        self._escape = False
+        self._string_start = 0
+        self._last_string = None
+        self._last_token = None
+        # Stack of (container_type, array_key, start_index)
+        self._stack: List[Tuple[str, Optional[str], int]] = []
+
+    def feed(self, chunk: str) -> List[Tuple[str, Dict[str, Any]]]:
+        """Consume a chunk of model output and return newly completed sections"""
+        self.buffer += chunk
+        completed = []
+
+        buffer = self.buffer
+        for index in range(self._pos, len(buffer)):
+            char = buffer[index]
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == '\\':
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+                    self._last_string = buffer[self._string_start:index]
+                    self._last_token = 'string'
+                continue
+
+            if char == '"':
+                self._in_string = True
+                self._string_start = index + 1
+            elif char == ':':
+                self._last_token = 'colon'
+            elif char == '[':
+                array_key = self._last_string if self._last_token == 'colon' else None
+                self._stack.append(('array', array_key, index))
+                self._last_token = 'open'
+            elif char == '{':
+                self._stack.append(('object', None, index))
+                self._last_token = 'open'
+            elif char in '}]':
+                if not self._stack:
+                    continue
+                container_type, _, start = self._stack.pop()
+                if container_type == 'object' and self._stack:
+                    parent_type, parent_key, _ = self._stack[-1]
+                    if parent_type == 'array' and parent_key in self.array_keys:
+                        section = self._load_section(buffer[start:index + 1])
+                        if section is not None:
+                            completed.append((parent_key, section))
+                self._last_token = 'close'
+            elif not char.isspace():
+                self._last_token = 'value'
+
+        self._pos = len(buffer)
+        return completed
+
+    def _load_section(self, text: str) -> Optional[Dict[str, Any]]:
+        try:
+            section = json.loads(text)
+        except json.JSONDecodeError:
+            logger.debug(f"Skipping unparseable streamed section: {text[:100]}")
+            return None
+        return section if isinstance(section, dict) else None
+
+
+def format_sse(event: str, data: Any) -> str:
+    """Format a Server-Sent Event"""
+    payload = json.dumps(data, default=str)
+    return f"event: {event}\ndata: {payload}\n\n"
+
+
+async def iterate_in_thread(iterable: Iterable[T]) -> AsyncIterator[T]:
+    """
+    Consume a blocking iterable in a worker thread, yielding its items on the event loop
+
+    Each item is handed over as soon as it is produced. Exceptions raised by
+    the iterable are re-raised here. If the consumer stops early (the client
+    disconnected), the iterable is closed once it produces its next item.
+    """
+    loop = asyncio.get_running_loop()
+    items = asyncio.Queue()
+    stopped = threading.Event()
+
+    def put(entry):
+        try:
+            loop.call_soon_threadsafe(items.put_nowait, entry)
+        except RuntimeError:
+            # The event loop has been closed
+            stopped.set()
+
+    def produce():
+        error = None
+        try:
+            for item in iterable:
+                if stopped.is_set():
+                    break
+                put((item, None))
+        except Exception as e:
+            error = e
+        finally:
+            close = getattr(iterable, 'close', None)
+            if close is not None:
+                close()
+            put((_END, error))
+
+    threading.Thread(target=produce, name='stream-producer', daemon=True).start()
+    try:
+        while True:
+            item, error = await items.get()
+            if item is _END:
+                if error is not None:
+                    raise error
+                return
+            yield item
+    finally:
+        stopped.set()
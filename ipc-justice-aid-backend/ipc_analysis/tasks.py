@@ -0,0 +1,38 @@
+from celery import shared_task
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task
+def run_bulk_analysis(job_id):
+    """Analyze every case in an uploaded bulk analysis file"""
+    from .bulk_analysis import BulkAnalysisRunner
+    from .models import BulkAnalysisJob
+    
+    try:
+        job = BulkAnalysisJob.objects.get(job_id=job_id)
+    except BulkAnalysisJob.DoesNotExist:
+        logger.error(f"Bulk analysis job {job_id} not found")
+        return f"Failed: job {job_id} not found"
+    
+    BulkAnalysisRunner(job).run()
+    return f"Bulk analysis {job_id} {job.status}: {job.succeeded_cases}/{job.total_cases} succeeded"
+
+
+@shared_task
+def keep_ollama_warm():
+    """Keep the Ollama model loaded during business hours"""
+    from .ollama_warmup import ollama_warmup_service
+    
+    if not ollama_warmup_service.enabled:
+        return "Ollama warm-up disabled"
+    
+    if not ollama_warmup_service.is_business_hours():
+        # Outside business hours the model is left to unload after keep_alive
+        return "Outside business hours, skipped"
+    
+    result = ollama_warmup_service.warm_up()
+    if not result['success']:
+        return f"Failed: {result['error']}"
+    return f"Ollama model {result['model']} warm (load {result['load_duration_ms']}ms)"
@@ -1,3 +1,69 @@
-from django.test import TestCase
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+from django.test import SimpleTestCase
+
+from .concurrency import ConcurrencyLimiter, DEFAULT_LIMITER_SETTINGS
+from .json_extraction import repair_truncated_json
+
+
+class RepairTruncatedJSONTests(SimpleTestCase):
+    def test_cut_off_enum_value_is_dropped(self):
+        repaired = repair_truncated_json(
+            '{"applicable_ipc_sections": [{"section_number": "379"}], "severity": "H'
+        )
+        self.assertEqual(repaired['applicable_ipc_sections'], [{'section_number': '379'}])
+        self.assertNotIn('severity', repaired)
+        self.assertTrue(repaired['partial'])
+
+    def test_cut_off_free_text_value_is_kept(self):
+        repaired = repair_truncated_json(
+            '{"sections_applied": [{"section_number": "379"}], "explanation": "The accused took'
+        )
+        self.assertEqual(repaired['explanation'], 'The accused took')
+
+    def test_array_cut_off_in_its_first_entry_is_closed_empty(self):
+        repaired = repair_truncated_json(
+            '{"defensive_ipc_sections": [{"section_number": "96"}], '
+            '"applicable_ipc_sections": [{"section_number": "2'
+        )
+        self.assertEqual(repaired['defensive_ipc_sections'], [{'section_number': '96'}])
+        self.assertEqual(repaired['applicable_ipc_sections'], [])
+
+    def test_array_keeps_its_complete_entries(self):
+        repaired = repair_truncated_json(
+            '{"applicable_ipc_sections": [{"section_number": "379"}, {"section_number": "4'
+        )
+        self.assertEqual(repaired['applicable_ipc_sections'], [{'section_number': '379'}])
+
+
+class ConcurrencySlotTests(SimpleTestCase):
+    def setUp(self):
+        self.limiter = ConcurrencyLimiter('test', dict(DEFAULT_LIMITER_SETTINGS))
+        patcher = mock.patch.object(self.limiter, 'acquire', return_value='token')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = mock.patch.object(self.limiter, 'release')
+        self.release = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def released_success(self):
+        token, latency_ms, success = self.release.call_args.args
+        return success
+
+    def test_ok_response_is_a_success(self):
+        with self.limiter.slot() as lease:
+            lease.received(SimpleNamespace(status_code=200))
+        self.assertTrue(self.released_success())
+
+    def test_error_response_checked_after_the_slot_is_a_failure(self):
+        for status_code in (429, 503):
+            with self.limiter.slot() as lease:
+                lease.received(SimpleNamespace(status_code=status_code))
+            self.assertFalse(self.released_success())
+
+    def test_exception_is_a_failure(self):
+        with self.assertRaises(ValueError):
+            with self.limiter.slot():
+                raise ValueError
+        self.assertFalse(self.released_success())
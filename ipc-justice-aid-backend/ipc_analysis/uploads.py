@@ -0,0 +1,85 @@
+"""
+Single-read access to uploaded files.
+
+Django keeps uploads up to FILE_UPLOAD_MAX_MEMORY_SIZE in a BytesIO and spools
+larger ones to a temporary file. Validation, image decoding and PDF parsing
+all read from that storage directly: in-memory uploads through their BytesIO,
+spooled ones through a read-only memory map of the temp file. A 50MB PDF is
+then never copied into a new buffer, and the OCR pool is handed the temp file
+path instead of the pickled file contents.
+"""
+import io
+import mmap
+import os
+from contextlib import contextmanager
+from typing import BinaryIO, Iterator, Union
+
+# What open_source accepts: file contents, a file path, or an open binary file
+Source = Union[bytes, bytearray, str, os.PathLike, BinaryIO]
+
+
+def upload_source(upload) -> Union[str, BinaryIO]:
+    """
+    Where to read an upload from without copying it
+
+    Args:
+        upload: Django UploadedFile, or any seekable binary file object
+
+    Returns:
+        The temp file path of a spooled upload, otherwise the file object
+    """
+    if hasattr(upload, 'temporary_file_path'):
+        return upload.temporary_file_path()
+    return getattr(upload, 'file', None) or upload
+
+
+def picklable_source(upload) -> Union[bytes, str]:
+    """
+    Upload source that can be sent to another process
+
+    Spooled uploads are sent as their temp file path, which stays valid until
+    the request finishes. In-memory uploads are small, so they are sent as
+    bytes (one copy).
+    """
+    source = upload_source(upload)
+    if isinstance(source, str):
+        return source
+    if hasattr(source, 'getvalue'):
+        return source.getvalue()
+    source.seek(0)
+    data = source.read()
+    source.seek(0)
+    return data
+
+
+@contextmanager
+def open_source(source: Source) -> Iterator[BinaryIO]:
+    """
+    Seekable binary stream over a source, without copying its contents
+
+    Files are memory-mapped read-only, bytes are wrapped in a BytesIO (which
+    shares the bytes object until written to), and open file objects are
+    rewound and used as they are. Anything opened from the stream must be read
+    before the block exits.
+    """
+    if isinstance(source, (bytes, bytearray)):
+        yield io.BytesIO(source)
+    elif isinstance(source, (str, os.PathLike)):
+        with open(source, 'rb') as file:
+            # Empty files cannot be mapped
+            if os.fstat(file.fileno()).st_size == 0:
+                yield file
+            else:
+                with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                    yield mapped
+    else:
+        source.seek(0)
+        try:
+            yield source
+        finally:
+            source.seek(0)
+
+
+def open_upload(upload):
+    """open_source for a Django UploadedFile"""
+    return open_source(upload_source(upload))
@@ -1,8 +1,9 @@
 from django.urls import path
 from .views import (
-    AnalyzeCaseView, LegalCaseListView, LegalAnalysisDetailView,
+    AnalyzeCaseView, StreamAnalyzeCaseView, BulkAnalysisJobView, BulkAnalysisJobStatusView,
+    BulkAnalysisJobResultsView, LegalCaseListView, LegalAnalysisDetailView,
     AnalysisHistoryView, IPCSectionListView, health_check,
-    ollama_health_check, user_stats, ExtractTextFromImageView,
+    ollama_health_check, quota_status, metrics, user_stats, ExtractTextFromImageView,
     DocumentSummarizerView
 )
 
@@ -11,6 +12,12 @@ app_name = 'ipc_analysis'
 urlpatterns = [
     # Main analysis endpoint
     path('analyze/', AnalyzeCaseView.as_view(), name='analyze_case'),
+    path('analyze/stream/', StreamAnalyzeCaseView.as_view(), name='analyze_case_stream'),
+    
+    # Bulk analysis of CSV/NDJSON uploads
+    path('bulk-analyze/', BulkAnalysisJobView.as_view(), name='bulk_analysis'),
+    path('bulk-analyze/<uuid:job_id>/', BulkAnalysisJobStatusView.as_view(), name='bulk_analysis_status'),
+    path('bulk-analyze/<uuid:job_id>/results/', BulkAnalysisJobResultsView.as_view(), name='bulk_analysis_results'),
     
     # OCR endpoint
     path('extract-text/', ExtractTextFromImageView.as_view(), name='extract_text_from_image'),
@@ -32,4 +39,8 @@ urlpatterns = [
     # Health checks
     path('health/', health_check, name='health_check'),
     path('ollama-health/', ollama_health_check, name='ollama_health'),
+    path('quota/', quota_status, name='quota_status'),
+    
+    # Prometheus scrape endpoint
+    path('metrics/', metrics, name='metrics'),
 ]
@@ -1,29 +1,52 @@
+from adrf.decorators import api_view as async_api_view
+from adrf.views import APIView as AsyncAPIView
+from asgiref.sync import sync_to_async
 from rest_framework import status, permissions
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from rest_framework.generics import ListCreateAPIView, RetrieveAPIView
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
 from django.db import transaction
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
+from django.shortcuts import get_object_or_404
+from django.urls import reverse
 from django.utils import timezone
+from django.utils.crypto import constant_time_compare
 
-from .models import LegalCase, LegalAnalysis, AnalysisHistory, IPCSection
+from .models import LegalCase, LegalAnalysis, AnalysisHistory, IPCSection, BulkAnalysisJob
 from .serializers import (
     LegalCaseSerializer, LegalAnalysisSerializer, AnalysisHistorySerializer,
-    CaseAnalysisRequestSerializer, CaseAnalysisResponseSerializer, IPCSectionSerializer
+    CaseAnalysisRequestSerializer, CaseAnalysisResponseSerializer, IPCSectionSerializer,
+    BulkAnalysisJobSerializer
 )
 from .services import OllamaService
 from .adaptive_service import adaptive_analysis_service
 from .ocr_service import OCRService
-from .document_summarizer_service import DocumentSummarizerService
+from .document_summarizer_service import document_summarizer_service
+from .http_clients import async_provider_clients, provider_clients
+from .circuit_breaker import circuit_breakers
+from .concurrency import BackendOverloadedError, backend_limiters
+from .quota import provider_quotas
+from .metrics import provider_metrics
+from .ollama_warmup import ollama_warmup_service
+from .analysis_schema import parse_failures
+from .streaming import format_sse, iterate_in_thread
+from .bulk_analysis import detect_input_format, iter_bulk_rows
+from .tasks import run_bulk_analysis
 
 
-class AnalyzeCaseView(APIView):
+class AnalyzeCaseView(AsyncAPIView):
     """
     Main endpoint for analyzing legal cases using adaptive AI service (Ollama/HuggingFace)
+    
+    The handler is async: under the ASGI server the worker keeps serving
+    other requests while the provider call is in flight.
     """
     permission_classes = [permissions.IsAuthenticated]
     
-    def post(self, request):
+    async def post(self, request):
         serializer = CaseAnalysisRequestSerializer(data=request.data)
         
         if not serializer.is_valid():
@@ -35,63 +58,73 @@ class AnalyzeCaseView(APIView):
         case_description = serializer.validated_data['case_description']
         
         try:
-            with transaction.atomic():
-                # Create the legal case
-                legal_case = LegalCase.objects.create(
-                    user=request.user,
-                    case_description=case_description
-                )
-                
-                # Call adaptive analysis service (Ollama for dev, HuggingFace for prod)
-                result = adaptive_analysis_service.analyze_case(case_description)
-                
-                if not result['success']:
-                    return Response(
-                        {
-                            'error': 'Analysis failed',
-                            'details': result['error'],
-                            'response_time_ms': result['response_time_ms']
-                        },
-                        status=status.HTTP_503_SERVICE_UNAVAILABLE
-                    )
-                
-                # Create the analysis record
-                analysis = LegalAnalysis.objects.create(
-                    legal_case=legal_case,
-                    analysis_json=result['analysis']
-                )
-                
-                # Create history record
-                AnalysisHistory.objects.create(
-                    user=request.user,
-                    case_description=case_description,
-                    ollama_response=result['analysis'],
-                    response_time_ms=result['response_time_ms']
+            # Call adaptive analysis service (Ollama for dev, HuggingFace for prod)
+            result = await adaptive_analysis_service.aanalyze_case(case_description)
+            
+            if not result['success']:
+                return Response(
+                    {
+                        'error': 'Analysis failed',
+                        'details': result['error'],
+                        'response_time_ms': result['response_time_ms']
+                    },
+                    status=status.HTTP_503_SERVICE_UNAVAILABLE
                 )
+            
+            response_data = await sync_to_async(self._save_analysis)(request.user, case_description, result)
+            
+            response_serializer = CaseAnalysisResponseSerializer(response_data)
+            return Response(response_serializer.data, status=status.HTTP_201_CREATED)
                 
-                # Link relevant IPC sections
-                self._link_ipc_sections(analysis, result['analysis'])
-                
-                # Prepare response
-                response_data = {
-                    'case_id': legal_case.id,
-                    'analysis_id': analysis.id,
-                    'case_description': case_description,
-                    'sections_applied': analysis.get_sections_applied(),
-                    'explanation': analysis.get_explanation(),
-                    'analyzed_at': analysis.analyzed_at,
-                    'response_time_ms': result['response_time_ms']
-                }
-                
-                response_serializer = CaseAnalysisResponseSerializer(response_data)
-                return Response(response_serializer.data, status=status.HTTP_201_CREATED)
-                
+        except BackendOverloadedError as e:
+            # Nothing has been saved yet
+            return Response(
+                e.response_data(),
+                status=e.status_code,
+                headers={'Retry-After': str(e.retry_after)}
+            )
         except Exception as e:
             return Response(
                 {'error': 'Internal server error', 'details': str(e)},
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
     
+    def _save_analysis(self, user, case_description, result):
+        """Store the case, its analysis and the history record; returns the response data"""
+        with transaction.atomic():
+            # Create the legal case
+            legal_case = LegalCase.objects.create(
+                user=user,
+                case_description=case_description
+            )
+            
+            # Create the analysis record
+            analysis = LegalAnalysis.objects.create(
+                legal_case=legal_case,
+                analysis_json=result['analysis']
+            )
+            
+            # Create history record
+            AnalysisHistory.objects.create(
+                user=user,
+                case_description=case_description,
+                ollama_response=result['analysis'],
+                response_time_ms=result['response_time_ms']
+            )
+            
+            # Link relevant IPC sections
+            self._link_ipc_sections(analysis, result['analysis'])
+        
+        return {
+            'case_id': legal_case.id,
+            'analysis_id': analysis.id,
+            'case_description': case_description,
+            'sections_applied': analysis.get_sections_applied(),
+            'explanation': analysis.get_explanation(),
+            'analyzed_at': analysis.analyzed_at,
+            'response_time_ms': result['response_time_ms']
+        }
+    
     def _link_ipc_sections(self, analysis, analysis_json):
         """Link analysis to relevant IPC sections"""
         if 'sections_applied' in analysis_json:
@@ -109,6 +142,227 @@ class AnalyzeCaseView(APIView):
                     analysis.primary_sections.add(ipc_section)
 
 
+class StreamAnalyzeCaseView(AnalyzeCaseView):
+    """
+    Streaming variant of AnalyzeCaseView.
+    
+    Relays the analysis as Server-Sent Events: a 'case' event with the new
+    case id, a 'preliminary' event with the local classifier's guess when it
+    is enabled, one 'section' event per IPC section as soon as the model has
+    produced it, and a final 'done' (or 'error') event with the full result.
+    Under ASGI the body is an async generator fed from a worker thread, since
+    Django reads a sync streaming body to the end before sending any of it.
+    """
+    
+    def post(self, request):
+        serializer = CaseAnalysisRequestSerializer(data=request.data)
+        
+        if not serializer.is_valid():
+            return Response(
+                {'error': 'Invalid input', 'details': serializer.errors},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        case_description = serializer.validated_data['case_description']
+        
+        # Headers go out before the analysis starts, so shed load up front
+        limiter = backend_limiters.get(adaptive_analysis_service.service_priority['primary'])
+        if limiter.is_saturated():
+            error = BackendOverloadedError(limiter.backend, limiter.retry_after, 'queue_full')
+            return Response(
+                error.response_data(),
+                status=error.status_code,
+                headers={'Retry-After': str(error.retry_after)}
+            )
+        
+        legal_case = LegalCase.objects.create(
+            user=request.user,
+            case_description=case_description
+        )
+        
+        if isinstance(request._request, ASGIRequest):
+            events = self._aevent_stream(request.user, legal_case, case_description)
+        else:
+            events = self._event_stream(request.user, legal_case, case_description)
+        
+        response = StreamingHttpResponse(events, content_type='text/event-stream')
+        response['Cache-Control'] = 'no-cache'
+        response['X-Accel-Buffering'] = 'no'  # Disable proxy buffering (nginx)
+        return response
+    
+    def _event_stream(self, user, legal_case, case_description):
+        yield format_sse('case', {'case_id': legal_case.id})
+        
+        try:
+            for event, data in adaptive_analysis_service.stream_analysis(case_description):
+                if event != 'done':
+                    yield format_sse(event, data)
+                else:
+                    yield self._done_event(user, legal_case, case_description, data)
+                
+        except BackendOverloadedError as e:
+            yield format_sse('error', e.response_data())
+        except Exception as e:
+            yield format_sse('error', {'error': 'Internal server error', 'details': str(e)})
+    
+    async def _aevent_stream(self, user, legal_case, case_description):
+        """Async variant of _event_stream; the analysis and the DB writes run in threads"""
+        yield format_sse('case', {'case_id': legal_case.id})
+        
+        try:
+            events = iterate_in_thread(adaptive_analysis_service.stream_analysis(case_description))
+            async for event, data in events:
+                if event != 'done':
+                    yield format_sse(event, data)
+                else:
+                    yield await sync_to_async(self._done_event)(user, legal_case, case_description, data)
+                
+        except BackendOverloadedError as e:
+            yield format_sse('error', e.response_data())
+        except Exception as e:
+            yield format_sse('error', {'error': 'Internal server error', 'details': str(e)})
+    
+    def _done_event(self, user, legal_case, case_description, data) -> str:
+        """Store a finished analysis and format the final 'done' or 'error' event"""
+        if not data['success']:
+            return format_sse('error', {
+                'error': 'Analysis failed',
+                'details': data['error'],
+                'response_time_ms': data['response_time_ms']
+            })
+        
+        with transaction.atomic():
+            analysis = LegalAnalysis.objects.create(
+                legal_case=legal_case,
+                analysis_json=data['analysis']
+            )
+            AnalysisHistory.objects.create(
+                user=user,
+                case_description=case_description,
+                ollama_response=data['analysis'],
+                response_time_ms=data['response_time_ms']
+            )
+            self._link_ipc_sections(analysis, data['analysis'])
+        
+        response_data = {
+            'case_id': legal_case.id,
+            'analysis_id': analysis.id,
+            'case_description': case_description,
+            'sections_applied': analysis.get_sections_applied(),
+            'explanation': analysis.get_explanation(),
+            'analyzed_at': analysis.analyzed_at,
+            'response_time_ms': data['response_time_ms']
+        }
+        return format_sse('done', CaseAnalysisResponseSerializer(response_data).data)
+
+
+class BulkAnalysisJobView(APIView):
+    """
+    Upload a CSV or NDJSON file of case descriptions for bulk analysis.
+    
+    CSV files need a 'case_description' (or 'description') column; NDJSON
+    files need one object per line with a 'case_description' key. An optional
+    'reference' column/key is echoed back in the results.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+    
+    def post(self, request):
+        bulk_settings = settings.BULK_ANALYSIS_SETTINGS
+        
+        if 'file' not in request.FILES:
+            return Response(
+                {'error': 'No file provided'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        upload = request.FILES['file']
+        input_format = detect_input_format(upload.name, request.data.get('format'))
+        if input_format is None:
+            return Response(
+                {'error': 'Unsupported file type. Upload a .csv or .ndjson file'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        if upload.size > bulk_settings['MAX_FILE_SIZE']:
+            return Response(
+                {'error': f"File too large. Maximum size is {bulk_settings['MAX_FILE_SIZE'] // (1024 * 1024)}MB"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        # Parse once up front so malformed files are rejected before queueing
+        try:
+            total_cases = sum(1 for _ in iter_bulk_rows(upload, input_format))
+        except ValueError as e:
+            return Response(
+                {'error': 'Invalid file', 'details': str(e)},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        if total_cases == 0:
+            return Response(
+                {'error': 'File contains no cases'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if total_cases > bulk_settings['MAX_ROWS']:
+            return Response(
+                {'error': f"Too many cases. Maximum is {bulk_settings['MAX_ROWS']} per file"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        upload.seek(0)
+        job = BulkAnalysisJob.objects.create(
+            user=request.user,
+            input_file=upload,
+            input_format=input_format,
+            total_cases=total_cases
+        )
+        transaction.on_commit(lambda: run_bulk_analysis.delay(str(job.job_id)))
+        
+        response_data = BulkAnalysisJobSerializer(job).data
+        response_data['status_url'] = request.build_absolute_uri(
+            reverse('ipc_analysis:bulk_analysis_status', args=[job.job_id])
+        )
+        return Response(response_data, status=status.HTTP_202_ACCEPTED)
+
+
+class BulkAnalysisJobStatusView(APIView):
+    """Progress of a bulk analysis job"""
+    permission_classes = [permissions.IsAuthenticated]
+    
+    def get(self, request, job_id):
+        job = get_object_or_404(BulkAnalysisJob, job_id=job_id, user=request.user)
+        
+        response_data = BulkAnalysisJobSerializer(job).data
+        response_data['results_url'] = None
+        if job.results_file:
+            response_data['results_url'] = request.build_absolute_uri(
+                reverse('ipc_analysis:bulk_analysis_results', args=[job.job_id])
+            )
+        return Response(response_data)
+
+
+class BulkAnalysisJobResultsView(APIView):
+    """Download the NDJSON results of a bulk analysis job"""
+    permission_classes = [permissions.IsAuthenticated]
+    
+    def get(self, request, job_id):
+        job = get_object_or_404(BulkAnalysisJob, job_id=job_id, user=request.user)
+        
+        if not job.results_file or job.status in ('queued', 'running'):
+            return Response(
+                {'error': 'Results are not available yet', 'status': job.status},
+                status=status.HTTP_409_CONFLICT
+            )
+        
+        # Streamed from disk in chunks rather than loaded into memory
+        return FileResponse(
+            job.results_file.open('rb'),
+            as_attachment=True,
+            filename=f"bulk-analysis-{job.job_id}.ndjson",
+            content_type='application/x-ndjson'
+        )
+
+
 class LegalCaseListView(ListCreateAPIView):
     """
     List and create legal cases
@@ -154,9 +408,9 @@ class IPCSectionListView(ListCreateAPIView):
     permission_classes = [permissions.AllowAny]
 
 
-@api_view(['GET'])
+@async_api_view(['GET'])
 @permission_classes([permissions.AllowAny])
-def health_check(request):
+async def health_check(request):
     """Health check endpoint"""
     return Response({
         'status': 'ok',
@@ -165,20 +419,59 @@ def health_check(request):
     })
 
 
-@api_view(['GET'])
+@async_api_view(['GET'])
 @permission_classes([permissions.IsAuthenticated])
-def ollama_health_check(request):
+async def ollama_health_check(request):
     """Check AI analysis service health (Ollama/HuggingFace)"""
-    health_status = adaptive_analysis_service.health_check()
-    service_info = adaptive_analysis_service.get_service_info()
+    health_status = await adaptive_analysis_service.ahealth_check()
+    
+    # The stats below are read from Redis
+    stats = await sync_to_async(_get_service_stats, thread_sensitive=False)()
     
     return Response({
         'analysis_service': health_status,
-        'service_info': service_info,
+        **stats,
+        'async_http_clients': async_provider_clients.get_metrics(),
+        'timestamp': timezone.now()
+    })
+
+
+def _get_service_stats():
+    return {
+        'service_info': adaptive_analysis_service.get_service_info(),
+        'http_clients': provider_clients.get_metrics(),
+        'circuit_breakers': circuit_breakers.get_states(),
+        'concurrency': backend_limiters.get_states(),
+        'quotas': provider_quotas.get_states(),
+        'ollama_model_loads': ollama_warmup_service.get_stats(),
+        'parse_failures': parse_failures.get_stats(),
+    }
+
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+def quota_status(request):
+    """Remaining request and token quota of the hosted LLM providers"""
+    return Response({
+        'quotas': {'gemini': provider_quotas.get('gemini').get_state()},
         'timestamp': timezone.now()
     })
 
 
+def metrics(request):
+    """Provider latency, token and retry metrics in the Prometheus text format"""
+    if not provider_metrics.available:
+        return HttpResponse("prometheus_client is not installed\n", status=503, content_type='text/plain')
+    
+    # Scrapers authenticate with a static bearer token when one is configured
+    token = getattr(settings, 'METRICS_AUTH_TOKEN', '')
+    if token and not constant_time_compare(request.headers.get('Authorization', ''), f"Bearer {token}"):
+        return HttpResponse(status=401)
+    
+    body, content_type = provider_metrics.render()
+    return HttpResponse(body, content_type=content_type)
+
+
 @api_view(['GET'])
 @permission_classes([permissions.IsAuthenticated])
 def user_stats(request):
@@ -257,6 +550,12 @@ class ExtractTextFromImageView(APIView):
                 }
             }, status=status.HTTP_200_OK)
             
+        except BackendOverloadedError as e:
+            return Response(
+                e.response_data(),
+                status=e.status_code,
+                headers={'Retry-After': str(e.retry_after)}
+            )
         except Exception as e:
             return Response(
                 {
@@ -297,10 +596,8 @@ class DocumentSummarizerView(APIView):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        summarizer_service = DocumentSummarizerService()
-        
         # Validate document file
-        validation_result = summarizer_service.validate_document_file(document_file, file_type)
+        validation_result = document_summarizer_service.validate_document_file(document_file, file_type)
         if not validation_result['valid']:
             return Response(
                 {'error': validation_result['error']},
@@ -309,7 +606,7 @@ class DocumentSummarizerView(APIView):
         
         try:
             # Summarize document
-            summary_result = summarizer_service.summarize_document(document_file, file_type)
+            summary_result = document_summarizer_service.summarize_document(document_file, file_type)
             
             if not summary_result['success']:
                 return Response(
@@ -332,6 +629,12 @@ class DocumentSummarizerView(APIView):
                 'extracted_text': summary_result['extracted_text']
             }, status=status.HTTP_200_OK)
             
+        except BackendOverloadedError as e:
+            return Response(
+                e.response_data(),
+                status=e.status_code,
+                headers={'Retry-After': str(e.retry_after)}
+            )
         except Exception as e:
             return Response(
                 {
@@ -0,0 +1,15 @@
+from django.middleware.gzip import GZipMiddleware as DjangoGZipMiddleware
+
+
+class GZipMiddleware(DjangoGZipMiddleware):
+    """
+    GZip middleware that leaves Server-Sent Event streams alone.
+
+    Gzip buffers small writes inside the compressor, which would hold back
+    streamed analysis events until enough output had accumulated.
+    """
+
+    def process_response(self, request, response):
+        if response.get('Content-Type', '').startswith('text/event-stream'):
+            return response
+        return super().process_response(request, response)
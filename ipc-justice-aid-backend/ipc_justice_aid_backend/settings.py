@@ -448,7 +448,7 @@ if INDIA_SPECIFIC_SETTINGS['MOBILE_NETWORK_OPTIMIZATION']:
     }
     
     # Enable compression for mobile networks
-    MIDDLEWARE.insert(1, 'django.middleware.gzip.GZipMiddleware')
+    MIDDLEWARE.insert(1, 'ipc_justice_aid_backend.middleware.GZipMiddleware')
 
 # Low bandwidth mode for rural areas
 if INDIA_SPECIFIC_SETTINGS['LOW_BANDWIDTH_MODE']:
@@ -465,6 +465,8 @@ OLLAMA_SETTINGS = {
     'MODEL_NAME': config('OLLAMA_MODEL_NAME', default='Anupam/IPC-Helper:latest'),
     'TIMEOUT': config('OLLAMA_TIMEOUT', default=30, cast=int),
     'MAX_RETRIES': config('OLLAMA_MAX_RETRIES', default=3, cast=int),
+    # How long Ollama keeps the model loaded after a request ('30m', '2h', or seconds; -1 = forever)
+    'KEEP_ALIVE': config('OLLAMA_KEEP_ALIVE', default='30m'),
 }
 
 # Add Ollama settings as direct attributes for easier access
@@ -472,6 +474,42 @@ OLLAMA_BASE_URL = OLLAMA_SETTINGS['BASE_URL']
 OLLAMA_MODEL_NAME = OLLAMA_SETTINGS['MODEL_NAME']
 OLLAMA_TIMEOUT = OLLAMA_SETTINGS['TIMEOUT']
 OLLAMA_MAX_RETRIES = OLLAMA_SETTINGS['MAX_RETRIES']
+OLLAMA_KEEP_ALIVE = OLLAMA_SETTINGS['KEEP_ALIVE']
+
+# Model warm-up: loaded at startup (manage.py warm_ollama) and kept resident
+# during business hours by the keep-ollama-warm beat task. INTERVAL must be
+# shorter than OLLAMA_KEEP_ALIVE.
+OLLAMA_WARMUP_SETTINGS = {
+    'ENABLED': config('OLLAMA_WARMUP_ENABLED', default=True, cast=bool),
+    'INTERVAL': config('OLLAMA_WARMUP_INTERVAL', default=600, cast=int),  # 10 minutes
+    'TIMEOUT': 300,
+    'BUSINESS_HOURS_START': config('OLLAMA_BUSINESS_HOURS_START', default='09:00'),
+    'BUSINESS_HOURS_END': config('OLLAMA_BUSINESS_HOURS_END', default='20:00'),
+    'BUSINESS_DAYS': [0, 1, 2, 3, 4, 5],  # Monday to Saturday
+    'COLD_LOAD_THRESHOLD_MS': 1000,
+}
+
+# Structured IPC corpus used to fill in section details server-side
+# (ipc_analysis.ipc_catalog). It lives in the frontend tree, which is outside
+# the backend Docker context, so containers must mount it and set the path.
+IPC_CORPUS_PATH = config('IPC_CORPUS_PATH', default=str(BASE_DIR.parent / 'next-frontend' / 'ipc.json'))
+
+# 'full' asks Ollama for the complete analysis; 'compact' asks only for
+# section numbers and reasons and fills the rest from the IPC corpus
+IPC_PROMPT_MODE = config('IPC_PROMPT_MODE', default='full')
+
+# BM25 retrieval over the IPC corpus (ipc_analysis.ipc_retrieval): the TOP_K
+# best matching sections are added to the analysis prompts as short excerpts
+IPC_RETRIEVAL_SETTINGS = {
+    'ENABLED': config('IPC_RETRIEVAL_ENABLED', default=True, cast=bool),
+    'TOP_K': config('IPC_RETRIEVAL_TOP_K', default=8, cast=int),
+    'EXCERPT_CHARS': 240,
+}
+
+# Constrain LLM output to the analysis JSON schema (ipc_analysis.analysis_schema):
+# Ollama 'format' and Gemini responseSchema. Disable to compare parse failure
+# rates against free-form output.
+LLM_STRUCTURED_OUTPUT = config('LLM_STRUCTURED_OUTPUT', default=True, cast=bool)
 
 # Google Gemini settings for production deployment
 GEMINI_SETTINGS = {
@@ -479,6 +517,8 @@ GEMINI_SETTINGS = {
     'MODEL': config('GEMINI_MODEL', default='gemini-1.5-flash'),
     'TIMEOUT': config('GEMINI_TIMEOUT', default=60, cast=int),
     'MAX_RETRIES': config('GEMINI_MAX_RETRIES', default=3, cast=int),
+    # Point at loadtest/fake_llm_server.py for load tests
+    'API_BASE_URL': config('GEMINI_API_BASE_URL', default='https://generativelanguage.googleapis.com/v1beta'),
 }
 
 # Add Gemini settings as direct attributes for easier access
@@ -486,6 +526,86 @@ GEMINI_API_KEY = GEMINI_SETTINGS['API_KEY']
 GEMINI_MODEL = GEMINI_SETTINGS['MODEL']
 GEMINI_TIMEOUT = GEMINI_SETTINGS['TIMEOUT']
 GEMINI_MAX_RETRIES = GEMINI_SETTINGS['MAX_RETRIES']
+GEMINI_API_BASE_URL = GEMINI_SETTINGS['API_BASE_URL']
+
+# Pooled HTTP clients for the LLM providers (ipc_analysis.http_clients).
+# DEFAULT applies to every provider; per-provider entries override it.
+# TIMEOUT is only used when a call does not pass its own read timeout.
+LLM_HTTP_CLIENT_SETTINGS = {
+    'DEFAULT': {
+        'POOL_CONNECTIONS': config('LLM_HTTP_POOL_CONNECTIONS', default=4, cast=int),
+        'POOL_MAXSIZE': config('LLM_HTTP_POOL_MAXSIZE', default=16, cast=int),
+        'CONNECT_TIMEOUT': config('LLM_HTTP_CONNECT_TIMEOUT', default=5, cast=int),
+        'CONNECT_RETRIES': config('LLM_HTTP_CONNECT_RETRIES', default=2, cast=int),
+        'BACKOFF_FACTOR': 0.5,
+    },
+    'ollama': {
+        'TIMEOUT': OLLAMA_TIMEOUT,
+        'CONNECT_TIMEOUT': config('OLLAMA_CONNECT_TIMEOUT', default=3, cast=int),
+    },
+    'gemini': {
+        'TIMEOUT': GEMINI_TIMEOUT,
+    },
+    'huggingface': {
+        'TIMEOUT': config('HUGGINGFACE_TIMEOUT', default=60, cast=int),
+    },
+}
+
+# Circuit breakers for the LLM providers, state shared across workers via CACHES['default']
+CIRCUIT_BREAKER_SETTINGS = {
+    'DEFAULT': {
+        'FAILURE_THRESHOLD': config('CIRCUIT_BREAKER_FAILURE_THRESHOLD', default=5, cast=int),
+        'RECOVERY_TIMEOUT': config('CIRCUIT_BREAKER_RECOVERY_TIMEOUT', default=30, cast=int),
+    },
+    'ollama': {
+        'PROBE_TIMEOUT': OLLAMA_TIMEOUT * OLLAMA_MAX_RETRIES + 30,
+    },
+    'gemini': {
+        'PROBE_TIMEOUT': GEMINI_TIMEOUT * GEMINI_MAX_RETRIES + 30,
+    },
+}
+
+# Admission control per LLM backend - a Redis-backed semaphore whose limit
+# adapts (AIMD) between MIN_LIMIT and MAX_LIMIT based on TARGET_LATENCY_MS.
+# Requests wait up to QUEUE_TIMEOUT seconds in a queue of at most MAX_QUEUE
+# before the API answers 429/503 with Retry-After.
+LLM_CONCURRENCY_SETTINGS = {
+    'DEFAULT': {
+        'ENABLED': config('LLM_CONCURRENCY_LIMIT_ENABLED', default=True, cast=bool),
+        'QUEUE_TIMEOUT': config('LLM_CONCURRENCY_QUEUE_TIMEOUT', default=30, cast=int),
+    },
+    'ollama': {
+        # A single Ollama instance serves generations mostly serially
+        'INITIAL_LIMIT': config('OLLAMA_CONCURRENCY_LIMIT', default=2, cast=int),
+        'MAX_LIMIT': config('OLLAMA_MAX_CONCURRENCY', default=4, cast=int),
+        'MAX_QUEUE': config('OLLAMA_MAX_QUEUE', default=8, cast=int),
+        'TARGET_LATENCY_MS': OLLAMA_TIMEOUT * 1000 // 2,
+        'LEASE_TIMEOUT': OLLAMA_TIMEOUT + 30,
+        'RETRY_AFTER': 15,
+    },
+    'gemini': {
+        'INITIAL_LIMIT': config('GEMINI_CONCURRENCY_LIMIT', default=8, cast=int),
+        'MAX_LIMIT': config('GEMINI_MAX_CONCURRENCY', default=32, cast=int),
+        'MAX_QUEUE': config('GEMINI_MAX_QUEUE', default=32, cast=int),
+        'TARGET_LATENCY_MS': GEMINI_TIMEOUT * 1000 // 2,
+        'LEASE_TIMEOUT': GEMINI_TIMEOUT + 30,
+        'RETRY_AFTER': 5,
+    },
+}
+
+# Cluster-wide provider quotas (ipc_analysis.quota): Redis token buckets for
+# requests and tokens per minute, reserved before every call. Set these to
+# the project's Gemini quota.
+LLM_QUOTA_SETTINGS = {
+    'DEFAULT': {
+        'ENABLED': config('LLM_QUOTA_ENABLED', default=True, cast=bool),
+        'MAX_WAIT': config('LLM_QUOTA_MAX_WAIT', default=30, cast=int),
+    },
+    'gemini': {
+        'REQUESTS_PER_MINUTE': config('GEMINI_REQUESTS_PER_MINUTE', default=15, cast=int),
+        'TOKENS_PER_MINUTE': config('GEMINI_TOKENS_PER_MINUTE', default=1000000, cast=int),
+    },
+}
 
 # Analysis service configuration
 # Options: 'auto', 'ollama', 'gemini'
@@ -494,6 +614,76 @@ GEMINI_MAX_RETRIES = GEMINI_SETTINGS['MAX_RETRIES']
 #   - Development: ollama
 ANALYSIS_ENVIRONMENT = config('ANALYSIS_ENVIRONMENT', default='auto')
 
+# Hedged requests - when Gemini is primary, also fire Ollama if Gemini has not
+# answered within PERCENTILE of its recent latencies and use the first success
+ANALYSIS_HEDGING_SETTINGS = {
+    'ENABLED': config('ANALYSIS_HEDGING_ENABLED', default=False, cast=bool),
+    'PERCENTILE': config('ANALYSIS_HEDGING_PERCENTILE', default=95, cast=int),
+    'DEFAULT_DELAY_MS': config('ANALYSIS_HEDGING_DEFAULT_DELAY_MS', default=10000, cast=int),  # until enough samples
+    'MIN_DELAY_MS': 1000,
+    'MIN_SAMPLES': 20,
+    'WINDOW_SIZE': 200,
+    'MAX_WORKERS': 8,
+}
+
+# Analysis result cache - stores LLM analyses in CACHES['default'] keyed on
+# the normalized description, provider, model and prompt version
+ANALYSIS_CACHE_SETTINGS = {
+    'ENABLED': config('ANALYSIS_CACHE_ENABLED', default=True, cast=bool),
+    'TTL': config('ANALYSIS_CACHE_TTL', default=60 * 60 * 24 * 7, cast=int),  # 7 days
+}
+
+# Coalescing of identical in-flight analysis requests across workers
+ANALYSIS_COALESCING_SETTINGS = {
+    'ENABLED': config('ANALYSIS_COALESCING_ENABLED', default=True, cast=bool),
+    # Should exceed the longest analysis including provider retries and fallback
+    'LOCK_TIMEOUT': config('ANALYSIS_COALESCING_LOCK_TIMEOUT', default=300, cast=int),
+    'WAIT_TIMEOUT': config('ANALYSIS_COALESCING_WAIT_TIMEOUT', default=300, cast=int),
+    'RESULT_TTL': 60,
+}
+
+# Local IPC classifier trained by `manage.py train_ipc_classifier`
+# MODE: 'off', 'preliminary' (shown while the LLM works) or 'full' (answers on
+# its own when its confidence reaches FULL_ANSWER_CONFIDENCE)
+LOCAL_CLASSIFIER_SETTINGS = {
+    'MODE': config('LOCAL_CLASSIFIER_MODE', default='off'),
+    'MODEL_PATH': config('LOCAL_CLASSIFIER_MODEL_PATH', default=str(BASE_DIR / 'ml_models' / 'ipc_classifier.npz')),
+    'THRESHOLD': 0.5,
+    'FULL_ANSWER_CONFIDENCE': config('LOCAL_CLASSIFIER_FULL_ANSWER_CONFIDENCE', default=0.9, cast=float),
+    'MAX_SECTIONS': 5,
+}
+
+# OCR engine used by OCRService (ipc_analysis.ocr_engine)
+# BACKEND: 'auto' (tesserocr when installed, else pytesseract), 'tesserocr'
+# (warm in-process Tesseract handles, reused across requests) or 'pytesseract'
+# (one tesseract subprocess per call)
+OCR_SETTINGS = {
+    'BACKEND': config('OCR_BACKEND', default='auto'),
+    'LANGUAGE': config('OCR_LANGUAGE', default='eng'),
+    'TESSDATA_PATH': config('OCR_TESSDATA_PATH', default=''),  # empty: Tesseract's default
+    # In-process handles per worker process; each holds its own model (~30MB for eng)
+    'ENGINE_POOL_SIZE': config('OCR_ENGINE_POOL_SIZE', default=2, cast=int),
+    # Longest side photos are decoded to before OCR: about 300 DPI for an A4
+    # page, which suits Tesseract; 0 keeps the full resolution
+    'MAX_DIMENSION': config('OCR_MAX_DIMENSION', default=3508, cast=int),
+    # Process pool running OCR off the request thread (ipc_analysis.ocr_pool).
+    # POOL_WORKERS 0 divides the host's physical cores between WEB_CONCURRENCY
+    # web workers, each owning its own pool.
+    'POOL_ENABLED': config('OCR_POOL_ENABLED', default=True, cast=bool),
+    'POOL_WORKERS': config('OCR_POOL_WORKERS', default=0, cast=int),
+    'WEB_WORKERS': config('WEB_CONCURRENCY', default=1, cast=int),
+    'POOL_MAX_QUEUE': config('OCR_POOL_MAX_QUEUE', default=8, cast=int),
+    'POOL_TIMEOUT': config('OCR_POOL_TIMEOUT', default=60, cast=int),
+    'THREADS_PER_JOB': 1,  # OMP_THREAD_LIMIT / cv2.setNumThreads in each OCR process
+    'RETRY_AFTER': 10,
+}
+
+# Prometheus metrics endpoint (ipc_analysis.metrics, needs prometheus_client).
+# With several worker processes also set PROMETHEUS_MULTIPROC_DIR in the
+# environment; when METRICS_AUTH_TOKEN is set scrapers must send it as a
+# bearer token.
+METRICS_AUTH_TOKEN = config('METRICS_AUTH_TOKEN', default='')
+
 # Legal analysis settings
 LEGAL_ANALYSIS_SETTINGS = {
     'MAX_CASE_DESCRIPTION_LENGTH': config('MAX_CASE_DESCRIPTION_LENGTH', default=5000, cast=int),
@@ -517,6 +707,7 @@ CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
 CELERY_TIMEZONE = TIME_ZONE
 CELERY_BEAT_SCHEDULER = 'django_celery_beat.schedulers:DatabaseScheduler'
+CELERY_TASK_TRACK_STARTED = True
 
 # Celery Beat Schedule
 CELERY_BEAT_SCHEDULE = {
@@ -536,6 +727,29 @@ CELERY_BEAT_SCHEDULE = {
         'task': 'leads.tasks.update_lead_analytics',
         'schedule': 1800.0,  # Every 30 minutes
     },
+    'keep-ollama-warm': {
+        'task': 'ipc_analysis.tasks.keep_ollama_warm',
+        'schedule': float(OLLAMA_WARMUP_SETTINGS['INTERVAL']),
+    },
+}
+
+# Job-based citizen case analysis (leads.tasks.analyze_citizen_case)
+CITIZEN_ANALYSIS_JOB_SETTINGS = {
+    # Upper bound for ?wait= on the job status endpoint; keeps long-polls
+    # from pinning a sync worker for the whole analysis
+    'MAX_LONG_POLL_SECONDS': config('CITIZEN_ANALYSIS_MAX_LONG_POLL_SECONDS', default=25, cast=int),
+    # Retries while the Ollama concurrency limiter is shedding load
+    'MAX_OVERLOAD_RETRIES': config('CITIZEN_ANALYSIS_MAX_OVERLOAD_RETRIES', default=10, cast=int),
+}
+
+# Bulk analysis of uploaded CSV/NDJSON files (runs in Celery)
+BULK_ANALYSIS_SETTINGS = {
+    'MAX_FILE_SIZE': config('BULK_ANALYSIS_MAX_FILE_SIZE', default=5 * 1024 * 1024, cast=int),  # 5MB
+    'MAX_ROWS': config('BULK_ANALYSIS_MAX_ROWS', default=1000, cast=int),
+    # Analyses in flight per job; keep within the backends' concurrency limits
+    'MAX_PARALLELISM': config('BULK_ANALYSIS_MAX_PARALLELISM', default=4, cast=int),
+    'BATCH_SIZE': 25,
+    'MAX_ROW_RETRIES': 3,
 }
 
 # Payment Gateway Settings
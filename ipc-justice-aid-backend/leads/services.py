@@ -1,11 +1,28 @@
-import requests
+import asyncio
 import json
 import logging
 from datetime import datetime, timedelta
+from asgiref.sync import sync_to_async
 from django.conf import settings
 from django.utils import timezone
 from typing import Dict, List, Optional, Tuple
 import re
+import time
+
+from ipc_analysis.analysis_cache import analysis_cache
+from ipc_analysis.http_clients import (
+    CONNECTION_ERRORS, REQUEST_ERRORS, TIMEOUT_ERRORS, get_async_provider_client, get_provider_client
+)
+from ipc_analysis.circuit_breaker import CircuitOpenError, circuit_breakers
+from ipc_analysis.concurrency import BackendOverloadedError, backend_limiters
+from ipc_analysis.ollama_warmup import get_keep_alive, ollama_warmup_service
+from ipc_analysis.ipc_catalog import ipc_catalog
+from ipc_analysis.ipc_retrieval import ipc_retriever
+from ipc_analysis.metrics import ollama_usage, provider_metrics
+from ipc_analysis.json_extraction import extract_json_object, repair_truncated_json
+from ipc_analysis.analysis_schema import (
+    CITIZEN_ANALYSIS_SCHEMA, COMPACT_CITIZEN_ANALYSIS_SCHEMA, ollama_format, parse_failures
+)
 
 logger = logging.getLogger(__name__)
 
@@ -13,13 +30,41 @@ logger = logging.getLogger(__name__)
 class OllamaIPCService:
     """Service to interact with the local Ollama IPC-Helper model"""
     
+    # Cached analyses are keyed on this; change it along with _construct_analysis_prompt
+    PROMPT_VERSION = '2'
+    # Same for _construct_compact_prompt
+    COMPACT_PROMPT_VERSION = '2'
+    
+    # Output budget per prompt mode; the compact answer is numbers and one-line reasons
+    NUM_PREDICT = {'full': 2000, 'compact': 400}
+    OUTPUT_SCHEMAS = {'full': CITIZEN_ANALYSIS_SCHEMA, 'compact': COMPACT_CITIZEN_ANALYSIS_SCHEMA}
+    # Seconds between attempts
+    RETRY_DELAY = 2
+    
     def __init__(self):
         self.base_url = getattr(settings, 'OLLAMA_BASE_URL', 'http://ollama:11434')
         self.model_name = getattr(settings, 'OLLAMA_MODEL_NAME', 'Anupam/IPC-Helper:latest')
         self.timeout = getattr(settings, 'OLLAMA_TIMEOUT', 300)  # 5 minutes for model responses
         self.max_retries = getattr(settings, 'OLLAMA_MAX_RETRIES', 2)
+        self.client = get_provider_client('ollama')
+        self.circuit_breaker = circuit_breakers.get('ollama')
+        self.limiter = backend_limiters.get('ollama')
+        self.prompt_mode = getattr(settings, 'IPC_PROMPT_MODE', 'full')
         logger.info(f"OllamaIPCService initialized with URL: {self.base_url}, Timeout: {self.timeout}s")
     
+    @property
+    def active_prompt_mode(self) -> str:
+        """Compact mode needs the IPC catalog to fill in section details"""
+        if self.prompt_mode == 'compact' and ipc_catalog.is_available:
+            return 'compact'
+        return 'full'
+    
+    @property
+    def prompt_version(self) -> str:
+        if self.active_prompt_mode == 'compact':
+            return f"compact{self.COMPACT_PROMPT_VERSION}"
+        return self.PROMPT_VERSION
+    
     def analyze_case(self, case_description: str, incident_date: Optional[str] = None, 
                     location: Optional[str] = None) -> Dict:
         """
@@ -33,38 +78,122 @@ class OllamaIPCService:
         Returns:
             Dict containing the analysis results
         """
+        result, cache_hit = analysis_cache.get_or_compute(
+            case_description,
+            provider='ollama_ipc',
+            model_name=self.model_name,
+            prompt_version=self.prompt_version,
+            compute=lambda: self._analyze_uncached(case_description, incident_date, location),
+            is_cacheable=self._is_cacheable_analysis,
+            incident_date=incident_date,
+            location=location,
+        )
+        
+        if cache_hit:
+            result['cached'] = True
+        
+        return result
+    
+    async def aanalyze_case(self, case_description: str, incident_date: Optional[str] = None,
+                            location: Optional[str] = None) -> Dict:
+        """Async variant of analyze_case for the async views"""
+        result, cache_hit = await analysis_cache.aget_or_compute(
+            case_description,
+            provider='ollama_ipc',
+            model_name=self.model_name,
+            prompt_version=self.prompt_version,
+            compute=lambda: self._aanalyze_uncached(case_description, incident_date, location),
+            is_cacheable=self._is_cacheable_analysis,
+            incident_date=incident_date,
+            location=location,
+        )
+        
+        if cache_hit:
+            result['cached'] = True
+        
+        return result
+    
+    def _is_cacheable_analysis(self, analysis: Dict) -> bool:
+        """Only cache analyses that came from a clean model response"""
+        return ('error' not in analysis and analysis.get('parsing_method') != 'manual'
+                and not analysis.get('partial'))
+    
+    def _analyze_uncached(self, case_description: str, incident_date: Optional[str],
+                          location: Optional[str]) -> Dict:
+        """Run the analysis against the model without consulting the cache"""
         try:
-            # Construct the prompt similar to your example
-            prompt = self._construct_analysis_prompt(case_description, incident_date, location)
+            prompt_mode = self.active_prompt_mode
+            prompt = self._build_prompt(case_description, incident_date, location, prompt_mode)
             
             # Make request to Ollama
-            response = self._make_ollama_request(prompt)
+            response = self._make_ollama_request(prompt, prompt_mode)
             
-            # Parse the JSON response
-            analysis = self._parse_ollama_response(response)
+            return self._finish_analysis(response, prompt_mode)
             
-            # Enhance the analysis with additional processing
-            enhanced_analysis = self._enhance_analysis(analysis)
+        except BackendOverloadedError:
+            raise
+        except (ConnectionError, CircuitOpenError) as e:
+            logger.error(f"Connection error during case analysis: {str(e)}")
+            return self._get_connection_error_fallback(case_description)
+        except Exception as e:
+            logger.error(f"Error in case analysis: {str(e)}", exc_info=True)
+            return self._get_fallback_analysis(case_description)
+    
+    async def _aanalyze_uncached(self, case_description: str, incident_date: Optional[str],
+                                 location: Optional[str]) -> Dict:
+        """Async variant of _analyze_uncached"""
+        try:
+            prompt_mode = self.active_prompt_mode
+            prompt = self._build_prompt(case_description, incident_date, location, prompt_mode)
             
-            return enhanced_analysis
+            response = await self._amake_ollama_request(prompt, prompt_mode)
             
-        except ConnectionError as e:
+            # Parsing records stats in the cache, so keep it off the event loop
+            return await sync_to_async(self._finish_analysis, thread_sensitive=False)(response, prompt_mode)
+            
+        except BackendOverloadedError:
+            raise
+        except (ConnectionError, CircuitOpenError) as e:
             logger.error(f"Connection error during case analysis: {str(e)}")
             return self._get_connection_error_fallback(case_description)
         except Exception as e:
             logger.error(f"Error in case analysis: {str(e)}", exc_info=True)
             return self._get_fallback_analysis(case_description)
     
+    def _build_prompt(self, case_description: str, incident_date: Optional[str],
+                      location: Optional[str], prompt_mode: str) -> str:
+        if prompt_mode == 'compact':
+            return self._construct_compact_prompt(case_description, incident_date, location)
+        return self._construct_analysis_prompt(case_description, incident_date, location)
+    
+    def _finish_analysis(self, response: str, prompt_mode: str) -> Dict:
+        """Turn the model's response into the analysis returned to callers"""
+        # Parse the JSON response
+        analysis = self._parse_ollama_response(response)
+        
+        # Fill in section details from the IPC corpus
+        analysis = self._enrich_from_catalog(analysis)
+        analysis['prompt_mode'] = prompt_mode
+        
+        # Enhance the analysis with additional processing
+        return self._enhance_analysis(analysis)
+    
+    def _format_candidates(self, case_description: str) -> str:
+        """Retrieved candidate sections as a prompt block, or an empty string"""
+        candidates = ipc_retriever.format_candidates(case_description)
+        return f"\n{candidates}\n" if candidates else ""
+    
     def _construct_analysis_prompt(self, case_description: str, incident_date: Optional[str], 
                                  location: Optional[str]) -> str:
         """Construct the prompt for the IPC-Helper model"""
+        candidates = self._format_candidates(case_description)
         prompt = f"""You are an expert Indian legal assistant specializing in IPC (Indian Penal Code) analysis. Analyze this legal case and provide a comprehensive response.
 
 CASE DETAILS:
 {case_description}
 {f"Incident Date: {incident_date}" if incident_date else ""}
 {f"Location: {location}" if location else ""}
-
+{candidates}
 ANALYSIS REQUIREMENTS:
 1. Identify ALL relevant IPC sections that APPLY AGAINST the accused (prosecution sections)
 2. Identify ALL relevant IPC sections that can be used FOR DEFENSE of the accused
@@ -119,78 +248,217 @@ CRITICAL INSTRUCTIONS:
         
         return prompt
     
-    def _make_ollama_request(self, prompt: str) -> str:
-        """Make request to Ollama API with retry logic"""
-        url = f"{self.base_url}/api/generate"
+    def _construct_compact_prompt(self, case_description: str, incident_date: Optional[str],
+                                  location: Optional[str]) -> str:
+        """
+        Construct a short prompt that asks only for section numbers and reasons
         
-        payload = {
+        Descriptions, punishments and bail/cognizance details are filled in
+        from the IPC catalog afterwards, so the model doesn't have to write them.
+        """
+        candidates = self._format_candidates(case_description)
+        prompt = f"""You are an expert in the Indian Penal Code. Identify the IPC sections for this case.
+
+CASE DETAILS:
+{case_description}
+{f"Incident Date: {incident_date}" if incident_date else ""}
+{f"Location: {location}" if location else ""}
+{candidates}
+List the sections that apply against the accused and the sections available for the defense. Give only the section number and one short sentence on why it applies. Return ONLY this JSON:
+
+{{"applicable_ipc_sections": [{{"section_number": "279", "why_applicable": "..."}}], "defensive_ipc_sections": [{{"section_number": "80", "why_applicable": "..."}}], "severity": "Low|Medium|High"}}"""
+        
+        return prompt
+    
+    def _enrich_from_catalog(self, analysis: Dict) -> Dict:
+        """Fill missing section details from the IPC catalog"""
+        if not ipc_catalog.is_available:
+            return analysis
+        
+        for key in ('applicable_ipc_sections', 'ipc_sections', 'defensive_ipc_sections'):
+            for section in analysis.get(key) or []:
+                if not isinstance(section, dict):
+                    continue
+                
+                entry = ipc_catalog.get(section.get('section_number'))
+                section['in_catalog'] = entry is not None
+                if entry is None:
+                    continue
+                
+                section['section_number'] = entry['section_number']
+                if not section.get('description'):
+                    section['description'] = (
+                        f"IPC Section {entry['section_number']} - {entry['title']}: {entry['description']}"
+                    )
+                if not section.get('punishment'):
+                    section['punishment'] = entry['punishment']
+                section.setdefault('bailable', entry['bailable'])
+                section.setdefault('cognizable', entry['cognizable'])
+        
+        if 'applicable_ipc_sections' in analysis:
+            analysis['total_sections_identified'] = len(analysis['applicable_ipc_sections'])
+        if 'defensive_ipc_sections' in analysis:
+            analysis['total_defensive_sections'] = len(analysis['defensive_ipc_sections'])
+        
+        return analysis
+    
+    def _build_request_payload(self, prompt: str, prompt_mode: str = 'full') -> Dict:
+        return {
             "model": self.model_name,
             "prompt": prompt,
             "stream": False,
+            "format": ollama_format(self.OUTPUT_SCHEMAS[prompt_mode]),
+            "keep_alive": get_keep_alive(),
             "options": {
                 "temperature": 0.3,  # Lower temperature for more consistent legal analysis
                 "top_p": 0.9,
                 "top_k": 40,
-                "num_predict": 2000,  # Limit response length
+                "num_predict": self.NUM_PREDICT[prompt_mode],  # Limit response length
             }
         }
+    
+    def _make_ollama_request(self, prompt: str, prompt_mode: str = 'full') -> str:
+        """Make request to Ollama API with retry logic"""
+        # Fail fast while Ollama is known to be down instead of waiting out every retry
+        self.circuit_breaker.check()
         
+        payload = self._build_request_payload(prompt, prompt_mode)
         last_exception = None
         
         for attempt in range(self.max_retries):
             try:
-                logger.info(f"Making Ollama request (attempt {attempt + 1}/{self.max_retries}) to {url}")
-                logger.info(f"Request timeout set to {self.timeout} seconds")
-                
+                self._log_attempt(attempt)
                 start_time = timezone.now()
-                response = requests.post(
-                    url, 
-                    json=payload, 
-                    timeout=self.timeout,
-                    headers={'Content-Type': 'application/json'}
-                )
-                response.raise_for_status()
+                with self.limiter.slot() as lease, provider_metrics.track('ollama') as call:
+                    response = self.client.post(
+                        self.generate_url,
+                        json=payload,
+                        timeout=self.timeout,
+                        headers={'Content-Type': 'application/json'}
+                    )
+                    call.received(response)
+                    lease.received(response)
                 
-                elapsed_time = (timezone.now() - start_time).total_seconds()
-                logger.info(f"Ollama responded after {elapsed_time:.2f} seconds")
-                
-                result = response.json()
-                response_text = result.get('response', '')
-                
-                if response_text.strip():
-                    logger.info(f"Successfully received response from Ollama ({len(response_text)} characters)")
+                response_text = self._handle_ollama_response(response, call, payload, start_time)
+                if response_text:
                     return response_text
-                else:
-                    logger.warning("Received empty response from Ollama")
-                    
-            except requests.exceptions.Timeout as e:
-                last_exception = e
-                logger.warning(f"Ollama request timeout on attempt {attempt + 1}: {str(e)}")
                 
-            except requests.exceptions.ConnectionError as e:
+            except BackendOverloadedError:
+                # Shed before reaching Ollama: no outcome to record, but free a claimed probe
+                self.circuit_breaker.release_probe()
+                raise
+            except Exception as e:
                 last_exception = e
-                logger.warning(f"Ollama connection error on attempt {attempt + 1}: {str(e)}")
+                self._log_failed_attempt(attempt, e)
+            
+            # Wait before retry (except on last attempt)
+            if self._should_retry(attempt, last_exception):
+                time.sleep(self.RETRY_DELAY)
+        
+        raise self._retries_exhausted(last_exception)
+    
+    async def _amake_ollama_request(self, prompt: str, prompt_mode: str = 'full') -> str:
+        """Async variant of _make_ollama_request; waits between retries don't block the event loop"""
+        client = get_async_provider_client('ollama')
+        
+        await sync_to_async(self.circuit_breaker.check, thread_sensitive=False)()
+        
+        payload = self._build_request_payload(prompt, prompt_mode)
+        last_exception = None
+        
+        for attempt in range(self.max_retries):
+            try:
+                self._log_attempt(attempt)
+                start_time = timezone.now()
+                async with self.limiter.aslot() as lease:
+                    with provider_metrics.track('ollama') as call:
+                        response = await client.post(self.generate_url, json=payload, timeout=self.timeout)
+                        call.received(response)
+                        lease.received(response)
                 
-            except requests.exceptions.RequestException as e:
-                last_exception = e
-                logger.warning(f"Ollama request failed on attempt {attempt + 1}: {str(e)}")
+                # Records warm-up and breaker state in the cache, so keep it off the event loop
+                response_text = await sync_to_async(self._handle_ollama_response, thread_sensitive=False)(
+                    response, call, payload, start_time
+                )
+                if response_text:
+                    return response_text
                 
+            except BackendOverloadedError:
+                await sync_to_async(self.circuit_breaker.release_probe, thread_sensitive=False)()
+                raise
             except Exception as e:
                 last_exception = e
-                logger.error(f"Unexpected error on attempt {attempt + 1}: {str(e)}")
+                self._log_failed_attempt(attempt, e)
             
-            # Wait before retry (except on last attempt)
-            if attempt < self.max_retries - 1:
-                import time
-                time.sleep(2)  # Wait 2 seconds before retry
+            if self._should_retry(attempt, last_exception):
+                await asyncio.sleep(self.RETRY_DELAY)
+        
+        raise await sync_to_async(self._retries_exhausted, thread_sensitive=False)(last_exception)
+    
+    @property
+    def generate_url(self) -> str:
+        return f"{self.base_url}/api/generate"
+    
+    def _log_attempt(self, attempt: int):
+        logger.info(f"Making Ollama request (attempt {attempt + 1}/{self.max_retries}) to {self.generate_url}")
+        logger.info(f"Request timeout set to {self.timeout} seconds")
+    
+    def _handle_ollama_response(self, response, call, payload: Dict, start_time) -> str:
+        """
+        Check a /api/generate response and record its usage and outcome
+        
+        Returns:
+            The generated text, or '' if the model returned nothing
+        """
+        response.raise_for_status()
+        
+        elapsed_time = (timezone.now() - start_time).total_seconds()
+        logger.info(f"Ollama responded after {elapsed_time:.2f} seconds")
+        
+        result = response.json()
+        ollama_warmup_service.record_response(result)
+        call.record_usage(**ollama_usage(result))
+        response_text = result.get('response', '')
+        if result.get('done_reason') == 'length':
+            logger.warning(f"Ollama response hit num_predict={payload['options']['num_predict']}")
         
-        # All attempts failed
+        if not response_text.strip():
+            logger.warning("Received empty response from Ollama")
+            return ''
+        
+        logger.info(f"Successfully received response from Ollama ({len(response_text)} characters)")
+        self.circuit_breaker.record_success()
+        return response_text
+    
+    @staticmethod
+    def _log_failed_attempt(attempt: int, error: Exception):
+        if isinstance(error, TIMEOUT_ERRORS):
+            logger.warning(f"Ollama request timeout on attempt {attempt + 1}: {str(error)}")
+        elif isinstance(error, CONNECTION_ERRORS):
+            logger.warning(f"Ollama connection error on attempt {attempt + 1}: {str(error)}")
+        elif isinstance(error, REQUEST_ERRORS):
+            logger.warning(f"Ollama request failed on attempt {attempt + 1}: {str(error)}")
+        else:
+            logger.error(f"Unexpected error on attempt {attempt + 1}: {str(error)}")
+    
+    def _should_retry(self, attempt: int, last_exception: Optional[Exception]) -> bool:
+        """Whether another attempt follows this one; counts the retry if so"""
+        if attempt >= self.max_retries - 1:
+            return False
+        provider_metrics.count_retry(
+            'ollama', 'timeout' if isinstance(last_exception, TIMEOUT_ERRORS) else 'error'
+        )
+        return True
+    
+    def _retries_exhausted(self, last_exception: Optional[Exception]) -> Exception:
+        """Record the failed call in the circuit breaker and build the error to raise"""
+        self.circuit_breaker.record_failure()
         error_msg = f"Failed to get response from IPC-Helper model after {self.max_retries} attempts"
         if last_exception:
             error_msg += f": {str(last_exception)}"
         
         logger.error(error_msg)
-        raise Exception(error_msg)
+        return Exception(error_msg)
     
     def _parse_ollama_response(self, response_text: str) -> Dict:
         """Parse the JSON response from Ollama model"""
@@ -198,53 +466,41 @@ CRITICAL INSTRUCTIONS:
             # Clean the response text
             cleaned_response = response_text.strip()
             
-            # Try to extract JSON from the response using multiple strategies
-            json_patterns = [
-                # Pattern 1: Look for complete JSON object
-                r'\{[^{}]*(?:\{[^{}]*\}[^{}]*)*\}',
-                # Pattern 2: Look for JSON between specific markers
-                r'```json\s*(\{.*?\})\s*```',
-                # Pattern 3: Look for JSON after specific text
-                r'(?:json|JSON).*?(\{.*?\})',
-            ]
+            # Find the analysis object, also inside prose or ```json fences.
+            # Also supports the old 'ipc_sections' format for backward compatibility
+            parsed_json = extract_json_object(cleaned_response, self._is_analysis_json)
+            if parsed_json is not None:
+                parse_failures.record('ollama', failed=False)
+                return parsed_json
             
-            parsed_json = None
+            # Keep the complete sections of a response cut off at num_predict
+            parsed_json = repair_truncated_json(cleaned_response, self._is_analysis_json)
+            if parsed_json is not None:
+                logger.warning("Ollama response was truncated, returning the complete sections only")
+                parse_failures.record('ollama', failed=False, partial=True)
+                return parsed_json
             
-            for pattern in json_patterns:
-                matches = re.finditer(pattern, cleaned_response, re.DOTALL | re.IGNORECASE)
-                for match in matches:
-                    try:
-                        json_str = match.group(1) if match.groups() else match.group()
-                        parsed_json = json.loads(json_str)
-                        break
-                    except (json.JSONDecodeError, IndexError):
-                        continue
-                if parsed_json:
-                    break
-            
-            if parsed_json:
-                # Validate the structure for new format
-                if 'applicable_ipc_sections' in parsed_json and isinstance(parsed_json['applicable_ipc_sections'], list):
-                    return parsed_json
-                # Also support old format for backward compatibility
-                elif 'ipc_sections' in parsed_json and isinstance(parsed_json['ipc_sections'], list):
-                    return parsed_json
-            
-            # If no valid JSON found, try parsing the whole response
-            try:
-                return json.loads(cleaned_response)
-            except json.JSONDecodeError:
-                pass
+            # Otherwise accept any JSON object the model returned
+            parsed_json = extract_json_object(cleaned_response)
+            if parsed_json is not None:
+                parse_failures.record('ollama', failed=False)
+                return parsed_json
             
             # Fall back to manual parsing
             logger.warning(f"Could not parse JSON from response, falling back to manual parsing")
+            parse_failures.record('ollama', failed=True)
             return self._manual_parse_response(response_text)
                 
         except Exception as e:
             logger.error(f"Failed to parse response: {str(e)}")
             logger.error(f"Raw response: {response_text}")
+            parse_failures.record('ollama', failed=True)
             return self._manual_parse_response(response_text)
     
+    @staticmethod
+    def _is_analysis_json(parsed: Dict) -> bool:
+        return any(isinstance(parsed.get(key), list) for key in ('applicable_ipc_sections', 'ipc_sections'))
+    
     def _manual_parse_response(self, response_text: str) -> Dict:
         """Manually parse response if JSON parsing fails"""
         ipc_sections = []
@@ -467,19 +723,32 @@ CRITICAL INSTRUCTIONS:
     def test_connection(self) -> Tuple[bool, str]:
         """Test connection to Ollama service"""
         try:
-            response = requests.get(f"{self.base_url}/api/tags", timeout=10)
+            response = self.client.get(f"{self.base_url}/api/tags", timeout=10)
             response.raise_for_status()
-            
-            models = response.json().get('models', [])
-            model_names = [model.get('name', '') for model in models]
-            
-            if self.model_name in model_names:
-                return True, f"Successfully connected. Model {self.model_name} is available."
-            else:
-                return False, f"Model {self.model_name} not found. Available models: {model_names}"
-                
+            return self._check_model_listed(response.json())
+        except Exception as e:
+            return False, f"Connection failed: {str(e)}"
+    
+    async def atest_connection(self) -> Tuple[bool, str]:
+        """Async variant of test_connection"""
+        try:
+            response = await get_async_provider_client('ollama').get(f"{self.base_url}/api/tags", timeout=10)
+            response.raise_for_status()
+            return self._check_model_listed(response.json())
         except Exception as e:
             return False, f"Connection failed: {str(e)}"
+    
+    def _check_model_listed(self, tags: Dict) -> Tuple[bool, str]:
+        model_names = [model.get('name', '') for model in tags.get('models', [])]
+        
+        if self.model_name in model_names:
+            return True, f"Successfully connected. Model {self.model_name} is available."
+        else:
+            return False, f"Model {self.model_name} not found. Available models: {model_names}"
+
+
+# Global instance - shared across requests and worker tasks
+ollama_ipc_service = OllamaIPCService()
 
 
 class LeadMatchingService:
@@ -591,6 +860,170 @@ class LeadMatchingService:
         return True
 
 
+class CitizenAnalysisPipeline:
+    """Stages that follow the AI analysis of a citizen case: lead creation, matching and PDF report"""
+    
+    @staticmethod
+    def create_case_lead(data: Dict, ai_analysis: Dict):
+        """Create and publish a case lead, notifying matching lawyers"""
+        from .models import CaseLead, LeadAnalytics
+        
+        case_lead = CaseLead.objects.create(
+            case_description=data['case_description'],
+            incident_date=data.get('incident_date'),
+            incident_location=data['incident_location'],
+            city=data['city'],
+            state=data['state'],
+            ai_analysis=ai_analysis,
+            ipc_sections_identified=ai_analysis.get('section_numbers_list', []),
+            case_category=ai_analysis.get('case_category', 'general'),
+            urgency_level=data.get('urgency_level', 'medium'),
+            contact_method=data['contact_method'],
+            contact_value=data['contact_value'],
+            expires_at=timezone.now() + timedelta(days=30)  # 30 days expiry
+        )
+        
+        # Create analytics record
+        LeadAnalytics.objects.create(lead=case_lead)
+        
+        return case_lead
+    
+    @staticmethod
+    def match_lawyers(case_lead):
+        """Find and notify matching lawyers, then publish the lead"""
+        matching_lawyers = LeadMatchingService.find_matching_lawyers(case_lead)
+        LeadMatchingService.notify_matching_lawyers(case_lead, matching_lawyers)
+        
+        # Update lead status
+        case_lead.status = 'published'
+        case_lead.save()
+        
+        return matching_lawyers
+    
+    @staticmethod
+    def generate_pdf(case_lead, ai_analysis: Dict) -> Optional[str]:
+        """Generate the PDF report, returning its URL or None on failure"""
+        try:
+            pdf_filename = PDFReportService.generate_case_report(case_lead, ai_analysis)
+            return f"/media/reports/{pdf_filename}"
+        except Exception as e:
+            logger.error(f"PDF generation failed: {str(e)}")
+            return None
+    
+    @staticmethod
+    def build_response(ai_analysis: Dict) -> Dict:
+        """Prepare the clean frontend response - supports both old and new formats"""
+        ipc_sections = ai_analysis.get('applicable_ipc_sections', ai_analysis.get('ipc_sections', []))
+        defensive_sections = ai_analysis.get('defensive_ipc_sections', [])
+        
+        # Clean up the IPC sections to include all required fields
+        cleaned_sections = []
+        for section in ipc_sections:
+            cleaned_section = {
+                'section_number': section.get('section_number', ''),
+                'description': section.get('description', ''),
+                'why_applicable': section.get('why_applicable', section.get('why_applied', '')),
+                'punishment': section.get('punishment', 'Details to be verified with legal expert')
+            }
+            for field in ('bailable', 'cognizable'):
+                if section.get(field):
+                    cleaned_section[field] = section[field]
+            cleaned_sections.append(cleaned_section)
+        
+        # Clean up the defensive IPC sections
+        cleaned_defensive_sections = []
+        for section in defensive_sections:
+            cleaned_defensive_section = {
+                'section_number': section.get('section_number', ''),
+                'description': section.get('description', ''),
+                'why_applicable': section.get('why_applicable', section.get('why_applied', '')),
+                'punishment': section.get('punishment', 'No punishment if defense is established')
+            }
+            for field in ('bailable', 'cognizable'):
+                if section.get(field):
+                    cleaned_defensive_section[field] = section[field]
+            cleaned_defensive_sections.append(cleaned_defensive_section)
+        
+        response_data = {
+            'applicable_ipc_sections': cleaned_sections,
+            'defensive_ipc_sections': cleaned_defensive_sections if cleaned_defensive_sections else None,
+            'severity': ai_analysis.get('severity', 'Medium'),
+            'total_sections_identified': len(cleaned_sections),
+            'total_defensive_sections': len(cleaned_defensive_sections) if cleaned_defensive_sections else None,
+            # Set when the model output was cut off and only complete sections were kept
+            'partial': True if ai_analysis.get('partial') else None,
+            'analysis_timestamp': timezone.now().isoformat(),
+        }
+        
+        # Remove None values to clean up response
+        return {k: v for k, v in response_data.items() if v is not None}
+    
+    @staticmethod
+    def build_error_response(error: Exception) -> Dict:
+        """Return a helpful error payload based on the type of error"""
+        if "timeout" in str(error).lower() or "timed out" in str(error).lower():
+            error_message = "Analysis is taking longer than expected. Please try again in a few minutes."
+            error_data = {
+                "applicable_ipc_sections": [
+                    {
+                        "section_number": "TIMEOUT",
+                        "section_title": "Request Timeout",
+                        "description": "The legal analysis request took longer than expected to process.",
+                        "why_applicable": "Processing time exceeded the maximum allowed duration",
+                        "punishment": "N/A - Please retry the request"
+                    }
+                ],
+                "case_summary": "Analysis timed out. Please try again.",
+                "severity": "Unknown",
+                "case_type": "Unknown"
+            }
+        elif "connection" in str(error).lower():
+            error_message = "Unable to connect to analysis service. Please try again later."
+            error_data = {
+                "applicable_ipc_sections": [
+                    {
+                        "section_number": "CONNECTION_ERROR",
+                        "section_title": "Service Connection Error",
+                        "description": "Unable to connect to the legal analysis service.",
+                        "why_applicable": "Network or service connectivity issue",
+                        "punishment": "N/A - Please retry the request"
+                    }
+                ],
+                "case_summary": "Connection error occurred during analysis.",
+                "severity": "Unknown",
+                "case_type": "Unknown"
+            }
+        else:
+            error_message = "Failed to analyze case. Please try again later or consult a lawyer directly."
+            error_data = {
+                "applicable_ipc_sections": [
+                    {
+                        "section_number": "ANALYSIS_ERROR",
+                        "section_title": "Analysis Error",
+                        "description": "An error occurred during legal case analysis.",
+                        "why_applicable": "Technical issue prevented analysis completion",
+                        "punishment": "N/A - Please consult a legal expert"
+                    }
+                ],
+                "case_summary": "Analysis could not be completed due to technical issues.",
+                "severity": "Unknown",
+                "case_type": "Unknown"
+            }
+        
+        return {
+            **error_data,
+            'analysis_timestamp': timezone.now().isoformat(),
+            'total_sections_identified': len(error_data['applicable_ipc_sections']),
+            'lead_id': None,
+            'lawyer_connect_available': False,
+            'pdf_report_url': None,
+            'error': error_message,
+            'details': str(error) if settings.DEBUG else None,
+            'retry_suggested': True,
+            'note': 'Analysis failed. Please try again or consult a qualified lawyer for legal advice.'
+        }
+
+
 class PDFReportService:
     """Service to generate PDF reports for case analysis"""
     
@@ -57,6 +57,64 @@ def send_lead_notification(lead_id, lawyer_id):
         return f"Failed: {str(e)}"
 
 
+@shared_task(bind=True)
+def analyze_citizen_case(self, request_data):
+    """
+    Run the citizen case analysis pipeline in the worker
+    
+    Stages: AI analysis, lead creation, lawyer matching and PDF generation.
+    Progress is published through the task state so the status endpoint can
+    report which stage the job is in.
+    """
+    from ipc_analysis.concurrency import BackendOverloadedError
+    from .serializers import CaseAnalysisRequestSerializer
+    from .services import ollama_ipc_service, CitizenAnalysisPipeline
+    
+    serializer = CaseAnalysisRequestSerializer(data=request_data)
+    serializer.is_valid(raise_exception=True)
+    data = serializer.validated_data
+    
+    try:
+        self.update_state(state='PROGRESS', meta={'stage': 'analyzing'})
+        ai_analysis = ollama_ipc_service.analyze_case(
+            case_description=data['case_description'],
+            incident_date=data.get('incident_date'),
+            location=data.get('incident_location')
+        )
+        
+        result = CitizenAnalysisPipeline.build_response(ai_analysis)
+        result['lead_id'] = None
+        result['lawyer_connect_available'] = False
+        result['pdf_report_url'] = None
+        
+        if data.get('create_lead', False):
+            self.update_state(state='PROGRESS', meta={'stage': 'creating_lead'})
+            case_lead = CitizenAnalysisPipeline.create_case_lead(data, ai_analysis)
+            result['lead_id'] = str(case_lead.lead_id)
+            
+            self.update_state(state='PROGRESS', meta={'stage': 'matching_lawyers'})
+            matching_lawyers = CitizenAnalysisPipeline.match_lawyers(case_lead)
+            result['lawyer_connect_available'] = bool(matching_lawyers)
+            
+            if data.get('generate_pdf', False):
+                self.update_state(state='PROGRESS', meta={'stage': 'generating_pdf'})
+                result['pdf_report_url'] = CitizenAnalysisPipeline.generate_pdf(case_lead, ai_analysis)
+        
+        return result
+    
+    except BackendOverloadedError as e:
+        # Wait for capacity instead of failing the job
+        max_retries = settings.CITIZEN_ANALYSIS_JOB_SETTINGS['MAX_OVERLOAD_RETRIES']
+        if self.request.retries < max_retries:
+            logger.info(f"Ollama overloaded, retrying citizen analysis in {e.retry_after}s")
+            raise self.retry(exc=e, countdown=e.retry_after, max_retries=max_retries)
+        logger.error(f"Citizen case analysis job gave up: {str(e)}")
+        return CitizenAnalysisPipeline.build_error_response(e)
+    except Exception as e:
+        logger.error(f"Citizen case analysis job failed: {str(e)}", exc_info=True)
+        return CitizenAnalysisPipeline.build_error_response(e)
+
+
 @shared_task
 def cleanup_expired_leads():
     """Remove expired leads and their associated data"""
@@ -12,6 +12,8 @@ router.register(r'leads', views.CaseLeadViewSet, basename='case-lead')
 urlpatterns = [
     # Public endpoints for citizens
     path('analyze-case/', views.CitizenCaseAnalysisView.as_view(), name='analyze-case'),
+    path('analyze-case/jobs/', views.CitizenCaseAnalysisJobView.as_view(), name='analyze-case-job'),
+    path('analyze-case/jobs/<uuid:job_id>/', views.CitizenCaseAnalysisJobStatusView.as_view(), name='analyze-case-job-status'),
     
     # Lawyer dashboard
     path('dashboard/', views.LawyerDashboardView.as_view(), name='lawyer-dashboard'),
@@ -1,8 +1,11 @@
+from adrf.views import APIView as AsyncAPIView
+from asgiref.sync import sync_to_async
 from rest_framework import viewsets, status, permissions
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from django.shortcuts import get_object_or_404
+from django.urls import reverse
 from django.utils import timezone
 from django.db.models import Q, Count
 from django.core.exceptions import ValidationError
@@ -10,7 +13,11 @@ from django.conf import settings
 from datetime import timedelta, datetime
 import logging
 
+from celery.result import AsyncResult
+from celery.exceptions import TimeoutError as CeleryTimeoutError
+
 from authentication.permissions import IsLawyerUser, IsClientUser, IsLawyerOrReadOnly
+from ipc_analysis.concurrency import BackendOverloadedError
 
 from .models import (
     LawyerProfile, Subscription, CaseLead, LeadAssignment,
@@ -22,18 +29,21 @@ from .serializers import (
     CitizenFeedbackSerializer, CaseAnalysisRequestSerializer,
     CaseAnalysisResponseSerializer, LawyerDashboardStatsSerializer
 )
-from .services import OllamaIPCService, LeadMatchingService, PDFReportService
+from .services import ollama_ipc_service, CitizenAnalysisPipeline
+from .tasks import analyze_citizen_case
 
 logger = logging.getLogger(__name__)
 
 
-class CitizenCaseAnalysisView(APIView):
+class CitizenCaseAnalysisView(AsyncAPIView):
     """
     Free public endpoint for citizens to analyze their legal cases
+    
+    Async, so a worker is not tied up for the minutes the model can take.
     """
     permission_classes = [permissions.AllowAny]
     
-    def post(self, request):
+    async def post(self, request):
         """Analyze a legal case and optionally create a lead"""
         serializer = CaseAnalysisRequestSerializer(data=request.data)
         
@@ -43,15 +53,11 @@ class CitizenCaseAnalysisView(APIView):
         data = serializer.validated_data
         
         try:
-            # Initialize the IPC service
-            logger.info("Initializing OllamaIPCService for case analysis")
-            ipc_service = OllamaIPCService()
-            
             logger.info(f"Starting case analysis for description: {data['case_description'][:100]}...")
             logger.info("This may take up to 5 minutes for AI processing...")
             
             # Analyze the case - this may take up to 5 minutes
-            ai_analysis = ipc_service.analyze_case(
+            ai_analysis = await ollama_ipc_service.aanalyze_case(
                 case_description=data['case_description'],
                 incident_date=data.get('incident_date'),
                 location=data.get('incident_location')
@@ -61,155 +67,119 @@ class CitizenCaseAnalysisView(APIView):
             logger.info(f"Analysis result keys: {list(ai_analysis.keys()) if ai_analysis else 'None'}")
             
             # Create case lead if user wants lawyer connect
-            create_lead = data.get('create_lead', False)
-            lead_id = None
-            
-            if create_lead:
-                # Create the case lead
-                case_lead = CaseLead.objects.create(
-                    case_description=data['case_description'],
-                    incident_date=data.get('incident_date'),
-                    incident_location=data['incident_location'],
-                    city=data['city'],
-                    state=data['state'],
-                    ai_analysis=ai_analysis,
-                    ipc_sections_identified=ai_analysis.get('section_numbers_list', []),
-                    case_category=ai_analysis.get('case_category', 'general'),
-                    urgency_level=data.get('urgency_level', 'medium'),
-                    contact_method=data['contact_method'],
-                    contact_value=data['contact_value'],
-                    expires_at=timezone.now() + timedelta(days=30)  # 30 days expiry
-                )
-                
-                lead_id = case_lead.lead_id
-                
-                # Create analytics record
-                LeadAnalytics.objects.create(lead=case_lead)
-                
-                # Find and notify matching lawyers
-                matching_lawyers = LeadMatchingService.find_matching_lawyers(case_lead)
-                LeadMatchingService.notify_matching_lawyers(case_lead, matching_lawyers)
-                
-                # Update lead status
-                case_lead.status = 'published'
-                case_lead.save()
-            
-            # Generate PDF report if requested
-            pdf_url = None
-            if data.get('generate_pdf', False) and lead_id:
-                try:
-                    pdf_filename = PDFReportService.generate_case_report(case_lead, ai_analysis)
-                    pdf_url = f"/media/reports/{pdf_filename}"
-                except Exception as e:
-                    logger.error(f"PDF generation failed: {str(e)}")
-            
-            # Prepare clean response for frontend - support both old and new formats
-            ipc_sections = ai_analysis.get('applicable_ipc_sections', ai_analysis.get('ipc_sections', []))
-            defensive_sections = ai_analysis.get('defensive_ipc_sections', [])
-            
-            # Clean up the IPC sections to include all required fields
-            cleaned_sections = []
-            for section in ipc_sections:
-                cleaned_section = {
-                    'section_number': section.get('section_number', ''),
-                    'description': section.get('description', ''),
-                    'why_applicable': section.get('why_applicable', section.get('why_applied', '')),
-                    'punishment': section.get('punishment', 'Details to be verified with legal expert')
-                }
-                cleaned_sections.append(cleaned_section)
-            
-            # Clean up the defensive IPC sections
-            cleaned_defensive_sections = []
-            for section in defensive_sections:
-                cleaned_defensive_section = {
-                    'section_number': section.get('section_number', ''),
-                    'description': section.get('description', ''),
-                    'why_applicable': section.get('why_applicable', section.get('why_applied', '')),
-                    'punishment': section.get('punishment', 'No punishment if defense is established')
-                }
-                cleaned_defensive_sections.append(cleaned_defensive_section)
-            
-            response_data = {
-                'applicable_ipc_sections': cleaned_sections,
-                'defensive_ipc_sections': cleaned_defensive_sections if cleaned_defensive_sections else None,
-                'severity': ai_analysis.get('severity', 'Medium'),
-                'total_sections_identified': len(cleaned_sections),
-                'total_defensive_sections': len(cleaned_defensive_sections) if cleaned_defensive_sections else None,
-                'analysis_timestamp': timezone.now().isoformat(),
-            }
+            if data.get('create_lead', False):
+                await sync_to_async(self._create_lead)(data, ai_analysis)
             
-            # Remove None values to clean up response
-            response_data = {k: v for k, v in response_data.items() if v is not None}
+            response_data = CitizenAnalysisPipeline.build_response(ai_analysis)
             
             return Response(response_data, status=status.HTTP_200_OK)
-                
+        
+        except BackendOverloadedError as e:
+            return Response(
+                e.response_data(),
+                status=e.status_code,
+                headers={'Retry-After': str(e.retry_after)}
+            )
         except Exception as e:
             logger.error(f"Case analysis failed: {str(e)}", exc_info=True)
             
-            # Return a helpful error message based on the type of error
-            if "timeout" in str(e).lower() or "timed out" in str(e).lower():
-                error_message = "Analysis is taking longer than expected. Please try again in a few minutes."
-                error_data = {
-                    "applicable_ipc_sections": [
-                        {
-                            "section_number": "TIMEOUT",
-                            "section_title": "Request Timeout",
-                            "description": "The legal analysis request took longer than expected to process.",
-                            "why_applicable": "Processing time exceeded the maximum allowed duration",
-                            "punishment": "N/A - Please retry the request"
-                        }
-                    ],
-                    "case_summary": "Analysis timed out. Please try again.",
-                    "severity": "Unknown",
-                    "case_type": "Unknown"
-                }
-            elif "connection" in str(e).lower():
-                error_message = "Unable to connect to analysis service. Please try again later."
-                error_data = {
-                    "applicable_ipc_sections": [
-                        {
-                            "section_number": "CONNECTION_ERROR",
-                            "section_title": "Service Connection Error",
-                            "description": "Unable to connect to the legal analysis service.",
-                            "why_applicable": "Network or service connectivity issue",
-                            "punishment": "N/A - Please retry the request"
-                        }
-                    ],
-                    "case_summary": "Connection error occurred during analysis.",
-                    "severity": "Unknown",
-                    "case_type": "Unknown"
-                }
-            else:
-                error_message = "Failed to analyze case. Please try again later or consult a lawyer directly."
-                error_data = {
-                    "applicable_ipc_sections": [
-                        {
-                            "section_number": "ANALYSIS_ERROR",
-                            "section_title": "Analysis Error",
-                            "description": "An error occurred during legal case analysis.",
-                            "why_applicable": "Technical issue prevented analysis completion",
-                            "punishment": "N/A - Please consult a legal expert"
-                        }
-                    ],
-                    "case_summary": "Analysis could not be completed due to technical issues.",
-                    "severity": "Unknown",
-                    "case_type": "Unknown"
-                }
-            
-            error_response = {
-                **error_data,
-                'analysis_timestamp': timezone.now().isoformat(),
-                'total_sections_identified': len(error_data['applicable_ipc_sections']),
-                'lead_id': None,
-                'lawyer_connect_available': False,
-                'pdf_report_url': None,
-                'error': error_message,
-                'details': str(e) if settings.DEBUG else None,
-                'retry_suggested': True,
-                'note': 'Analysis failed. Please try again or consult a qualified lawyer for legal advice.'
-            }
+            error_response = CitizenAnalysisPipeline.build_error_response(e)
             
             return Response(error_response, status=status.HTTP_200_OK)  # Return 200 with error info instead of 500
+    
+    def _create_lead(self, data, ai_analysis):
+        """Create the case lead, match lawyers and generate the PDF report if requested"""
+        case_lead = CitizenAnalysisPipeline.create_case_lead(data, ai_analysis)
+        CitizenAnalysisPipeline.match_lawyers(case_lead)
+        
+        if data.get('generate_pdf', False):
+            CitizenAnalysisPipeline.generate_pdf(case_lead, ai_analysis)
+        
+        return case_lead
+
+
+class CitizenCaseAnalysisJobView(APIView):
+    """
+    Job-based variant of the citizen analysis endpoint.
+    
+    The analysis, lead creation, lawyer matching and PDF generation run in a
+    Celery worker, so the web worker is released as soon as the job is queued.
+    """
+    permission_classes = [permissions.AllowAny]
+    
+    def post(self, request):
+        """Queue a case analysis and return its job id"""
+        serializer = CaseAnalysisRequestSerializer(data=request.data)
+        
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        
+        job = analyze_citizen_case.delay(serializer.data)
+        logger.info(f"Queued citizen case analysis job {job.id}")
+        
+        return Response({
+            'job_id': job.id,
+            'status': 'queued',
+            'status_url': request.build_absolute_uri(
+                reverse('analyze-case-job-status', kwargs={'job_id': job.id})
+            ),
+        }, status=status.HTTP_202_ACCEPTED)
+
+
+class CitizenCaseAnalysisJobStatusView(APIView):
+    """
+    Poll the status of a queued citizen case analysis.
+    
+    Pass ``?wait=<seconds>`` to long-poll until the job finishes or the wait
+    elapses (capped by CITIZEN_ANALYSIS_JOB_SETTINGS['MAX_LONG_POLL_SECONDS']).
+    """
+    permission_classes = [permissions.AllowAny]
+    
+    STATUS_MAP = {
+        'PENDING': 'queued',
+        'RECEIVED': 'queued',
+        'STARTED': 'running',
+        'PROGRESS': 'running',
+        'RETRY': 'running',
+        'SUCCESS': 'completed',
+        'FAILURE': 'failed',
+        'REVOKED': 'cancelled',
+    }
+    
+    def get(self, request, job_id):
+        job = AsyncResult(str(job_id))
+        
+        wait_seconds = self._get_wait_seconds(request)
+        if wait_seconds and not job.ready():
+            try:
+                job.get(timeout=wait_seconds, propagate=False)
+            except CeleryTimeoutError:
+                pass
+        
+        response_data = {
+            'job_id': str(job_id),
+            'status': self.STATUS_MAP.get(job.state, 'running'),
+        }
+        
+        if job.state == 'PROGRESS' and isinstance(job.info, dict):
+            response_data['stage'] = job.info.get('stage')
+        elif job.state == 'SUCCESS':
+            result = job.result or {}
+            if result.get('error'):
+                response_data['status'] = 'failed'
+            response_data['result'] = result
+        elif job.state == 'FAILURE':
+            response_data['result'] = CitizenAnalysisPipeline.build_error_response(job.result)
+        
+        return Response(response_data, status=status.HTTP_200_OK)
+    
+    def _get_wait_seconds(self, request) -> float:
+        max_wait = settings.CITIZEN_ANALYSIS_JOB_SETTINGS['MAX_LONG_POLL_SECONDS']
+        try:
+            wait_seconds = float(request.query_params.get('wait', 0))
+        except (TypeError, ValueError):
+            return 0
+        return max(0, min(wait_seconds, max_wait))
 
 
 class LawyerProfileViewSet(viewsets.ModelViewSet):
@@ -536,11 +506,11 @@ class LeadAnalyticsView(APIView):
         })
 
 
-class SystemHealthView(APIView):
+class SystemHealthView(AsyncAPIView):
     """System health check including Ollama model status"""
     permission_classes = [permissions.AllowAny]
     
-    def get(self, request):
+    async def get(self, request):
         """Check system health"""
         health_data = {
             'status': 'healthy',
@@ -550,7 +520,7 @@ class SystemHealthView(APIView):
         
         # Check database
         try:
-            CaseLead.objects.count()
+            await CaseLead.objects.acount()
             health_data['services']['database'] = 'healthy'
         except Exception as e:
             health_data['services']['database'] = f'error: {str(e)}'
@@ -558,8 +528,7 @@ class SystemHealthView(APIView):
         
         # Check Ollama service
         try:
-            ipc_service = OllamaIPCService()
-            is_connected, message = ipc_service.test_connection()
+            is_connected, message = await ollama_ipc_service.atest_connection()
             health_data['services']['ollama'] = 'healthy' if is_connected else f'error: {message}'
             if not is_connected:
                 health_data['status'] = 'degraded'
@@ -570,13 +539,13 @@ class SystemHealthView(APIView):
         # Overall system stats
         if request.user.is_authenticated and request.user.is_staff:
             health_data['stats'] = {
-                'total_leads': CaseLead.objects.count(),
-                'active_lawyers': LawyerProfile.objects.filter(
+                'total_leads': await CaseLead.objects.acount(),
+                'active_lawyers': await LawyerProfile.objects.filter(
                     subscription__status='active'
-                ).count(),
-                'leads_today': CaseLead.objects.filter(
+                ).acount(),
+                'leads_today': await CaseLead.objects.filter(
                     created_at__date=timezone.now().date()
-                ).count(),
+                ).acount(),
             }
         
         status_code = status.HTTP_200_OK if health_data['status'] == 'healthy' else status.HTTP_503_SERVICE_UNAVAILABLE
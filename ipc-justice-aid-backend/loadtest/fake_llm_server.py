@@ -0,0 +1,349 @@
+"""
+Stub LLM server for load tests
+
+Speaks enough of the Ollama (/api/generate, /api/tags) and Gemini
+(/v1beta/models/<model>:generateContent and :streamGenerateContent) protocols
+for the analysis services, with configurable latency, error rates and canned
+outputs. No Django or third-party packages are needed.
+
+Run it with:
+    python loadtest/fake_llm_server.py --port 11500 --latency lognormal:2:0.5 \
+        --error-rate 0.02 --rate-limit-rate 0.01 --malformed-rate 0.05
+
+and start the backend against it:
+    OLLAMA_BASE_URL=http://127.0.0.1:11500
+    GEMINI_API_BASE_URL=http://127.0.0.1:11500/v1beta
+    GEMINI_API_KEY=fake
+
+Latency is the total generation time of one response, in seconds:
+    fixed:S, uniform:LOW:HIGH, normal:MEAN:STDDEV or lognormal:MEDIAN:SIGMA
+Streamed responses spread it across their chunks. GET /stats returns the
+request counts per endpoint and outcome.
+"""
+import argparse
+import itertools
+import json
+import math
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+
+
+ANALYSIS_OUTPUT = {
+    "sections_applied": [
+        {
+            "section_number": "379",
+            "description": "Punishment for theft",
+            "reason": "Movable property was taken out of the complainant's possession without consent"
+        },
+        {
+            "section_number": "411",
+            "description": "Dishonestly receiving stolen property",
+            "reason": "Applies to anyone found holding the stolen property knowingly"
+        }
+    ],
+    "explanation": "The facts describe a theft; the receiver of the property can also be charged."
+}
+
+CITIZEN_OUTPUT = {
+    "applicable_ipc_sections": [
+        {
+            "section_number": "379",
+            "description": "IPC Section 379 - Punishment for theft",
+            "why_applicable": "Property was taken dishonestly without the owner's consent",
+            "punishment": "Imprisonment up to 3 years, or fine, or both"
+        }
+    ],
+    "defensive_ipc_sections": [
+        {
+            "section_number": "79",
+            "description": "IPC Section 79 - Act done by a person justified, or by mistake of fact believing himself justified",
+            "why_applicable": "If the accused believed in good faith that the property was theirs",
+            "punishment": "No punishment if the defense is established"
+        }
+    ],
+    "severity": "Medium",
+    "total_sections_identified": 1,
+    "total_defensive_sections": 1
+}
+
+SUMMARY_OUTPUT = {
+    "document_type": "Complaint",
+    "simple_summary": "A complaint to the police about a stolen motorcycle.",
+    "detailed_summary": "The complainant reports that their motorcycle was stolen from outside their house and asks the police to register an FIR.",
+    "key_points": ["Motorcycle stolen overnight", "FIR requested"],
+    "parties_involved": ["Complainant", "Station House Officer"],
+    "important_dates": ["12 March 2024"],
+    "legal_implications": "The police must register an FIR for a cognizable offence.",
+    "action_required": "Follow up on the FIR number within a week.",
+    "urgency_level": "Medium",
+    "language_complexity": "Simple"
+}
+
+
+def parse_latency(spec: str):
+    """Turn a latency spec into a function returning one sample in seconds"""
+    kind, *params = spec.split(':')
+    values = [float(value) for value in params]
+    if kind == 'fixed' and len(values) == 1:
+        return lambda: values[0]
+    if kind == 'uniform' and len(values) == 2:
+        return lambda: random.uniform(values[0], values[1])
+    if kind == 'normal' and len(values) == 2:
+        return lambda: max(random.gauss(values[0], values[1]), 0.0)
+    if kind == 'lognormal' and len(values) == 2:
+        return lambda: random.lognormvariate(math.log(values[0]), values[1])
+    raise argparse.ArgumentTypeError(f"Invalid latency spec: {spec}")
+
+
+def malform(text: str) -> str:
+    """Corrupt a JSON answer the way real models do"""
+    corruption = random.choice(('truncate', 'prose', 'trailing_comma'))
+    if corruption == 'truncate':
+        return text[:random.randint(len(text) // 3, len(text) - 2)]
+    if corruption == 'prose':
+        return f"Here is the analysis you asked for:\n```json\n{text}\n```\nLet me know if you need more."
+    return re.sub(r'\}\s*\]', '},]', text, count=1)
+
+
+class FakeLLM:
+    """Response generation and statistics shared by all request threads"""
+
+    def __init__(self, options):
+        self.latency = options.latency
+        self.error_rate = options.error_rate
+        self.rate_limit_rate = options.rate_limit_rate
+        self.malformed_rate = options.malformed_rate
+        self.chunk_chars = options.chunk_chars
+        self.ollama_model = options.ollama_model
+        self.canned = None
+        if options.canned:
+            with open(options.canned, encoding='utf-8') as canned_file:
+                self.canned = itertools.cycle(json.load(canned_file))
+
+        self.stats = {}
+        self._lock = threading.Lock()
+
+    def count(self, endpoint: str, outcome: str):
+        with self._lock:
+            self.stats.setdefault(endpoint, {}).setdefault(outcome, 0)
+            self.stats[endpoint][outcome] += 1
+
+    def pick_failure(self):
+        """'error', 'rate_limited' or None for this request"""
+        roll = random.random()
+        if roll < self.error_rate:
+            return 'error'
+        if roll < self.error_rate + self.rate_limit_rate:
+            return 'rate_limited'
+        return None
+
+    def output_for(self, prompt: str, schema=None):
+        """
+        (text, malformed) answering a prompt
+
+        A JSON schema sent with the request (Ollama ``format``, Gemini
+        ``responseSchema``) wins over the prompt, as it does for a real model.
+        """
+        required = set()
+        if isinstance(schema, dict):
+            required = set(schema.get('required') or schema.get('properties') or ())
+
+        if self.canned is not None:
+            with self._lock:
+                output = next(self.canned)
+        elif required:
+            output = next(
+                (output for output in (ANALYSIS_OUTPUT, CITIZEN_OUTPUT, SUMMARY_OUTPUT) if required <= set(output)),
+                ANALYSIS_OUTPUT
+            )
+        elif 'applicable_ipc_sections' in prompt:
+            output = CITIZEN_OUTPUT
+        elif 'document_type' in prompt:
+            output = SUMMARY_OUTPUT
+        else:
+            output = ANALYSIS_OUTPUT
+
+        text = output if isinstance(output, str) else json.dumps(output, indent=2)
+        if random.random() < self.malformed_rate:
+            return malform(text), True
+        return text, False
+
+    def chunks(self, text: str):
+        return [text[start:start + self.chunk_chars] for start in range(0, len(text), self.chunk_chars)] or ['']
+
+
+class FakeLLMHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    llm: FakeLLM = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        path = urlparse(self.path).path
+        if path == '/api/tags':
+            self.llm.count('ollama_tags', 'success')
+            self._send_json(200, {'models': [{'name': self.llm.ollama_model, 'model': self.llm.ollama_model}]})
+        elif path == '/stats':
+            self._send_json(200, self.llm.stats)
+        else:
+            self._send_json(404, {'error': 'not found'})
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        length = int(self.headers.get('Content-Length') or 0)
+        try:
+            body = json.loads(self.rfile.read(length) or b'{}')
+        except json.JSONDecodeError:
+            self._send_json(400, {'error': 'invalid JSON body'})
+            return
+
+        if url.path == '/api/generate':
+            self._ollama_generate(body)
+        elif url.path.endswith(':generateContent'):
+            self._gemini_generate(body, stream=False)
+        elif url.path.endswith(':streamGenerateContent'):
+            self._gemini_generate(body, stream=True)
+        else:
+            self._send_json(404, {'error': 'not found'})
+
+    def _ollama_generate(self, body):
+        endpoint = 'ollama_generate'
+        failure = self.llm.pick_failure()
+        if failure:
+            # Ollama has no rate limiting, so both failure kinds are server errors
+            self.llm.count(endpoint, 'error')
+            self._send_json(500, {'error': 'fake server error'})
+            return
+
+        prompt = body.get('prompt', '')
+        text, malformed = self.llm.output_for(prompt, body.get('format'))
+        duration = self.llm.latency()
+        usage = {
+            'model': body.get('model', self.llm.ollama_model),
+            'done': True,
+            'done_reason': 'stop',
+            'total_duration': int(duration * 1e9),
+            'load_duration': 0,
+            'prompt_eval_count': len(prompt) // 4,
+            'eval_count': len(text) // 4,
+            'eval_duration': int(duration * 1e9),
+        }
+        self.llm.count(endpoint, 'malformed' if malformed else 'success')
+
+        if not body.get('stream', True):
+            time.sleep(duration)
+            self._send_json(200, dict(usage, response=text))
+            return
+
+        chunks = self.llm.chunks(text)
+        self._start_stream('application/x-ndjson')
+        for chunk in chunks:
+            time.sleep(duration / len(chunks))
+            self._write_line(json.dumps({'model': usage['model'], 'response': chunk, 'done': False}) + '\n')
+        self._write_line(json.dumps(dict(usage, response='')) + '\n')
+
+    def _gemini_generate(self, body, stream: bool):
+        endpoint = 'gemini_stream' if stream else 'gemini_generate'
+        failure = self.llm.pick_failure()
+        if failure == 'rate_limited':
+            self.llm.count(endpoint, 'rate_limited')
+            self._send_json(429, {'error': {'code': 429, 'status': 'RESOURCE_EXHAUSTED'}}, {'Retry-After': '1'})
+            return
+        if failure == 'error':
+            self.llm.count(endpoint, 'error')
+            self._send_json(500, {'error': {'code': 500, 'status': 'INTERNAL'}})
+            return
+
+        prompt = ' '.join(
+            part.get('text', '') for content in body.get('contents', []) for part in content.get('parts', [])
+        )
+        schema = (body.get('generationConfig') or {}).get('responseSchema')
+        text, malformed = self.llm.output_for(prompt, schema)
+        duration = self.llm.latency()
+        usage = {
+            'promptTokenCount': len(prompt) // 4,
+            'candidatesTokenCount': len(text) // 4,
+            'totalTokenCount': (len(prompt) + len(text)) // 4,
+        }
+        self.llm.count(endpoint, 'malformed' if malformed else 'success')
+
+        def event(chunk, finished):
+            candidate = {'content': {'parts': [{'text': chunk}], 'role': 'model'}, 'index': 0}
+            if finished:
+                candidate['finishReason'] = 'STOP'
+            return {'candidates': [candidate], 'usageMetadata': usage}
+
+        if not stream:
+            time.sleep(duration)
+            self._send_json(200, event(text, True))
+            return
+
+        chunks = self.llm.chunks(text)
+        self._start_stream('text/event-stream')
+        for index, chunk in enumerate(chunks):
+            time.sleep(duration / len(chunks))
+            self._write_line(f"data: {json.dumps(event(chunk, index == len(chunks) - 1))}\r\n\r\n")
+
+    def _send_json(self, status_code: int, payload, headers=None):
+        data = json.dumps(payload).encode('utf-8')
+        self.send_response(status_code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _start_stream(self, content_type: str):
+        # No Content-Length: the body ends when the connection closes
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Connection', 'close')
+        self.end_headers()
+        self.close_connection = True
+
+    def _write_line(self, line: str):
+        self.wfile.write(line.encode('utf-8'))
+        self.wfile.flush()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=11500)
+    parser.add_argument('--latency', type=parse_latency, default='lognormal:2:0.5',
+                        help='Generation time distribution in seconds (default lognormal:2:0.5)')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Fraction of requests answered with a 500')
+    parser.add_argument('--rate-limit-rate', type=float, default=0.0,
+                        help='Fraction of Gemini requests answered with a 429')
+    parser.add_argument('--malformed-rate', type=float, default=0.0,
+                        help='Fraction of answers with truncated or prose-wrapped JSON')
+    parser.add_argument('--canned', help='JSON file with a list of outputs (objects or strings) to cycle through')
+    parser.add_argument('--chunk-chars', type=int, default=40, help='Characters per streamed chunk')
+    parser.add_argument('--ollama-model', default='Anupam/IPC-Helper:latest', help='Model listed by /api/tags')
+    parser.add_argument('--seed', type=int, help='Seed the random generator for repeatable runs')
+    options = parser.parse_args()
+
+    if options.seed is not None:
+        random.seed(options.seed)
+
+    FakeLLMHandler.llm = FakeLLM(options)
+    server = ThreadingHTTPServer((options.host, options.port), FakeLLMHandler)
+    server.daemon_threads = True
+    print(f"Fake LLM server listening on http://{options.host}:{options.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print(json.dumps(FakeLLMHandler.llm.stats, indent=2))
+
+
+if __name__ == '__main__':
+    main()
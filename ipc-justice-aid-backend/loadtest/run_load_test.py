@@ -0,0 +1,218 @@
+"""
+Load test for the analysis endpoints
+
+Drives AnalyzeCaseView (analyze), CitizenCaseAnalysisView (citizen) and
+DocumentSummarizerView (summarize) at a fixed concurrency and reports
+latency percentiles, throughput and error rates per endpoint.
+
+Start loadtest/fake_llm_server.py and the backend pointed at it first, then:
+    python loadtest/run_load_test.py --base-url http://127.0.0.1:8000 \
+        --concurrency 20 --requests 500 --user-email loadtest@example.com
+
+analyze and summarize need a JWT: pass one with --token, or --user-email to
+mint one for an existing user from the Django settings (run from the backend
+directory so they can be imported). Case descriptions are unique per request
+unless --repeat is given, so the analysis cache does not hide provider latency.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+from collections import Counter
+
+import httpx
+
+
+ENDPOINTS = {
+    'analyze': '/api/v1/legal/analyze/',
+    'citizen': '/api/v1/leads/analyze-case/',
+    'summarize': '/api/v1/legal/summarize-document/',
+}
+AUTHENTICATED_ENDPOINTS = {'analyze', 'summarize'}
+
+CASE_TEMPLATES = [
+    "Someone snatched my gold chain near {place} while I was walking home and ran away on a motorcycle.",
+    "My neighbour in {place} beat me with a stick during an argument about parking and I was injured.",
+    "A man called pretending to be from my bank in {place}, got my OTP and transferred money from my account.",
+    "My husband's family in {place} keeps demanding more dowry and threatens to throw me out of the house.",
+    "A car driven at high speed near {place} hit a pedestrian who later died in the hospital.",
+    "A shopkeeper in {place} sold me a fake gold coin and refuses to return the money.",
+]
+PLACES = ['Delhi', 'Mumbai', 'Pune', 'Lucknow', 'Jaipur', 'Kochi', 'Patna', 'Indore']
+
+
+def case_description(sequence: int, repeat: bool) -> str:
+    template = CASE_TEMPLATES[sequence % len(CASE_TEMPLATES)]
+    text = template.format(place=PLACES[(sequence // len(CASE_TEMPLATES)) % len(PLACES)])
+    if not repeat:
+        text += f" Complaint reference LT-{sequence}-{random.randint(0, 10**6)}."
+    return text
+
+
+def build_pdf(text: str) -> bytes:
+    """Smallest valid single-page PDF with one line of text"""
+    stream = f"BT /F1 12 Tf 72 720 Td ({text}) Tj ET".encode('latin-1')
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        b"<< /Type /Pages /Kids [3 0 R] /Count 1 >>",
+        b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Contents 4 0 R "
+        b"/Resources << /Font << /F1 5 0 R >> >> >>",
+        b"<< /Length " + str(len(stream)).encode() + b" >>\nstream\n" + stream + b"\nendstream",
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    pdf = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(pdf))
+        pdf += f"{number} 0 obj\n".encode() + body + b"\nendobj\n"
+    xref_offset = len(pdf)
+    pdf += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode()
+    for offset in offsets:
+        pdf += f"{offset:010d} 00000 n \n".encode()
+    pdf += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref_offset}\n%%EOF\n".encode()
+    return bytes(pdf)
+
+
+def mint_token(email: str) -> str:
+    """Access token for an existing user, via the project's Django settings"""
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'ipc_justice_aid_backend.settings')
+    import django
+    django.setup()
+    from django.contrib.auth import get_user_model
+    from rest_framework_simplejwt.tokens import RefreshToken
+
+    user = get_user_model().objects.get(email=email)
+    return str(RefreshToken.for_user(user).access_token)
+
+
+def percentile(samples, fraction: float) -> float:
+    """Nearest-rank percentile of sorted samples"""
+    if not samples:
+        return 0.0
+    rank = max(int(round(fraction * len(samples) + 0.5)) - 1, 0)
+    return samples[min(rank, len(samples) - 1)]
+
+
+class LoadTest:
+    def __init__(self, options):
+        self.options = options
+        self.endpoints = options.endpoints
+        self.headers = {'Authorization': f'Bearer {options.token}'} if options.token else {}
+        self.results = {name: [] for name in self.endpoints}
+        self.sequence = 0
+        self.deadline = None
+
+    def _next(self):
+        """(sequence, endpoint) for the next request, or None when done"""
+        if self.deadline is not None:
+            if time.perf_counter() >= self.deadline:
+                return None
+        elif self.sequence >= self.options.requests:
+            return None
+        sequence = self.sequence
+        self.sequence += 1
+        return sequence, self.endpoints[sequence % len(self.endpoints)]
+
+    async def _send(self, client: httpx.AsyncClient, sequence: int, endpoint: str) -> httpx.Response:
+        url = ENDPOINTS[endpoint]
+        headers = self.headers if endpoint in AUTHENTICATED_ENDPOINTS else {}
+        description = case_description(sequence, self.options.repeat)
+        if endpoint == 'summarize':
+            files = {'document': (f'complaint-{sequence}.pdf', build_pdf(description[:80]), 'application/pdf')}
+            return await client.post(url, files=files, headers=headers)
+        return await client.post(url, json={'case_description': description}, headers=headers)
+
+    async def _worker(self, client: httpx.AsyncClient):
+        while True:
+            item = self._next()
+            if item is None:
+                return
+            sequence, endpoint = item
+            start_time = time.perf_counter()
+            try:
+                response = await self._send(client, sequence, endpoint)
+                outcome = str(response.status_code)
+            except httpx.TimeoutException:
+                outcome = 'timeout'
+            except httpx.HTTPError as e:
+                outcome = type(e).__name__
+            self.results[endpoint].append((outcome, time.perf_counter() - start_time))
+
+    async def run(self):
+        limits = httpx.Limits(max_connections=self.options.concurrency)
+        async with httpx.AsyncClient(
+            base_url=self.options.base_url, timeout=self.options.timeout, limits=limits
+        ) as client:
+            start_time = time.perf_counter()
+            if self.options.duration:
+                self.deadline = start_time + self.options.duration
+            await asyncio.gather(*(self._worker(client) for _ in range(self.options.concurrency)))
+            return time.perf_counter() - start_time
+
+    def report(self, elapsed: float):
+        report = {'concurrency': self.options.concurrency, 'elapsed_seconds': round(elapsed, 2), 'endpoints': {}}
+        for endpoint, results in self.results.items():
+            latencies = sorted(latency for _, latency in results)
+            outcomes = Counter(outcome for outcome, _ in results)
+            errors = sum(count for outcome, count in outcomes.items() if not outcome.startswith('2'))
+            report['endpoints'][endpoint] = {
+                'requests': len(results),
+                'error_rate': round(errors / len(results), 4) if results else 0.0,
+                'statuses': dict(outcomes),
+                'p50_ms': round(percentile(latencies, 0.50) * 1000, 1),
+                'p95_ms': round(percentile(latencies, 0.95) * 1000, 1),
+                'p99_ms': round(percentile(latencies, 0.99) * 1000, 1),
+                'mean_ms': round(sum(latencies) / len(latencies) * 1000, 1) if latencies else 0.0,
+                'rps': round(len(results) / elapsed, 2) if elapsed else 0.0,
+            }
+        return report
+
+
+def print_report(report):
+    print(f"\n=== Load Test ({report['concurrency']} concurrent, {report['elapsed_seconds']}s) ===")
+    for endpoint, stats in report['endpoints'].items():
+        statuses = ', '.join(f"{outcome}: {count}" for outcome, count in sorted(stats['statuses'].items()))
+        print(f"\n{endpoint} ({ENDPOINTS[endpoint]})")
+        print(f"- requests: {stats['requests']} ({stats['rps']} rps), error rate: {stats['error_rate'] * 100:.1f}%")
+        print(f"- statuses: {statuses or 'none'}")
+        print(f"- p50={stats['p50_ms']}ms p95={stats['p95_ms']}ms p99={stats['p99_ms']}ms mean={stats['mean_ms']}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--base-url', default='http://127.0.0.1:8000')
+    parser.add_argument('--concurrency', type=int, default=10)
+    parser.add_argument('--requests', type=int, default=100, help='Total requests across all endpoints')
+    parser.add_argument('--duration', type=float, help='Run for this many seconds instead of a request count')
+    parser.add_argument('--endpoints', default='analyze,citizen,summarize',
+                        help=f"Comma-separated subset of {', '.join(ENDPOINTS)}")
+    parser.add_argument('--token', default=os.environ.get('LOADTEST_TOKEN'), help='JWT access token')
+    parser.add_argument('--user-email', help='Mint a JWT for this existing user from the Django settings')
+    parser.add_argument('--repeat', action='store_true', help='Reuse case descriptions to exercise the cache')
+    parser.add_argument('--timeout', type=float, default=180.0, help='Per-request timeout in seconds')
+    parser.add_argument('--json', help='Also write the report to this file')
+    options = parser.parse_args()
+
+    options.endpoints = [name.strip() for name in options.endpoints.split(',') if name.strip()]
+    unknown = set(options.endpoints) - set(ENDPOINTS)
+    if unknown:
+        parser.error(f"Unknown endpoints: {', '.join(sorted(unknown))}")
+    if options.user_email:
+        options.token = mint_token(options.user_email)
+    if AUTHENTICATED_ENDPOINTS & set(options.endpoints) and not options.token:
+        print("Warning: no --token or --user-email, analyze and summarize will answer 401")
+
+    load_test = LoadTest(options)
+    report = load_test.report(asyncio.run(load_test.run()))
+    print_report(report)
+    if options.json:
+        with open(options.json, 'w') as report_file:
+            json.dump(report, report_file, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -57,14 +57,26 @@ fi
 echo "Collecting static files..."
 python manage.py collectstatic --noinput
 
+# Prometheus multiprocess metrics must start from an empty directory
+if [ -n "$PROMETHEUS_MULTIPROC_DIR" ]; then
+    rm -rf "$PROMETHEUS_MULTIPROC_DIR"
+    mkdir -p "$PROMETHEUS_MULTIPROC_DIR"
+fi
+
+# Load the Ollama model in the background so the first analysis is not a cold start
+echo "Warming up Ollama model..."
+python manage.py warm_ollama &
+
 # Start the application
 if [ "$DEBUG" = "True" ]; then
     echo "Starting Django development server..."
     python manage.py runserver 0.0.0.0:8000 --noreload
 else
     echo "Starting Gunicorn production server..."
+    # Also read by the OCR pool to share the cores between workers
+    export WEB_CONCURRENCY="${WEB_CONCURRENCY:-3}"
     exec gunicorn --bind 0.0.0.0:8000 \
-                  --workers 3 \
+                  --workers "$WEB_CONCURRENCY" \
                   --timeout 300 \
                   --keep-alive 2 \
                   --max-requests 1000 \
@@ -72,5 +84,6 @@ else
                   --access-logfile - \
                   --error-logfile - \
                   --log-level info \
-                  ipc_justice_aid_backend.wsgi:application
+                  --worker-class uvicorn.workers.UvicornWorker \
+                  ipc_justice_aid_backend.asgi:application
 fi